@@ -0,0 +1,257 @@
+"""
+Cancelación de turnos: plazos, desconexiones y gasto descartado.
+
+Un turno del agente puede hacer varias llamadas al modelo. Si el cliente se desconecta o
+se vence el plazo de la solicitud, seguir ejecutando el ciclo ReAct solo gasta tokens en
+una respuesta que nadie va a leer. guarded_turn (y guarded_stream, para astream)
+ejecuta un turno del grafo en una tarea propia:
+- Cancela esa tarea cuando vence el plazo (timeout) y lo informa como
+  TurnDeadlineExceeded; la tarea de quien espera el turno no se cancela
+- Ante cualquier cancelación (plazo, desconexión, cierre) descarta los checkpoints que
+  guardó el turno, así no quedan mensajes del usuario sin respuesta ni llamadas a
+  herramientas sin resultado, y un turno concurrente en el mismo hilo no se pierde
+- Si un paso del turno no cabe en el presupuesto de tokens (TokenBudgetExceeded) también
+  restaura el hilo antes de propagar el error
+- Registra en CancellationStats los turnos descartados y los tokens de las llamadas al
+  modelo que ya se habían completado y se pagaron sin usarse
+
+La cancelación llega a la llamada al modelo en curso solo si el nodo es asíncrono
+(ainvoke): MemoryAgent registra las llamadas interrumpidas con record_aborted_call.
+"""
+
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Awaitable, Dict, Optional, TypeVar
+
+from agente.tokens import TokenBudgetExceeded, sum_usage
+
+
+T = TypeVar("T")
+
+
+class TurnDeadlineExceeded(Exception):
+    """Se lanza cuando un turno supera su plazo y se cancela."""
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        super().__init__(f"El turno superó el plazo de {timeout:g} s y se canceló")
+
+
+class CancellationStats:
+    """
+    Contadores de turnos cancelados y del gasto del modelo que se descartó.
+
+    Ejemplo:
+        stats = CancellationStats()
+        config = {"configurable": {"thread_id": "t1", "turn_id": uuid.uuid4().hex}}
+        await guarded_turn(graph, config, graph.ainvoke(entrada, config), timeout=30, stats=stats)
+        print(stats.as_dict())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.turns = {"cancelled": 0, "deadline": 0}
+        self.disconnects: Dict[str, int] = {}
+        self.llm_calls_discarded = 0
+        self.tokens_discarded = 0
+        self.llm_calls_aborted = 0
+        self.prompt_tokens_aborted = 0
+        self.checkpoints_rolled_back = 0
+
+    def record_turn(self, reason: str, usage: Dict[str, int], llm_calls: int, rolled_back: int) -> None:
+        """Registra un turno cancelado ("cancelled" o "deadline") y las llamadas ya pagadas."""
+        with self._lock:
+            self.turns[reason] = self.turns.get(reason, 0) + 1
+            self.llm_calls_discarded += llm_calls
+            self.tokens_discarded += usage.get("total_tokens", 0)
+            self.checkpoints_rolled_back += rolled_back
+
+    def record_aborted_call(self, prompt_tokens: int) -> None:
+        """Registra una llamada al modelo interrumpida (sus tokens de entrada son una estimación)."""
+        with self._lock:
+            self.llm_calls_aborted += 1
+            self.prompt_tokens_aborted += prompt_tokens
+
+    def record_disconnect(self, transport: str) -> None:
+        """Registra un cliente que se desconectó con un turno en curso ("http", "sse", "websocket")."""
+        with self._lock:
+            self.disconnects[transport] = self.disconnects.get(transport, 0) + 1
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Copia de los contadores."""
+        with self._lock:
+            return {
+                "turns": dict(self.turns),
+                "disconnects": dict(self.disconnects),
+                "llm_calls_discarded": self.llm_calls_discarded,
+                "tokens_discarded": self.tokens_discarded,
+                "llm_calls_aborted": self.llm_calls_aborted,
+                "prompt_tokens_aborted": self.prompt_tokens_aborted,
+                "checkpoints_rolled_back": self.checkpoints_rolled_back,
+            }
+
+
+def _has_checkpointer(graph) -> bool:
+    saver = getattr(graph, "checkpointer", None)
+    return saver is not None and not isinstance(saver, bool)
+
+
+def rollback_turn(graph, config: Dict[str, Any], previous) -> int:
+    """
+    Restaura el hilo al checkpoint anterior a un turno que no terminó.
+
+    Args:
+        graph: Grafo compilado.
+        config: Configuración del turno (con thread_id; con turn_id solo se descartan
+               los checkpoints de este turno).
+        previous: Estado del hilo antes del turno (None si el grafo no tiene checkpointer).
+
+    Returns:
+        Número de checkpoints descartados.
+    """
+    saver = getattr(graph, "checkpointer", None)
+    if previous is None or not hasattr(saver, "rollback_thread"):
+        return 0
+    checkpoint_id = previous.config["configurable"].get("checkpoint_id")
+    return saver.rollback_thread(
+        config["configurable"]["thread_id"], checkpoint_id, config["configurable"].get("turn_id")
+    )
+
+
+def _discard_turn(graph, config: Dict[str, Any], previous, reason: str,
+                  stats: Optional[CancellationStats]) -> None:
+    """Restaura el hilo al checkpoint anterior al turno y registra lo descartado."""
+    if previous is None:
+        # Grafo sin checkpointer: no hay estado que revertir ni mensajes que contar
+        if stats is not None:
+            stats.record_turn(reason, {}, 0, 0)
+        return
+    previous_count = len(previous.values.get("messages", []))
+    produced = graph.get_state(config).values.get("messages", [])[previous_count:]
+    paid = [message for message in produced if message.type == "ai"]
+
+    rolled_back = rollback_turn(graph, config, previous)
+    if stats is not None:
+        stats.record_turn(reason, sum_usage(paid), len(paid), rolled_back)
+
+
+async def guarded_turn(
+    graph,
+    config: Dict[str, Any],
+    work: Awaitable[T],
+    timeout: Optional[float] = None,
+    stats: Optional[CancellationStats] = None,
+    previous=None,
+) -> T:
+    """
+    Ejecuta un turno con plazo y lo deshace si se cancela.
+
+    El turno (work) corre en una tarea propia: el plazo cancela esa tarea y nunca la de
+    quien espera el resultado. Si se cancela quien espera (desconexión, cierre), se
+    cancela también el turno. En un grafo sin checkpointer solo se aplica el plazo y se
+    cuenta la cancelación.
+
+    Args:
+        graph: Grafo compilado.
+        config: Configuración del turno (con thread_id y, para no deshacer los
+               checkpoints de un turno concurrente, turn_id).
+        work: Corrutina que ejecuta el grafo con config.
+        timeout: Plazo en segundos. None no limita.
+        stats: Contadores donde registrar las cancelaciones.
+        previous: Estado del hilo antes del turno (por defecto se lee del grafo).
+
+    Returns:
+        El resultado de work.
+
+    Raises:
+        TurnDeadlineExceeded: Si vence el plazo.
+    """
+    try:
+        if previous is None and _has_checkpointer(graph):
+            previous = await graph.aget_state(config)
+    except BaseException:
+        work.close()
+        raise
+    turn = asyncio.ensure_future(work)
+    try:
+        done, _ = await asyncio.wait({turn}, timeout=timeout)
+    except asyncio.CancelledError:
+        await _cancel(turn)
+        _discard_turn(graph, config, previous, "cancelled", stats)
+        raise
+    if not done:
+        await _cancel(turn)
+        if turn.cancelled() or turn.exception() is not None:
+            _discard_turn(graph, config, previous, "deadline", stats)
+            raise TurnDeadlineExceeded(timeout)
+    try:
+        return turn.result()
+    except TokenBudgetExceeded:
+        # El prompt de un paso del ciclo ReAct no cupo: el hilo no debe quedar con el
+        # mensaje del usuario o llamadas a herramientas sin respuesta
+        rollback_turn(graph, config, previous)
+        raise
+
+
+async def guarded_stream(
+    graph,
+    config: Dict[str, Any],
+    stream: AsyncIterator[T],
+    timeout: Optional[float] = None,
+    stats: Optional[CancellationStats] = None,
+    previous=None,
+    buffer_size: int = 8,
+) -> AsyncIterator[T]:
+    """
+    Itera un stream del grafo con plazo y lo deshace si se cancela (ver guarded_turn).
+
+    El stream se consume en la tarea del turno y sus elementos llegan por una cola, así
+    que el plazo no interrumpe al consumidor en medio de su propio trabajo. La cola está
+    acotada: si el consumidor va lento, el grafo espera (backpressure). Si el
+    consumidor deja de iterar antes del final, el turno se cancela y se deshace.
+
+    Args:
+        buffer_size: Elementos que el grafo puede adelantar al consumidor.
+
+    Raises:
+        TurnDeadlineExceeded: Si vence el plazo.
+    """
+    queue: asyncio.Queue = asyncio.Queue(maxsize=buffer_size)
+
+    async def pump() -> None:
+        try:
+            async for item in stream:
+                await queue.put(item)
+        finally:
+            # Cerrar el grafo antes de revertir el hilo si el turno se cancela
+            await stream.aclose()
+
+    turn = asyncio.ensure_future(guarded_turn(graph, config, pump(), timeout, stats, previous))
+    try:
+        while True:
+            if not queue.empty():
+                yield queue.get_nowait()
+                continue
+            if turn.done():
+                break
+            # Esperar al siguiente elemento o al final del turno, lo que ocurra antes
+            getter = asyncio.ensure_future(queue.get())
+            try:
+                await asyncio.wait({getter, turn}, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not getter.done():
+                    getter.cancel()
+            if getter.done() and not getter.cancelled():
+                yield getter.result()
+        turn.result()
+    finally:
+        if not turn.done():
+            await _cancel(turn)
+        elif not turn.cancelled():
+            turn.exception()  # ya se propagó o el consumidor dejó de iterar
+
+
+async def _cancel(task: asyncio.Future) -> None:
+    """Cancela una tarea y espera a que termine."""
+    task.cancel()
+    await asyncio.wait({task})
@@ -0,0 +1,417 @@
+"""
+Grabación y reproducción de llamadas al modelo de chat.
+
+CassetteChatModel envuelve el modelo del agente o de los flujos de trabajo:
+- En modo "record" llama al modelo real y guarda cada par solicitud/respuesta
+- En modo "replay" responde solo desde el cassette, sin red ni API key
+- En modo "auto" reproduce lo grabado y graba lo que falte
+- La clave de cada solicitud es el hash de su contenido (modelo, mensajes, herramientas y
+  parámetros, sin los ids aleatorios), así un prompt sin cambios siempre coincide
+- La reproducción puede respetar la latencia original (para comparar el rendimiento de
+  una versión nueva con tráfico real) o responder de inmediato; las llamadas en
+  streaming se reproducen fragmento a fragmento con sus retrasos grabados
+
+El cassette es un archivo JSONL de solo-agregado; al abrirlo se construye un índice
+clave -> posición en el archivo y cada respuesta se lee solo cuando se necesita.
+
+Uso con variables de entorno (MemoryAgent, la API y ejemplo_uso.py):
+    CASSETTE_PATH=cassettes/agente.jsonl CASSETTE_MODE=record python ejemplo_uso.py
+    CASSETTE_PATH=cassettes/agente.jsonl CASSETTE_MODE=replay python ejemplo_uso.py
+"""
+
+import asyncio
+import hashlib
+import json
+import operator
+import os
+import threading
+import time
+from functools import reduce
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+
+CASSETTE_MODES = ("record", "replay", "auto")
+REPLAY_LATENCIES = ("original", "zero")
+
+# Cada línea empieza con la clave para indexar el archivo sin decodificar las respuestas
+_KEY_PREFIX = b'{"key": "'
+_KEY_LENGTH = 64
+
+
+class CassetteMiss(Exception):
+    """Se lanza en modo replay cuando la solicitud no está grabada."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"La solicitud {key[:12]}... no está en el cassette")
+
+
+def _canonical_message(message: BaseMessage) -> Dict[str, Any]:
+    """Contenido de un mensaje que determina la respuesta (sin ids ni metadatos)."""
+    canonical = {"type": message.type, "content": message.content}
+    if getattr(message, "name", None):
+        canonical["name"] = message.name
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        canonical["tool_calls"] = [[tc["name"], tc["args"]] for tc in tool_calls]
+    return canonical
+
+
+def request_key(messages: Sequence[BaseMessage], params: Dict[str, Any]) -> str:
+    """
+    Clave de contenido de una solicitud.
+
+    Args:
+        messages: Mensajes del prompt.
+        params: Parámetros de la llamada (herramientas, tool_choice, stop...).
+
+    Returns:
+        Hash sha256 en hexadecimal.
+    """
+    payload = json.dumps(
+        {"messages": [_canonical_message(m) for m in messages], "params": params},
+        sort_keys=True, ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Archivo de grabaciones con índice en memoria.
+
+    Ejemplo:
+        cassette = Cassette("cassettes/agente.jsonl")
+        record = cassette.get(key)
+    """
+
+    def __init__(self, path: str):
+        """
+        Abre (o crea) un cassette y construye su índice.
+
+        Args:
+            path: Archivo JSONL del cassette.
+        """
+        self.path = path
+        self._index: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Se abren al primer uso y se reutilizan en todas las lecturas y escrituras
+        self._reader = None
+        self._writer = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        if os.path.exists(path):
+            self._build_index()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def _build_index(self) -> None:
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                if line.startswith(_KEY_PREFIX):
+                    key = line[len(_KEY_PREFIX):len(_KEY_PREFIX) + _KEY_LENGTH].decode("ascii")
+                elif line.strip():
+                    key = json.loads(line)["key"]
+                else:
+                    key = None
+                if key:
+                    # Si una solicitud se grabó varias veces, gana la última
+                    self._index[key] = offset
+                offset += len(line)
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Grabación de una solicitud, o None si no existe."""
+        with self._lock:
+            offset = self._index.get(key)
+            if offset is None:
+                return None
+            if self._reader is None:
+                self._reader = open(self.path, "rb")
+            self._reader.seek(offset)
+            line = self._reader.readline()
+        return json.loads(line)
+
+    def put(self, key: str, record: Dict[str, Any]) -> None:
+        """Agrega una grabación al final del archivo y la indexa."""
+        line = (json.dumps({"key": key, **record}, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._writer is None:
+                self._writer = open(self.path, "ab")
+            offset = self._writer.tell()
+            self._writer.write(line)
+            # El lector usa otro descriptor: la línea debe estar en el archivo antes de indexarla
+            self._writer.flush()
+            self._index[key] = offset
+
+    def close(self) -> None:
+        """Cierra los archivos abiertos; el cassette se puede seguir usando después."""
+        with self._lock:
+            for handle in (self._reader, self._writer):
+                if handle is not None:
+                    handle.close()
+            self._reader = self._writer = None
+
+
+def model_identity(llm: Any) -> str:
+    """Nombre de un modelo de chat (su atributo model o model_name, o el de su clase)."""
+    return str(getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Modelo de chat que graba o reproduce las respuestas de otro modelo.
+
+    El nombre del modelo forma parte de la clave, así un cassette grabado con un modelo no
+    se reproduce para otro. Las llamadas en streaming graban cada fragmento con su
+    retraso, y la reproducción con latencia original respeta el tiempo hasta el primer
+    token.
+
+    Ejemplo:
+        llm = CassetteChatModel(inner=ChatGoogleGenerativeAI(model="gemini-1.5-pro"),
+                                path="cassettes/flujos.jsonl", mode="auto")
+        graph = build_parallel_graph(llm)
+    """
+
+    inner: Any = None
+    path: str
+    mode: str = "auto"
+    replay_latency: str = "original"
+    model_name: Optional[str] = None
+
+    _cassette: Any = PrivateAttr(default=None)
+    _stats: Dict[str, int] = PrivateAttr(default_factory=lambda: {"hits": 0, "misses": 0, "recorded": 0})
+    _stats_lock: Any = PrivateAttr(default_factory=threading.Lock)
+
+    def __init__(self, **data):
+        super().__init__(**data)
+        if self.mode not in CASSETTE_MODES:
+            raise ValueError(f"mode debe ser uno de {CASSETTE_MODES}")
+        if self.replay_latency not in REPLAY_LATENCIES:
+            raise ValueError(f"replay_latency debe ser uno de {REPLAY_LATENCIES}")
+        if self.mode != "replay" and self.inner is None:
+            raise ValueError("Los modos record y auto necesitan el modelo real (inner)")
+        if self.model_name is None:
+            if self.inner is None:
+                raise ValueError("El modo replay sin modelo real necesita model_name")
+            self.model_name = model_identity(self.inner)
+        # Algunos clientes (Gemini) anteponen "models/" al nombre con que se crearon
+        if self.model_name.startswith("models/"):
+            self.model_name = self.model_name[len("models/"):]
+        self._cassette = Cassette(self.path)
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Respuestas reproducidas, solicitudes no encontradas y grabaciones nuevas."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _count(self, name: str) -> None:
+        # Las llamadas síncronas llegan desde el threadpool
+        with self._stats_lock:
+            self._stats[name] += 1
+
+    def bind_tools(self, tools, **kwargs):
+        """Asocia herramientas en el formato de OpenAI; se reenvían al modelo real al grabar."""
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _lookup(self, messages: List[BaseMessage], kwargs: Dict[str, Any]):
+        """Clave y grabación (o None) de una solicitud."""
+        key = request_key(messages, {**kwargs, "model": self.model_name})
+        record = None if self.mode == "record" else self._cassette.get(key)
+        if record is not None:
+            self._count("hits")
+        else:
+            self._count("misses")
+            if self.mode == "replay":
+                raise CassetteMiss(key)
+        return key, record
+
+    def _inner_model(self, kwargs: Dict[str, Any]):
+        """Modelo real con las mismas herramientas y parámetros de la llamada."""
+        params = dict(kwargs)
+        tools = params.pop("tools", None)
+        if tools:
+            return self.inner.bind_tools(tools, **params)
+        return self.inner.bind(**params) if params else self.inner
+
+    def _save(self, key: str, messages: List[BaseMessage], response: BaseMessage, latency: float,
+              chunks: Optional[List[Dict[str, Any]]] = None) -> None:
+        record = {
+            "model": self.model_name,
+            "latency": latency,
+            "recorded_at": time.time(),
+            "request": [_canonical_message(m) for m in messages],
+            "response": message_to_dict(response),
+        }
+        if chunks is not None:
+            record["chunks"] = chunks
+        self._cassette.put(key, record)
+        self._count("recorded")
+
+    @staticmethod
+    def _result(message: BaseMessage) -> ChatResult:
+        if not isinstance(message, AIMessage):
+            message = AIMessage(**message.model_dump(exclude={"type"}))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _replayed(self, record: Dict[str, Any]) -> BaseMessage:
+        return messages_from_dict([record["response"]])[0]
+
+    def _replayed_chunks(self, record: Dict[str, Any]) -> List[Tuple[float, AIMessageChunk]]:
+        """Fragmentos grabados con su retraso; una respuesta sin ellos es un único fragmento."""
+        if "chunks" in record:
+            return [(item["delay"], messages_from_dict([item["chunk"]])[0]) for item in record["chunks"]]
+        message = self._replayed(record)
+        chunk = AIMessageChunk(**message.model_dump(exclude={"type", "tool_calls", "invalid_tool_calls"}))
+        chunk.tool_call_chunks = [
+            {"name": tc["name"], "args": json.dumps(tc["args"]), "id": tc.get("id"), "index": i}
+            for i, tc in enumerate(getattr(message, "tool_calls", None) or [])
+        ]
+        return [(record.get("latency", 0.0), chunk)]
+
+    def _delay(self, seconds: float) -> float:
+        return seconds if self.replay_latency == "original" else 0.0
+
+    @staticmethod
+    def _recorded_chunk(chunk: AIMessageChunk, delay: float) -> Dict[str, Any]:
+        return {"delay": delay, "chunk": message_to_dict(chunk)}
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if stop is not None:
+            kwargs["stop"] = stop
+        key, record = self._lookup(messages, kwargs)
+        if record is not None:
+            time.sleep(self._delay(record.get("latency", 0.0)))
+            return self._result(self._replayed(record))
+
+        start = time.perf_counter()
+        response = self._inner_model(kwargs).invoke(messages)
+        self._save(key, messages, response, time.perf_counter() - start)
+        return self._result(response)
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if stop is not None:
+            kwargs["stop"] = stop
+        key, record = self._lookup(messages, kwargs)
+        if record is not None:
+            await asyncio.sleep(self._delay(record.get("latency", 0.0)))
+            return self._result(self._replayed(record))
+
+        start = time.perf_counter()
+        response = await self._inner_model(kwargs).ainvoke(messages)
+        self._save(key, messages, response, time.perf_counter() - start)
+        return self._result(response)
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        if stop is not None:
+            kwargs["stop"] = stop
+        key, record = self._lookup(messages, kwargs)
+        if record is not None:
+            for delay, chunk in self._replayed_chunks(record):
+                time.sleep(self._delay(delay))
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+            return
+
+        start = last = time.perf_counter()
+        chunks, recorded = [], []
+        for chunk in self._inner_model(kwargs).stream(messages):
+            now = time.perf_counter()
+            chunks.append(chunk)
+            recorded.append(self._recorded_chunk(chunk, now - last))
+            last = now
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+        if chunks:
+            response = message_chunk_to_message(reduce(operator.add, chunks))
+            self._save(key, messages, response, time.perf_counter() - start, recorded)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        if stop is not None:
+            kwargs["stop"] = stop
+        key, record = self._lookup(messages, kwargs)
+        if record is not None:
+            for delay, chunk in self._replayed_chunks(record):
+                await asyncio.sleep(self._delay(delay))
+                generation = ChatGenerationChunk(message=chunk)
+                if run_manager:
+                    await run_manager.on_llm_new_token(generation.text, chunk=generation)
+                yield generation
+            return
+
+        start = last = time.perf_counter()
+        chunks, recorded = [], []
+        async for chunk in self._inner_model(kwargs).astream(messages):
+            now = time.perf_counter()
+            chunks.append(chunk)
+            recorded.append(self._recorded_chunk(chunk, now - last))
+            last = now
+            generation = ChatGenerationChunk(message=chunk)
+            if run_manager:
+                await run_manager.on_llm_new_token(generation.text, chunk=generation)
+            yield generation
+        if chunks:
+            response = message_chunk_to_message(reduce(operator.add, chunks))
+            self._save(key, messages, response, time.perf_counter() - start, recorded)
+
+
+def replay_only() -> bool:
+    """Indica si las variables de entorno configuran un cassette en modo replay (sin API key)."""
+    return bool(os.environ.get("CASSETTE_PATH")) and os.environ.get("CASSETTE_MODE") == "replay"
+
+
+def cassette_from_env(
+    factory: Callable[[], BaseChatModel], model_name: Optional[str] = None
+) -> Optional[CassetteChatModel]:
+    """
+    Crea un CassetteChatModel a partir de las variables de entorno.
+
+    - CASSETTE_PATH: archivo del cassette (si no está definida se devuelve None)
+    - CASSETTE_MODE: record, replay o auto (por defecto auto)
+    - CASSETTE_LATENCY: original o zero (por defecto original)
+
+    Args:
+        factory: Función que crea el modelo real; no se llama en modo replay.
+        model_name: Nombre del modelo que crea factory (forma parte de la clave de cada
+                    solicitud). Por defecto se toma del modelo creado.
+
+    Returns:
+        Modelo con cassette, o None si CASSETTE_PATH no está definida.
+    """
+    path = os.environ.get("CASSETTE_PATH")
+    if not path:
+        return None
+    mode = os.environ.get("CASSETTE_MODE", "auto")
+    return CassetteChatModel(
+        inner=None if mode == "replay" else factory(),
+        path=path,
+        mode=mode,
+        replay_latency=os.environ.get("CASSETTE_LATENCY", "original"),
+        model_name=model_name,
+    )
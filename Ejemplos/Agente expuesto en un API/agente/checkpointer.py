@@ -0,0 +1,1552 @@
+"""
+Checkpointer en memoria con representación compacta de los mensajes.
+
+MemorySaver guarda en cada checkpoint una copia serializada de la lista completa de
+mensajes, por lo que un hilo con n mensajes ocupa memoria proporcional a n² y cada
+mensaje conserva todos los diccionarios de metadatos de LangChain.
+
+CompactMemorySaver guarda cada mensaje una sola vez por hilo:
+- Los mensajes se almacenan como MessageRecord (clase con __slots__) con el rol y los
+  nombres de herramientas internados y sin los campos que tienen su valor por defecto
+- Los registros viven en segmentos de solo-agregado; cada checkpoint guarda únicamente
+  un puntero (segmento, longitud) al prefijo del historial que le corresponde
+- Los mensajes de LangChain se reconstruyen solo al leer un checkpoint, es decir,
+  cuando se construye un prompt o se devuelve el historial
+- Un hilo se puede bifurcar desde cualquier checkpoint en O(1): el hilo nuevo apunta al
+  mismo segmento y solo copia sus propios registros cuando su historial diverge
+
+ShardedMemorySaver reparte los hilos entre varios CompactMemorySaver independientes,
+cada uno con su propio lock, para que las solicitudes concurrentes no se serialicen.
+
+Ambos mantienen un índice de hilos (ThreadInfo) con las fechas de creación y de última
+actividad, el número de mensajes y el tamaño aproximado en bytes de cada hilo. El índice
+se actualiza de forma incremental en cada checkpoint, de modo que listar, resumir y
+expirar conversaciones no requiere leer ni reconstruir los mensajes.
+
+Opcionalmente el almacén tiene dos capas: los hilos activos quedan en memoria (capa
+caliente) y los inactivos se serializan, se comprimen y se vuelcan a un archivo de
+segmentos (capa fría, ver cold_storage.py). Un hilo frío vuelve a memoria de forma
+transparente con su siguiente lectura o escritura; su entrada del índice siempre queda
+en memoria, así listar y expirar hilos no los carga, y listar sus checkpoints los lee
+del volcado sin devolverlos a memoria. La serialización y la compresión se hacen fuera
+del lock (y en un hilo aparte desde los métodos asíncronos), así volcar o cargar un
+hilo no detiene a los demás hilos de la partición.
+"""
+
+import asyncio
+import heapq
+import os
+import pickle
+import random
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, deque
+from typing import Callable, List, Dict, Any, Optional, Iterable, Iterator, Sequence, Tuple
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    ToolMessage,
+)
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from agente.cold_storage import ColdStore
+
+try:
+    from langgraph.checkpoint.base import get_checkpoint_metadata
+except ImportError:  # Versiones anteriores de langgraph-checkpoint
+    def get_checkpoint_metadata(config: RunnableConfig, metadata: CheckpointMetadata) -> CheckpointMetadata:
+        # rollback_thread identifica los checkpoints de un turno por su turn_id
+        turn_id = config.get("configurable", {}).get("turn_id")
+        return {**metadata, "turn_id": turn_id} if turn_id else metadata
+
+
+# Clases de mensaje que admiten representación compacta
+_MESSAGE_CLASSES = {
+    "human": HumanMessage,
+    "ai": AIMessage,
+    "tool": ToolMessage,
+    "system": SystemMessage,
+}
+
+# Campos que MessageRecord guarda en sus propios slots
+_CORE_FIELDS = {"type", "content", "id", "name", "tool_calls", "tool_call_id"}
+
+# Valores por defecto de cada clase de mensaje (se calculan una sola vez)
+_DEFAULTS: Dict[type, Dict[str, Any]] = {}
+
+# Campos por los que se puede ordenar el índice de hilos
+THREAD_SORT_FIELDS = ("last_active", "created_at", "message_count", "bytes", "checkpoints", "thread_id")
+
+# Umbrales de inactividad reportados en las estadísticas del índice
+IDLE_BUCKETS = {"1h": 3600, "1d": 86400, "7d": 7 * 86400}
+
+
+def _field_defaults(cls: type) -> Dict[str, Any]:
+    """Obtiene los valores por defecto de los campos de una clase de mensaje."""
+    defaults = _DEFAULTS.get(cls)
+    if defaults is None:
+        defaults = {}
+        for name, field in cls.model_fields.items():
+            if field.default_factory is not None:
+                defaults[name] = field.default_factory()
+            else:
+                defaults[name] = field.default
+        _DEFAULTS[cls] = defaults
+    return defaults
+
+
+class MessageRecord:
+    """
+    Representación compacta de un mensaje almacenado.
+
+    Solo guarda los campos con información: el resto de metadatos se agrupa en
+    'extra' únicamente cuando difiere del valor por defecto.
+    """
+
+    __slots__ = ("kind", "content", "id", "name", "tool_calls", "tool_call_id", "extra")
+
+    def __init__(self, kind, content, id=None, name=None, tool_calls=None, tool_call_id=None, extra=None):
+        self.kind = kind
+        self.content = content
+        self.id = id
+        self.name = name
+        self.tool_calls = tool_calls
+        self.tool_call_id = tool_call_id
+        self.extra = extra
+
+    @classmethod
+    def from_message(cls, message: BaseMessage) -> "MessageRecord":
+        """
+        Convierte un mensaje de LangChain a su representación compacta.
+
+        Args:
+            message: Mensaje a convertir.
+
+        Returns:
+            Registro compacto equivalente.
+        """
+        message_cls = _MESSAGE_CLASSES.get(message.type)
+        if message_cls is None or type(message) is not message_cls:
+            # Tipos poco comunes se conservan tal cual
+            return cls("raw", None, message.id, extra=message)
+
+        defaults = _field_defaults(message_cls)
+        extra = {
+            key: value
+            for key, value in message.__dict__.items()
+            if key not in _CORE_FIELDS and value != defaults.get(key)
+        }
+
+        tool_calls = getattr(message, "tool_calls", None)
+        if tool_calls:
+            tool_calls = tuple(
+                (sys.intern(tc["name"]), tc["args"], tc.get("id")) for tc in tool_calls
+            )
+
+        return cls(
+            sys.intern(message.type),
+            message.content,
+            message.id,
+            sys.intern(message.name) if message.name else None,
+            tool_calls or None,
+            getattr(message, "tool_call_id", None),
+            extra or None,
+        )
+
+    def to_message(self) -> BaseMessage:
+        """
+        Reconstruye el mensaje de LangChain.
+
+        Returns:
+            Mensaje equivalente al original.
+        """
+        if self.kind == "raw":
+            return self.extra
+
+        kwargs = {"content": self.content, "id": self.id}
+        if self.name is not None:
+            kwargs["name"] = self.name
+        if self.tool_calls:
+            kwargs["tool_calls"] = [
+                {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+                for name, args, call_id in self.tool_calls
+            ]
+        if self.tool_call_id is not None:
+            kwargs["tool_call_id"] = self.tool_call_id
+        if self.extra:
+            kwargs.update(self.extra)
+        return _MESSAGE_CLASSES[self.kind](**kwargs)
+
+    def matches(self, message: BaseMessage) -> bool:
+        """Indica si el registro corresponde al mismo mensaje (mismo id y contenido)."""
+        return self.id == message.id and (self.content is message.content or self.content == message.content)
+
+
+class _Segment:
+    """
+    Tramo de solo-agregado del historial de un hilo.
+
+    Las posiciones [0, base) se leen del segmento padre y los registros propios
+    ocupan las posiciones [base, base + len(records)). Varios checkpoints (o
+    bifurcaciones) comparten el mismo prefijo sin copiarlo.
+
+    Un segmento alcanzable desde otro hilo (bifurcación) queda congelado: nadie vuelve
+    a agregarle registros, porque cada hilo lo modificaría con el lock de su partición.
+    """
+
+    __slots__ = ("parent", "base", "records", "frozen")
+
+    def __init__(self, parent: Optional["_Segment"], base: int, records: List[MessageRecord]):
+        self.parent = parent
+        self.base = base
+        self.records = records
+        self.frozen = False
+
+    @property
+    def end(self) -> int:
+        """Longitud total del historial que termina en este segmento."""
+        return self.base + len(self.records)
+
+    def freeze(self) -> None:
+        """Congela el segmento y sus ancestros (pasan a ser de solo lectura)."""
+        segment = self
+        while segment is not None and not segment.frozen:
+            segment.frozen = True
+            segment = segment.parent
+
+
+def iter_records(segment: Optional[_Segment], length: int) -> Iterator[MessageRecord]:
+    """
+    Recorre los primeros 'length' registros del historial que termina en 'segment'.
+
+    Args:
+        segment: Segmento final del historial.
+        length: Número de registros a recorrer.
+
+    Yields:
+        Registros en orden cronológico.
+    """
+    chain = []
+    while segment is not None and length > 0:
+        own = length - segment.base
+        if own > 0:
+            chain.append((segment.records, own))
+            length = segment.base
+        segment = segment.parent
+
+    for records, own in reversed(chain):
+        for i in range(own):
+            yield records[i]
+
+
+def _trim_segments(namespaces: Dict[str, Dict[str, Any]], segments: Iterable[_Segment]) -> None:
+    """
+    Libera los registros de segmentos que ya no alcanza ningún checkpoint del hilo.
+
+    Tras descartar checkpoints, los registros que sus turnos agregaron al final de un
+    segmento quedarían retenidos y el turno siguiente apilaría un segmento nuevo encima.
+    Cada segmento se recorta hasta la última posición que aún usa un checkpoint (propio
+    o de un segmento hijo). Los segmentos congelados los comparte otro hilo y no se tocan.
+    """
+    needed = {id(segment): 0 for segment in segments}
+    for checkpoints in namespaces.values():
+        for stored in checkpoints.values():
+            segment, length = stored.segment, stored.length
+            while segment is not None:
+                if id(segment) in needed:
+                    needed[id(segment)] = max(needed[id(segment)], length - segment.base)
+                length = min(length, segment.base)
+                segment = segment.parent
+    for segment in segments:
+        if not segment.frozen:
+            del segment.records[needed[id(segment)]:]
+
+
+class _StoredCheckpoint:
+    """
+    Checkpoint almacenado: datos serializados y puntero al historial de mensajes.
+
+    'size' son los bytes que el checkpoint sumó al índice de hilos.
+    """
+
+    __slots__ = ("checkpoint", "metadata", "parent_id", "segment", "length", "size")
+
+    def __init__(self, checkpoint, metadata, parent_id, segment, length, size=0):
+        self.checkpoint = checkpoint
+        self.metadata = metadata
+        self.parent_id = parent_id
+        self.segment = segment
+        self.length = length
+        self.size = size
+
+
+def _record_size(record: MessageRecord) -> int:
+    """Tamaño aproximado en bytes del contenido y las llamadas a herramientas de un registro."""
+    content = record.extra.content if record.kind == "raw" else record.content
+    size = len(content.encode("utf-8")) if isinstance(content, str) else len(str(content))
+    if record.tool_calls:
+        size += sum(len(name) + len(str(args)) for name, args, _ in record.tool_calls)
+    return size
+
+
+class ThreadInfo:
+    """
+    Entrada del índice de hilos.
+
+    'bytes' cuenta los checkpoints serializados y los mensajes propios del hilo; el
+    prefijo que un hilo bifurcado comparte con su origen se cuenta solo en el origen.
+    'cold' indica si el hilo está volcado en la capa fría.
+    """
+
+    __slots__ = ("thread_id", "created_at", "last_active", "message_count", "checkpoints", "bytes", "cold")
+
+    def __init__(self, thread_id: str, now: float):
+        self.thread_id = thread_id
+        self.created_at = now
+        self.last_active = now
+        self.message_count = 0
+        self.checkpoints = 0
+        self.bytes = 0
+        self.cold = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Representación serializable de la entrada."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def page_threads(
+    infos: Sequence[ThreadInfo],
+    offset: int = 0,
+    limit: int = 50,
+    sort: str = "last_active",
+    descending: bool = True,
+) -> Dict[str, Any]:
+    """
+    Página ordenada del índice de hilos.
+
+    Solo se ordenan los offset + limit primeros elementos (heap), no todo el índice.
+
+    Returns:
+        Total de hilos y lista de entradas de la página como diccionarios.
+    """
+    if sort not in THREAD_SORT_FIELDS:
+        raise ValueError(f"sort debe ser uno de {THREAD_SORT_FIELDS}")
+    select = heapq.nlargest if descending else heapq.nsmallest
+    top = select(offset + limit, infos, key=lambda info: getattr(info, sort))
+    return {"total": len(infos), "threads": [info.as_dict() for info in top[offset:]]}
+
+
+def summarize_threads(infos: Sequence[ThreadInfo], messages: int, size: int, largest: int = 5) -> Dict[str, Any]:
+    """
+    Estadísticas agregadas del índice de hilos.
+
+    Args:
+        infos: Entradas del índice.
+        messages: Total de mensajes (mantenido de forma incremental).
+        size: Total de bytes (mantenido de forma incremental).
+        largest: Número de hilos más grandes a reportar.
+
+    Returns:
+        Hilos, mensajes, bytes, hilos inactivos por umbral y los hilos más grandes.
+    """
+    now = time.time()
+    return {
+        "threads": len(infos),
+        "messages": messages,
+        "bytes": size,
+        "idle": {
+            label: sum(1 for info in infos if now - info.last_active > seconds)
+            for label, seconds in IDLE_BUCKETS.items()
+        },
+        "largest": [info.as_dict() for info in heapq.nlargest(largest, infos, key=lambda info: info.bytes)],
+    }
+
+
+def _percentile(ordered: Sequence[float], p: float) -> float:
+    """Percentil p (0-100) de una lista ordenada por el método del rango más cercano."""
+    if not ordered:
+        return 0.0
+    return ordered[max(0, min(len(ordered) - 1, int(len(ordered) * p / 100)))]
+
+
+def _latency_summary(seconds: Sequence[float]) -> Dict[str, float]:
+    """p50, p99 y máximo en milisegundos de una lista de latencias en segundos."""
+    ordered = sorted(seconds)
+    return {
+        "p50": _percentile(ordered, 50) * 1000,
+        "p99": _percentile(ordered, 99) * 1000,
+        "max": (ordered[-1] if ordered else 0.0) * 1000,
+    }
+
+
+class _InstrumentedLock:
+    """
+    RLock que cuenta sus adquisiciones y el tiempo de espera cuando está ocupado.
+
+    Los contadores se actualizan con el lock tomado, por lo que no necesitan otro lock.
+    """
+
+    __slots__ = ("_lock", "acquisitions", "contended", "wait_seconds")
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.acquisitions = 0
+        self.contended = 0
+        self.wait_seconds = 0.0
+
+    def __enter__(self):
+        if self._lock.acquire(blocking=False):
+            self.acquisitions += 1
+            return self
+        start = time.perf_counter()
+        self._lock.acquire()
+        self.acquisitions += 1
+        self.contended += 1
+        self.wait_seconds += time.perf_counter() - start
+        return self
+
+    def __exit__(self, *exc):
+        self._lock.release()
+
+
+class CompactMemorySaver(BaseCheckpointSaver):
+    """
+    Checkpointer en memoria que almacena los mensajes de forma compacta y compartida.
+
+    Es un reemplazo directo de MemorySaver para grafos cuyo estado guarda los
+    mensajes en el canal 'messages' (por ejemplo, MessagesState).
+    """
+
+    def __init__(
+        self,
+        *,
+        serde=None,
+        messages_key: str = "messages",
+        spill_path: Optional[str] = None,
+        max_hot_threads: Optional[int] = None,
+        spill_after: Optional[float] = None,
+        compression: str = "zlib",
+    ):
+        """
+        Inicializa el checkpointer.
+
+        Args:
+            serde: Serializador para el resto de canales y metadatos.
+            messages_key: Canal del estado que contiene la lista de mensajes.
+            spill_path: Archivo de la capa fría. None mantiene todos los hilos en memoria.
+            max_hot_threads: Máximo de hilos en memoria; al superarlo se vuelcan los
+                            usados hace más tiempo. None no limita.
+            spill_after: Segundos sin actividad tras los que spill_idle vuelca un hilo.
+            compression: Compresión de la capa fría ("zlib" o "zstd").
+        """
+        super().__init__(serde=serde)
+        if max_hot_threads is not None and max_hot_threads < 1:
+            raise ValueError("max_hot_threads debe ser al menos 1")
+        self.messages_key = messages_key
+        # thread_id -> checkpoint_ns -> checkpoint_id -> _StoredCheckpoint
+        self.storage: Dict[str, Dict[str, Dict[str, _StoredCheckpoint]]] = {}
+        # thread_id -> (checkpoint_ns, checkpoint_id) -> escrituras pendientes
+        self.writes: Dict[str, Dict[Tuple[str, str], Dict[Tuple[str, int], tuple]]] = {}
+        # thread_id -> entrada del índice de hilos, y totales del índice
+        self.threads: Dict[str, ThreadInfo] = {}
+        self._total_messages = 0
+        self._total_bytes = 0
+        self._lock = _InstrumentedLock()
+        # Capa fría: hilos calientes del menos al más recientemente usado
+        self.cold = ColdStore(spill_path, compression) if spill_path else None
+        self.max_hot_threads = max_hot_threads
+        self.spill_after = spill_after
+        self._hot: "OrderedDict[str, float]" = OrderedDict()
+        self._page_in_seconds: deque = deque(maxlen=1024)
+        self._spills = 0
+        self._page_ins = 0
+
+    # ------------------------------------------------------------------
+    # Capa fría
+    # ------------------------------------------------------------------
+
+    def _touch(self, thread_id: str) -> None:
+        """Marca un hilo como usado (con el lock tomado); _spill_excess aplica el límite."""
+        if self.cold is None or thread_id not in self.storage:
+            return
+        self._hot[thread_id] = time.monotonic()
+        self._hot.move_to_end(thread_id)
+
+    def _is_cold(self, thread_id: str) -> bool:
+        cold = self.cold
+        return cold is not None and thread_id in cold
+
+    def _over_hot_limit(self) -> bool:
+        return self.cold is not None and self.max_hot_threads is not None and len(self._hot) > self.max_hot_threads
+
+    def _install(self, thread_id: str, state: tuple, start: float) -> None:
+        """Registra en memoria un hilo leído de la capa fría (con el lock tomado)."""
+        storage, writes = state
+        self.storage[thread_id] = storage
+        if writes:
+            self.writes[thread_id] = writes
+        info = self.threads.get(thread_id)
+        if info is not None:
+            info.cold = False
+        self._page_ins += 1
+        self._page_in_seconds.append(time.perf_counter() - start)
+
+    def _page_in(self, thread_id: str) -> None:
+        """
+        Carga un hilo desde la capa fría si está volcado (sin el lock tomado).
+
+        Solo la copia del bloque comprimido se hace con el lock; la descompresión y la
+        deserialización, fuera de él. Si otra solicitud cargó el hilo mientras tanto, se
+        conserva la suya.
+        """
+        if not self._is_cold(thread_id):
+            return
+        start = time.perf_counter()
+        with self._lock:
+            cold = self.cold
+            if cold is None or thread_id not in cold:
+                return
+            compressed, version = cold.read(thread_id)
+        state = pickle.loads(cold.decompress(compressed))
+        with self._lock:
+            if self.cold is not cold or cold.version(thread_id) != version:
+                return
+            cold.delete(thread_id)
+            self._install(thread_id, state, start)
+            self._touch(thread_id)
+
+    def _ensure_hot(self, thread_id: str) -> None:
+        """
+        Carga un hilo desde la capa fría si está volcado (con el lock tomado).
+
+        Las operaciones llaman antes a _page_in; aquí solo se descomprime con el lock si
+        el hilo se volvió a volcar entre ambas llamadas.
+        """
+        if self.cold is None:
+            return
+        if thread_id in self.cold:
+            start = time.perf_counter()
+            self._install(thread_id, pickle.loads(self.cold.pop(thread_id)), start)
+        self._touch(thread_id)
+
+    def _spill(self, thread_id: str) -> bool:
+        """
+        Vuelca un hilo a la capa fría y lo quita de memoria (sin el lock tomado).
+
+        Se serializa y comprime fuera del lock una copia de los contenedores del hilo. Si
+        el hilo se usa mientras tanto, el volcado se descarta y el hilo sigue en memoria.
+
+        Returns:
+            True si el hilo quedó en la capa fría.
+        """
+        with self._lock:
+            cold, used = self.cold, self._hot.get(thread_id)
+            storage = self.storage.get(thread_id)
+            if cold is None or used is None:
+                return False
+            if storage is None:
+                del self._hot[thread_id]
+                return False
+            writes = self.writes.get(thread_id)
+            state = (
+                {ns: dict(checkpoints) for ns, checkpoints in storage.items()},
+                {key: dict(value) for key, value in writes.items()} if writes else None,
+            )
+        # Los segmentos compartidos con hilos bifurcados se copian en el volcado
+        data = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        compressed = cold.compress(data)
+        with self._lock:
+            if self.cold is not cold or self._hot.get(thread_id) != used:
+                return False
+            del self._hot[thread_id]
+            self.storage.pop(thread_id, None)
+            self.writes.pop(thread_id, None)
+            cold.put_compressed(thread_id, compressed, len(data))
+            info = self.threads.get(thread_id)
+            if info is not None:
+                info.cold = True
+            self._spills += 1
+        return True
+
+    def _spill_excess(self) -> None:
+        """Vuelca los hilos usados hace más tiempo mientras se supere max_hot_threads (sin el lock)."""
+        while self._over_hot_limit():
+            with self._lock:
+                if not self._over_hot_limit():
+                    return
+                oldest = next(iter(self._hot))
+            self._spill(oldest)
+
+    def _with_tiers(self, thread_id: str, operation: Callable, *args) -> Any:
+        """Ejecuta una operación sobre un hilo cargándolo antes y aplicando después el límite de hilos."""
+        self._page_in(thread_id)
+        result = operation(*args)
+        if self._over_hot_limit():
+            self._spill_excess()
+        return result
+
+    async def _awith_tiers(self, thread_id: str, operation: Callable, *args) -> Any:
+        """Como _with_tiers, pero la carga y el volcado corren en un hilo aparte del event loop."""
+        if self._is_cold(thread_id):
+            await asyncio.to_thread(self._page_in, thread_id)
+        result = operation(*args)
+        if self._over_hot_limit():
+            await asyncio.to_thread(self._spill_excess)
+        return result
+
+    def spill_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """
+        Vuelca a la capa fría los hilos sin actividad.
+
+        Cada hilo se comprime fuera del lock, para no bloquear las solicitudes en curso
+        mientras se vuelcan muchos hilos.
+
+        Args:
+            idle_seconds: Segundos sin actividad. Por defecto spill_after.
+
+        Returns:
+            Número de hilos volcados.
+        """
+        idle_seconds = self.spill_after if idle_seconds is None else idle_seconds
+        if self.cold is None or idle_seconds is None:
+            return 0
+        spilled = 0
+        while True:
+            with self._lock:
+                oldest = next(iter(self._hot.items()), None)
+                if self.cold is None or oldest is None or time.monotonic() - oldest[1] < idle_seconds:
+                    return spilled
+            # Si el hilo se usó mientras se comprimía, pasó al final del orden de uso
+            if self._spill(oldest[0]):
+                spilled += 1
+
+    def tier_stats(self) -> Dict[str, Any]:
+        """
+        Estado de las capas caliente y fría.
+
+        Returns:
+            Hilos en cada capa, volcados y cargas desde la capa fría, latencia de carga
+            (p50, p99 y máxima en milisegundos de las últimas cargas) y tamaño del archivo.
+        """
+        with self._lock:
+            latencies = list(self._page_in_seconds)
+            cold = self.cold.stats() if self.cold is not None else {}
+            stats = {
+                "hot_threads": len(self.storage),
+                "cold_threads": cold.get("cold_threads", 0),
+                "spills": self._spills,
+                "page_ins": self._page_ins,
+                "cold_bytes": cold.get("cold_bytes", 0),
+                "cold_raw_bytes": cold.get("cold_raw_bytes", 0),
+                "cold_file_bytes": cold.get("file_bytes", 0),
+            }
+        stats["page_in_ms"] = _latency_summary(latencies)
+        return stats
+
+    def close(self) -> None:
+        """Cierra y elimina el archivo de la capa fría."""
+        with self._lock:
+            if self.cold is not None:
+                self.cold.close()
+                self.cold = None
+
+    # ------------------------------------------------------------------
+    # Mensajes compactos
+    # ------------------------------------------------------------------
+
+    def _store_messages(
+        self,
+        parent: Optional[_StoredCheckpoint],
+        messages: Sequence[BaseMessage],
+    ) -> Tuple[_Segment, int, int]:
+        """
+        Guarda una lista de mensajes reutilizando el prefijo del checkpoint padre.
+
+        Args:
+            parent: Checkpoint padre (None si es el primero del hilo).
+            messages: Lista completa de mensajes del nuevo checkpoint.
+
+        Returns:
+            Puntero (segmento, longitud) al historial almacenado y bytes de los
+            registros nuevos.
+        """
+        segment, shared = None, 0
+        if parent is not None and parent.segment is not None:
+            segment = parent.segment
+            for record in iter_records(parent.segment, min(parent.length, len(messages))):
+                if not record.matches(messages[shared]):
+                    break
+                shared += 1
+
+        delta = [MessageRecord.from_message(msg) for msg in messages[shared:]]
+        if segment is not None and shared == segment.end and not segment.frozen:
+            # El padre termina donde termina el segmento y ningún otro hilo lo comparte
+            segment.records.extend(delta)
+        elif delta or segment is None:
+            # El historial diverge: nuevo segmento que comparte el prefijo común
+            segment = _Segment(segment, shared, delta)
+        return segment, len(messages), sum(_record_size(record) for record in delta)
+
+    def _index_checkpoint(self, thread_id: str, added_bytes: int, message_count: Optional[int]) -> None:
+        """Actualiza el índice de hilos tras guardar un checkpoint (con el lock tomado)."""
+        info = self.threads.get(thread_id)
+        now = time.time()
+        if info is None:
+            info = self.threads[thread_id] = ThreadInfo(thread_id, now)
+        info.last_active = now
+        info.checkpoints += 1
+        info.bytes += added_bytes
+        self._total_bytes += added_bytes
+        if message_count is not None:
+            self._total_messages += message_count - info.message_count
+            info.message_count = message_count
+
+    def _dump_write(self, channel: str, value: Any) -> tuple:
+        """Serializa una escritura; los mensajes se guardan como registros compactos."""
+        if channel == self.messages_key:
+            if isinstance(value, BaseMessage):
+                return ("compact", MessageRecord.from_message(value))
+            if isinstance(value, list) and value and all(isinstance(m, BaseMessage) for m in value):
+                return ("compact", [MessageRecord.from_message(m) for m in value])
+        return self.serde.dumps_typed(value)
+
+    def _load_write(self, value: tuple) -> Any:
+        """Reconstruye el valor de una escritura almacenada."""
+        if value[0] == "compact":
+            if isinstance(value[1], list):
+                return [record.to_message() for record in value[1]]
+            return value[1].to_message()
+        return self.serde.loads_typed(value)
+
+    def _load_checkpoint(self, stored: _StoredCheckpoint) -> Checkpoint:
+        """Reconstruye un checkpoint completo, materializando sus mensajes."""
+        checkpoint = self.serde.loads_typed(stored.checkpoint)
+        if stored.segment is not None:
+            checkpoint["channel_values"][self.messages_key] = [
+                record.to_message() for record in iter_records(stored.segment, stored.length)
+            ]
+        return checkpoint
+
+    def _build_tuple(
+        self,
+        thread_id: str,
+        checkpoint_ns: str,
+        checkpoint_id: str,
+        stored: _StoredCheckpoint,
+        metadata: Optional[CheckpointMetadata] = None,
+        thread_writes: Optional[Dict[Tuple[str, str], Dict[Tuple[str, int], tuple]]] = None,
+    ) -> CheckpointTuple:
+        """Construye el CheckpointTuple de un checkpoint almacenado (por defecto con las escrituras en memoria)."""
+        if thread_writes is None:
+            thread_writes = self.writes.get(thread_id, {})
+        writes = thread_writes.get((checkpoint_ns, checkpoint_id), {})
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self._load_checkpoint(stored),
+            metadata=metadata if metadata is not None else self.serde.loads_typed(stored.metadata),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": stored.parent_id,
+                    }
+                }
+                if stored.parent_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self._load_write(value))
+                for task_id, channel, value, _ in writes.values()
+            ],
+        )
+
+    # ------------------------------------------------------------------
+    # Interfaz BaseCheckpointSaver
+    # ------------------------------------------------------------------
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        Obtiene un checkpoint por id o el más reciente del hilo.
+
+        Args:
+            config: Configuración con thread_id y opcionalmente checkpoint_id.
+
+        Returns:
+            El checkpoint encontrado o None.
+        """
+        return self._with_tiers(config["configurable"]["thread_id"], self._get_tuple, config)
+
+    def _get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        with self._lock:
+            self._ensure_hot(thread_id)
+            checkpoints = self.storage.get(thread_id, {}).get(checkpoint_ns)
+            if not checkpoints:
+                return None
+            checkpoint_id = get_checkpoint_id(config) or max(checkpoints)
+            stored = checkpoints.get(checkpoint_id)
+            if stored is None:
+                return None
+            return self._build_tuple(thread_id, checkpoint_ns, checkpoint_id, stored)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """
+        Lista checkpoints del más reciente al más antiguo.
+
+        Los hilos de la capa fría se leen de su volcado sin cargarlos en memoria.
+
+        Args:
+            config: Configuración con el thread_id a listar (None para todos los hilos).
+            filter: Valores que deben coincidir en los metadatos.
+            before: Listar solo checkpoints anteriores a este.
+            limit: Número máximo de resultados.
+
+        Yields:
+            Checkpoints que cumplen los criterios.
+        """
+        with self._lock:
+            thread_ids = [config["configurable"]["thread_id"]] if config else self._all_thread_ids()
+        config_ns = config["configurable"].get("checkpoint_ns") if config else None
+        config_checkpoint_id = get_checkpoint_id(config) if config else None
+        before_id = get_checkpoint_id(before) if before else None
+
+        for thread_id in thread_ids:
+            with self._lock:
+                storage, cold = self.storage.get(thread_id), self.cold
+                if storage is not None:
+                    storage = {ns: dict(checkpoints) for ns, checkpoints in storage.items()}
+                    writes = {key: dict(value) for key, value in self.writes.get(thread_id, {}).items()}
+                elif cold is not None and thread_id in cold:
+                    compressed, _ = cold.read(thread_id)
+                else:
+                    continue
+            if storage is None:
+                storage, writes = pickle.loads(cold.decompress(compressed))
+                writes = writes or {}
+            namespaces = {
+                ns: sorted(checkpoints.items(), key=lambda item: item[0], reverse=True)
+                for ns, checkpoints in storage.items()
+            }
+            for checkpoint_ns, checkpoints in namespaces.items():
+                if config_ns is not None and checkpoint_ns != config_ns:
+                    continue
+                for checkpoint_id, stored in checkpoints:
+                    if config_checkpoint_id and checkpoint_id != config_checkpoint_id:
+                        continue
+                    if before_id and checkpoint_id >= before_id:
+                        continue
+                    metadata = self.serde.loads_typed(stored.metadata)
+                    if filter and not all(metadata.get(k) == v for k, v in filter.items()):
+                        continue
+                    if limit is not None and limit <= 0:
+                        return
+                    if limit is not None:
+                        limit -= 1
+                    yield self._build_tuple(thread_id, checkpoint_ns, checkpoint_id, stored, metadata, writes)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """
+        Guarda un checkpoint.
+
+        Args:
+            config: Configuración del hilo (incluye el checkpoint padre).
+            checkpoint: Checkpoint a guardar.
+            metadata: Metadatos del checkpoint.
+            new_versions: Versiones de canal actualizadas en este paso.
+
+        Returns:
+            Configuración que apunta al checkpoint guardado.
+        """
+        return self._with_tiers(
+            config["configurable"]["thread_id"], self._put, config, checkpoint, metadata, new_versions
+        )
+
+    def _put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        parent_id = config["configurable"].get("checkpoint_id")
+
+        values = dict(checkpoint["channel_values"])
+        messages = values.get(self.messages_key)
+        compact = isinstance(messages, list) and all(isinstance(m, BaseMessage) for m in messages)
+        if compact:
+            del values[self.messages_key]
+
+        serialized = self.serde.dumps_typed({**checkpoint, "channel_values": values})
+        serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        added_bytes = len(serialized[1]) + len(serialized_metadata[1])
+
+        with self._lock:
+            self._ensure_hot(thread_id)
+            checkpoints = self.storage.setdefault(thread_id, {}).setdefault(checkpoint_ns, {})
+            segment, length = None, 0
+            if compact:
+                parent = checkpoints.get(parent_id) if parent_id else None
+                segment, length, message_bytes = self._store_messages(parent, messages)
+                added_bytes += message_bytes
+            checkpoints[checkpoint["id"]] = _StoredCheckpoint(
+                serialized, serialized_metadata, parent_id, segment, length, added_bytes
+            )
+            # Los checkpoints de subgrafos suman bytes pero no definen los mensajes del hilo
+            self._index_checkpoint(
+                thread_id, added_bytes, length if compact and checkpoint_ns == "" else None
+            )
+            self._touch(thread_id)
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """
+        Guarda las escrituras intermedias de una tarea.
+
+        Args:
+            config: Configuración del checkpoint al que pertenecen.
+            writes: Pares (canal, valor) escritos por la tarea.
+            task_id: Identificador de la tarea.
+            task_path: Ruta de la tarea dentro del grafo.
+        """
+        self._with_tiers(config["configurable"]["thread_id"], self._put_writes, config, writes, task_id, task_path)
+
+    def _put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        with self._lock:
+            self._ensure_hot(thread_id)
+            stored = self.writes.setdefault(thread_id, {}).setdefault((checkpoint_ns, checkpoint_id), {})
+            for idx, (channel, value) in enumerate(writes):
+                key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+                if key[1] >= 0 and key in stored:
+                    continue
+                stored[key] = (task_id, channel, self._dump_write(channel, value), task_path)
+
+    def fork_thread(
+        self,
+        source_thread_id: str,
+        target_thread_id: str,
+        checkpoint_id: Optional[str] = None,
+        checkpoint_ns: str = "",
+    ) -> str:
+        """
+        Crea un hilo nuevo a partir de un checkpoint de otro hilo (copy-on-write).
+
+        El hilo nuevo recibe un único checkpoint que comparte el checkpoint serializado y
+        el puntero (segmento, longitud) del original, por lo que el costo no depende de
+        la longitud del historial. Al agregar mensajes, _store_messages crea un segmento
+        propio sin modificar el prefijo compartido.
+
+        Args:
+            source_thread_id: Hilo de origen.
+            target_thread_id: Hilo a crear.
+            checkpoint_id: Checkpoint de origen. Por defecto el más reciente.
+            checkpoint_ns: Espacio de nombres del checkpoint.
+
+        Returns:
+            Id del checkpoint del hilo nuevo.
+
+        Raises:
+            KeyError: Si no existe el hilo o el checkpoint de origen.
+            ValueError: Si el hilo de destino ya existe.
+        """
+        fork = self._fork_entry(source_thread_id, checkpoint_id, checkpoint_ns)
+        self._adopt_thread(target_thread_id, fork)
+        return fork[1]
+
+    def _fork_entry(self, source_thread_id: str, checkpoint_id: Optional[str], checkpoint_ns: str) -> tuple:
+        """
+        Prepara el checkpoint de un hilo bifurcado (sin registrarlo todavía).
+
+        Returns:
+            Tupla (checkpoint_ns, checkpoint_id, checkpoint almacenado, escrituras pendientes).
+        """
+        self._page_in(source_thread_id)
+        with self._lock:
+            self._ensure_hot(source_thread_id)
+            checkpoints = self.storage.get(source_thread_id, {}).get(checkpoint_ns)
+            if not checkpoints:
+                raise KeyError(f"El hilo {source_thread_id} no tiene checkpoints")
+            checkpoint_id = checkpoint_id or max(checkpoints)
+            stored = checkpoints.get(checkpoint_id)
+            if stored is None:
+                raise KeyError(f"El checkpoint {checkpoint_id} no existe en el hilo {source_thread_id}")
+            writes = self.writes.get(source_thread_id, {}).get((checkpoint_ns, checkpoint_id))
+            writes = dict(writes) if writes else None
+            if stored.segment is not None:
+                # Desde ahora ambos hilos agregan sus mensajes en segmentos propios
+                stored.segment.freeze()
+
+        metadata = self.serde.loads_typed(stored.metadata)
+        metadata["forked_from"] = {"thread_id": source_thread_id, "checkpoint_id": checkpoint_id}
+        serialized_metadata = self.serde.dumps_typed(metadata)
+        forked = _StoredCheckpoint(
+            stored.checkpoint, serialized_metadata, None, stored.segment, stored.length,
+            len(stored.checkpoint[1]) + len(serialized_metadata[1]),
+        )
+        return checkpoint_ns, checkpoint_id, forked, writes
+
+    def _adopt_thread(self, thread_id: str, fork: tuple) -> None:
+        """Registra como hilo nuevo un checkpoint preparado por _fork_entry."""
+        checkpoint_ns, checkpoint_id, stored, writes = fork
+        with self._lock:
+            if self.storage.get(thread_id) or (self.cold is not None and thread_id in self.cold):
+                raise ValueError(f"El hilo {thread_id} ya existe")
+            self.storage[thread_id] = {checkpoint_ns: {checkpoint_id: stored}}
+            if writes:
+                self.writes[thread_id] = {(checkpoint_ns, checkpoint_id): writes}
+            self._index_checkpoint(
+                thread_id, stored.size, stored.length if checkpoint_ns == "" else None
+            )
+            self._touch(thread_id)
+        self._spill_excess()
+
+    def _all_thread_ids(self) -> List[str]:
+        """Hilos de ambas capas (con el lock tomado)."""
+        if self.cold is None:
+            return list(self.storage)
+        return [*self.storage, *self.cold.keys()]
+
+    def thread_ids(self) -> List[str]:
+        """Identificadores de los hilos almacenados (en memoria o en la capa fría)."""
+        with self._lock:
+            return self._all_thread_ids()
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Tamaño del almacén y contención de su lock.
+
+        Returns:
+            Hilos (de ambas capas), checkpoints en memoria, adquisiciones del lock,
+            adquisiciones que tuvieron que esperar ("contended") y segundos totales de espera.
+        """
+        with self._lock:
+            checkpoints = sum(
+                len(by_id) for namespaces in self.storage.values() for by_id in namespaces.values()
+            )
+            return {
+                "threads": len(self.storage) + (len(self.cold) if self.cold is not None else 0),
+                "checkpoints": checkpoints,
+                "lock_acquisitions": self._lock.acquisitions,
+                "lock_contended": self._lock.contended,
+                "lock_wait_seconds": self._lock.wait_seconds,
+            }
+
+    def checkpoint_summaries(self, thread_id: str, checkpoint_ns: str = "") -> List[Dict[str, Any]]:
+        """
+        Resume los checkpoints de un hilo sin reconstruir sus mensajes.
+
+        Args:
+            thread_id: Hilo a consultar.
+            checkpoint_ns: Espacio de nombres de los checkpoints.
+
+        Returns:
+            Lista del más reciente al más antiguo con checkpoint_id, parent_id,
+            message_count, step y source.
+        """
+        self._page_in(thread_id)
+        with self._lock:
+            self._ensure_hot(thread_id)
+            checkpoints = sorted(self.storage.get(thread_id, {}).get(checkpoint_ns, {}).items(), reverse=True)
+        summaries = []
+        for checkpoint_id, stored in checkpoints:
+            metadata = self.serde.loads_typed(stored.metadata)
+            summaries.append({
+                "checkpoint_id": checkpoint_id,
+                "parent_id": stored.parent_id,
+                "message_count": stored.length,
+                "step": metadata.get("step"),
+                "source": metadata.get("source"),
+            })
+        return summaries
+
+    def delete_thread(self, thread_id: str) -> None:
+        """
+        Elimina todos los checkpoints y escrituras de un hilo.
+
+        Args:
+            thread_id: Hilo a eliminar.
+        """
+        with self._lock:
+            self.storage.pop(thread_id, None)
+            self.writes.pop(thread_id, None)
+            if self.cold is not None:
+                self._hot.pop(thread_id, None)
+                self.cold.delete(thread_id)
+            info = self.threads.pop(thread_id, None)
+            if info is not None:
+                self._total_messages -= info.message_count
+                self._total_bytes -= info.bytes
+
+    def rollback_thread(
+        self, thread_id: str, checkpoint_id: Optional[str], turn_id: Optional[str] = None
+    ) -> int:
+        """
+        Descarta los checkpoints y escrituras de un hilo posteriores a un checkpoint.
+
+        Deja el hilo como estaba antes de un turno interrumpido (por ejemplo, cancelado
+        por la desconexión del cliente): sin el mensaje del usuario ni llamadas a
+        herramientas sin respuesta. Los ids de checkpoint son ordenables por fecha, así
+        que se descartan también los de los subgrafos del turno.
+
+        Con turn_id solo se descartan los checkpoints que guardó ese turno (LangGraph
+        copia el turn_id de la configuración en sus metadatos): un turno concurrente en
+        el mismo hilo conserva los suyos.
+
+        Args:
+            thread_id: Hilo a restaurar.
+            checkpoint_id: Último checkpoint que se conserva. None si el turno
+                          interrumpido era el primero del hilo.
+            turn_id: Turno cuyos checkpoints se descartan. None descarta todos los
+                    posteriores a checkpoint_id.
+
+        Returns:
+            Número de checkpoints descartados.
+        """
+        self._page_in(thread_id)
+        with self._lock:
+            self._ensure_hot(thread_id)
+            namespaces = self.storage.get(thread_id)
+            if not namespaces:
+                return 0
+
+            discarded = set()
+            for checkpoint_ns, checkpoints in namespaces.items():
+                for cid, stored in checkpoints.items():
+                    if checkpoint_id is not None and cid <= checkpoint_id:
+                        continue
+                    if turn_id is not None and self.serde.loads_typed(stored.metadata).get("turn_id") != turn_id:
+                        continue
+                    discarded.add((checkpoint_ns, cid))
+            removed = len(discarded)
+            if removed == sum(len(checkpoints) for checkpoints in namespaces.values()):
+                # No queda nada del hilo: el turno interrumpido era el primero
+                self.delete_thread(thread_id)
+                return removed
+
+            removed_bytes = 0
+            segments = {}
+            for checkpoint_ns, cid in discarded:
+                checkpoints = namespaces[checkpoint_ns]
+                stored = checkpoints.pop(cid)
+                removed_bytes += stored.size
+                segment = stored.segment
+                while segment is not None and not segment.frozen:
+                    segments[id(segment)] = segment
+                    segment = segment.parent
+                if not checkpoints:
+                    del namespaces[checkpoint_ns]
+            _trim_segments(namespaces, segments.values())
+            writes = self.writes.get(thread_id)
+            if writes:
+                for key in [key for key in writes if key in discarded]:
+                    del writes[key]
+
+            info = self.threads.get(thread_id)
+            if info is not None and removed:
+                info.checkpoints -= removed
+                info.bytes -= removed_bytes
+                self._total_bytes -= removed_bytes
+                root = namespaces.get("")
+                message_count = root[max(root)].length if root else 0
+                self._total_messages += message_count - info.message_count
+                info.message_count = message_count
+            return removed
+
+    def delete_threads(self, predicate: Callable[[ThreadInfo], bool]) -> List[str]:
+        """
+        Elimina los hilos cuya entrada del índice cumple un predicado.
+
+        El predicado se evalúa sobre el índice con el lock tomado, así un hilo que recibe
+        un turno mientras tanto no se elimina con datos desactualizados.
+
+        Args:
+            predicate: Función que recibe un ThreadInfo y devuelve True si se elimina.
+
+        Returns:
+            Identificadores de los hilos eliminados.
+        """
+        with self._lock:
+            deleted = [thread_id for thread_id, info in self.threads.items() if predicate(info)]
+            for thread_id in deleted:
+                self.delete_thread(thread_id)
+        return deleted
+
+    def thread_info(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Entrada del índice de un hilo, o None si no existe."""
+        with self._lock:
+            info = self.threads.get(thread_id)
+            return info.as_dict() if info is not None else None
+
+    def thread_infos(self) -> List[ThreadInfo]:
+        """Entradas del índice de hilos."""
+        with self._lock:
+            return list(self.threads.values())
+
+    def list_thread_infos(
+        self, offset: int = 0, limit: int = 50, sort: str = "last_active", descending: bool = True
+    ) -> Dict[str, Any]:
+        """Página ordenada del índice de hilos (ver page_threads)."""
+        return page_threads(self.thread_infos(), offset, limit, sort, descending)
+
+    def thread_stats(self) -> Dict[str, Any]:
+        """Estadísticas agregadas del índice de hilos (ver summarize_threads)."""
+        with self._lock:
+            infos = list(self.threads.values())
+            messages, size = self._total_messages, self._total_bytes
+        return summarize_threads(infos, messages, size)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Versión asíncrona de get_tuple."""
+        return await self._awith_tiers(config["configurable"]["thread_id"], self._get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ):
+        """Versión asíncrona de list."""
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Versión asíncrona de put."""
+        return await self._awith_tiers(
+            config["configurable"]["thread_id"], self._put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Versión asíncrona de put_writes."""
+        await self._awith_tiers(
+            config["configurable"]["thread_id"], self._put_writes, config, writes, task_id, task_path
+        )
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Versión asíncrona de delete_thread."""
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        """Genera la siguiente versión de un canal (mismo formato que MemorySaver)."""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+class ShardedMemorySaver(BaseCheckpointSaver):
+    """
+    Checkpointer en memoria repartido en particiones independientes por thread_id.
+
+    Cada hilo vive siempre en la misma partición (crc32 del thread_id módulo el número de
+    particiones) y cada partición es un CompactMemorySaver con su propio lock y sus propias
+    estadísticas. Las solicitudes concurrentes de hilos distintos solo compiten por un
+    lock cuando caen en la misma partición.
+
+    Ejemplo:
+        memory = ShardedMemorySaver(shards=16)
+        graph = builder.compile(checkpointer=memory)
+        print(memory.stats())
+    """
+
+    def __init__(
+        self,
+        shards: int = 16,
+        *,
+        serde=None,
+        messages_key: str = "messages",
+        spill_dir: Optional[str] = None,
+        max_hot_threads: Optional[int] = None,
+        spill_after: Optional[float] = None,
+        compression: str = "zlib",
+    ):
+        """
+        Inicializa el checkpointer.
+
+        Args:
+            shards: Número de particiones.
+            serde: Serializador para el resto de canales y metadatos.
+            messages_key: Canal del estado que contiene la lista de mensajes.
+            spill_dir: Directorio de la capa fría (un archivo por partición). None
+                      mantiene todos los hilos en memoria.
+            max_hot_threads: Máximo total de hilos en memoria, repartido entre las particiones.
+            spill_after: Segundos sin actividad tras los que spill_idle vuelca un hilo.
+            compression: Compresión de la capa fría ("zlib" o "zstd").
+        """
+        if shards < 1:
+            raise ValueError("shards debe ser al menos 1")
+        super().__init__(serde=serde)
+        self.messages_key = messages_key
+        per_shard = -(-max_hot_threads // shards) if max_hot_threads is not None else None
+        self.shards = [
+            CompactMemorySaver(
+                serde=self.serde,
+                messages_key=messages_key,
+                spill_path=os.path.join(spill_dir, f"shard-{i}.cold") if spill_dir else None,
+                max_hot_threads=per_shard,
+                spill_after=spill_after,
+                compression=compression,
+            )
+            for i in range(shards)
+        ]
+
+    def shard_for(self, thread_id: str) -> CompactMemorySaver:
+        """Partición donde se almacena un hilo."""
+        return self.shards[zlib.crc32(thread_id.encode("utf-8")) % len(self.shards)]
+
+    def _shard(self, config: RunnableConfig) -> CompactMemorySaver:
+        return self.shard_for(config["configurable"]["thread_id"])
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Obtiene un checkpoint por id o el más reciente del hilo."""
+        return self._shard(config).get_tuple(config)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Lista checkpoints de un hilo o, si config es None, de todas las particiones."""
+        if config is not None:
+            yield from self._shard(config).list(config, filter=filter, before=before, limit=limit)
+            return
+        for shard in self.shards:
+            for item in shard.list(None, filter=filter, before=before, limit=limit):
+                if limit is not None and limit <= 0:
+                    return
+                if limit is not None:
+                    limit -= 1
+                yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Guarda un checkpoint en la partición de su hilo."""
+        return self._shard(config).put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Guarda las escrituras intermedias de una tarea."""
+        self._shard(config).put_writes(config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Elimina todos los checkpoints y escrituras de un hilo."""
+        self.shard_for(thread_id).delete_thread(thread_id)
+
+    def rollback_thread(
+        self, thread_id: str, checkpoint_id: Optional[str], turn_id: Optional[str] = None
+    ) -> int:
+        """Descarta los checkpoints de un hilo posteriores a un checkpoint (ver CompactMemorySaver)."""
+        return self.shard_for(thread_id).rollback_thread(thread_id, checkpoint_id, turn_id)
+
+    def delete_threads(self, predicate: Callable[[ThreadInfo], bool]) -> List[str]:
+        """Elimina en todas las particiones los hilos cuya entrada cumple un predicado."""
+        return [thread_id for shard in self.shards for thread_id in shard.delete_threads(predicate)]
+
+    def thread_info(self, thread_id: str) -> Optional[Dict[str, Any]]:
+        """Entrada del índice de un hilo, o None si no existe."""
+        return self.shard_for(thread_id).thread_info(thread_id)
+
+    def thread_infos(self) -> List[ThreadInfo]:
+        """Entradas del índice de hilos de todas las particiones."""
+        return [info for shard in self.shards for info in shard.thread_infos()]
+
+    def list_thread_infos(
+        self, offset: int = 0, limit: int = 50, sort: str = "last_active", descending: bool = True
+    ) -> Dict[str, Any]:
+        """Página ordenada del índice de hilos de todas las particiones."""
+        return page_threads(self.thread_infos(), offset, limit, sort, descending)
+
+    def thread_stats(self) -> Dict[str, Any]:
+        """Estadísticas agregadas del índice de hilos de todas las particiones."""
+        infos, messages, size = [], 0, 0
+        for shard in self.shards:
+            with shard._lock:
+                infos.extend(shard.threads.values())
+                messages += shard._total_messages
+                size += shard._total_bytes
+        return summarize_threads(infos, messages, size)
+
+    def fork_thread(
+        self,
+        source_thread_id: str,
+        target_thread_id: str,
+        checkpoint_id: Optional[str] = None,
+        checkpoint_ns: str = "",
+    ) -> str:
+        """
+        Crea un hilo nuevo a partir de un checkpoint de otro hilo (copy-on-write).
+
+        El hilo nuevo puede quedar en otra partición: ambos comparten los segmentos de
+        mensajes, que _fork_entry congela para que ningún hilo los modifique.
+        """
+        fork = self.shard_for(source_thread_id)._fork_entry(source_thread_id, checkpoint_id, checkpoint_ns)
+        self.shard_for(target_thread_id)._adopt_thread(target_thread_id, fork)
+        return fork[1]
+
+    def checkpoint_summaries(self, thread_id: str, checkpoint_ns: str = "") -> List[Dict[str, Any]]:
+        """Resume los checkpoints de un hilo sin reconstruir sus mensajes."""
+        return self.shard_for(thread_id).checkpoint_summaries(thread_id, checkpoint_ns)
+
+    def thread_ids(self) -> List[str]:
+        """Identificadores de los hilos de todas las particiones."""
+        return [thread_id for shard in self.shards for thread_id in shard.thread_ids()]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Estadísticas agregadas y por partición.
+
+        Returns:
+            Totales de CompactMemorySaver.stats más la lista "shards" con las de cada partición.
+        """
+        per_shard = [shard.stats() for shard in self.shards]
+        totals = {key: sum(stats[key] for stats in per_shard) for key in per_shard[0]}
+        return {**totals, "shard_count": len(self.shards), "shards": per_shard}
+
+    def spill_idle(self, idle_seconds: Optional[float] = None) -> int:
+        """Vuelca a la capa fría los hilos sin actividad de todas las particiones."""
+        return sum(shard.spill_idle(idle_seconds) for shard in self.shards)
+
+    def tier_stats(self) -> Dict[str, Any]:
+        """Estado de las capas caliente y fría de todas las particiones."""
+        per_shard = [shard.tier_stats() for shard in self.shards]
+        totals = {key: sum(stats[key] for stats in per_shard) for key in per_shard[0] if key != "page_in_ms"}
+        latencies = []
+        for shard in self.shards:
+            with shard._lock:
+                latencies.extend(shard._page_in_seconds)
+        totals["page_in_ms"] = _latency_summary(latencies)
+        return totals
+
+    def close(self) -> None:
+        """Cierra y elimina los archivos de la capa fría."""
+        for shard in self.shards:
+            shard.close()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Versión asíncrona de get_tuple."""
+        return await self._shard(config).aget_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ):
+        """Versión asíncrona de list."""
+        for item in self.list(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Versión asíncrona de put."""
+        return await self._shard(config).aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Versión asíncrona de put_writes."""
+        await self._shard(config).aput_writes(config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        """Versión asíncrona de delete_thread."""
+        return self.delete_thread(thread_id)
+
+    def get_next_version(self, current: Optional[str], channel: Any) -> str:
+        """Genera la siguiente versión de un canal (mismo formato que MemorySaver)."""
+        return self.shards[0].get_next_version(current, channel)
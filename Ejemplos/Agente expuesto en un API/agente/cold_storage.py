@@ -0,0 +1,223 @@
+"""
+Capa fría del checkpointer: hilos inactivos comprimidos en un archivo de segmentos.
+
+ColdStore guarda bloques de bytes por clave en un archivo de solo-agregado:
+- Cada bloque se comprime con zlib o, si está instalada la librería zstandard, con zstd
+- El índice clave -> (posición, longitud) vive en memoria; los bloques se leen a través
+  de un mapeo en memoria (mmap) del archivo, sin copiar el archivo completo
+- Al leer o eliminar un bloque su espacio queda como basura; cuando la basura supera la
+  mitad del archivo se compacta reescribiendo solo los bloques vigentes
+
+El archivo es un área de intercambio del proceso y se reinicia al crear el almacén: la
+persistencia entre reinicios sigue a cargo de la instantánea de conversaciones.
+
+ColdStore no tiene lock propio: lo protege el lock del checkpointer que lo usa. compress
+y decompress no usan estado compartido, así que el checkpointer comprime y descomprime
+fuera de su lock y solo lo toma para leer o agregar los bloques ya comprimidos.
+"""
+
+import mmap
+import os
+import zlib
+from typing import Callable, Dict, Optional, Tuple
+
+
+COMPRESSIONS = ("zlib", "zstd")
+
+# No se compacta por debajo de este tamaño de archivo
+MIN_COMPACT_BYTES = 1 << 20
+
+
+def _codec(compression: str, level: Optional[int]) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """Funciones de compresión y descompresión del algoritmo indicado (seguras entre hilos)."""
+    if compression == "zlib":
+        zlib_level = 6 if level is None else level
+        return (lambda data: zlib.compress(data, zlib_level)), zlib.decompress
+    if compression == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError(
+                "La compresión zstd requiere la librería zstandard. Instalar con: pip install zstandard"
+            )
+        zstd_level = 3 if level is None else level
+        # Los compresores de zstandard no admiten uso simultáneo desde varios hilos
+        return (
+            lambda data: zstandard.ZstdCompressor(level=zstd_level).compress(data),
+            lambda data: zstandard.ZstdDecompressor().decompress(data),
+        )
+    raise ValueError(f"compression debe ser uno de {COMPRESSIONS}")
+
+
+class ColdStore:
+    """
+    Bloques comprimidos en un archivo de segmentos con índice en memoria.
+
+    Ejemplo:
+        cold = ColdStore("/var/tmp/agente/shard-0.cold", compression="zlib")
+        cold.put("hilo_1", datos)
+        datos = cold.pop("hilo_1")
+    """
+
+    def __init__(self, path: str, compression: str = "zlib", level: Optional[int] = None):
+        """
+        Crea (o reinicia) el archivo de segmentos.
+
+        Args:
+            path: Archivo de segmentos.
+            compression: "zlib" o "zstd".
+            level: Nivel de compresión (por defecto 6 para zlib y 3 para zstd).
+        """
+        self.path = path
+        self.compression = compression
+        self._compress, self._decompress = _codec(compression, level)
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "w+b")
+        self._map: Optional[mmap.mmap] = None
+        # clave -> (posición, longitud comprimida, longitud original, versión)
+        self._index: Dict[str, Tuple[int, int, int, int]] = {}
+        self._size = 0
+        self._dead = 0
+        self._versions = 0
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._index
+
+    def keys(self):
+        """Claves almacenadas."""
+        return self._index.keys()
+
+    def entry_size(self, key: str) -> Tuple[int, int]:
+        """Bytes comprimidos y originales de un bloque (sin leerlo)."""
+        _, length, raw_length, _ = self._index[key]
+        return length, raw_length
+
+    def version(self, key: str) -> Optional[int]:
+        """Versión del bloque vigente de una clave (cambia con cada put), o None."""
+        entry = self._index.get(key)
+        return entry[3] if entry is not None else None
+
+    def compress(self, data: bytes) -> bytes:
+        """Comprime un bloque sin agregarlo (no requiere el lock del checkpointer)."""
+        return self._compress(data)
+
+    def decompress(self, compressed: bytes) -> bytes:
+        """Descomprime un bloque leído con read (no requiere el lock del checkpointer)."""
+        return self._decompress(compressed)
+
+    def put(self, key: str, data: bytes) -> int:
+        """
+        Comprime y agrega un bloque; reemplaza el anterior de la misma clave.
+
+        Returns:
+            Bytes escritos en el archivo.
+        """
+        return self.put_compressed(key, self._compress(data), len(data))
+
+    def put_compressed(self, key: str, compressed: bytes, raw_length: int) -> int:
+        """
+        Agrega un bloque ya comprimido con compress; reemplaza el anterior de la clave.
+
+        Returns:
+            Bytes escritos en el archivo.
+        """
+        self.delete(key)
+        self._file.seek(self._size)
+        self._file.write(compressed)
+        self._file.flush()
+        self._versions += 1
+        self._index[key] = (self._size, len(compressed), raw_length, self._versions)
+        self._size += len(compressed)
+        return len(compressed)
+
+    def _view(self, offset: int, length: int) -> memoryview:
+        if self._map is None or offset + length > len(self._map):
+            # El archivo creció desde el último mapeo
+            if self._map is not None:
+                self._map.close()
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return memoryview(self._map)[offset:offset + length]
+
+    def get(self, key: str) -> bytes:
+        """
+        Lee y descomprime un bloque.
+
+        Raises:
+            KeyError: Si la clave no existe.
+        """
+        return self._decompress(self.read(key)[0])
+
+    def read(self, key: str) -> Tuple[bytes, int]:
+        """
+        Copia un bloque comprimido sin descomprimirlo.
+
+        Returns:
+            Tupla (bytes comprimidos, versión del bloque).
+
+        Raises:
+            KeyError: Si la clave no existe.
+        """
+        offset, length, _, version = self._index[key]
+        view = self._view(offset, length)
+        try:
+            return bytes(view), version
+        finally:
+            view.release()
+
+    def pop(self, key: str) -> bytes:
+        """Lee un bloque y lo elimina del almacén."""
+        data = self.get(key)
+        self.delete(key)
+        return data
+
+    def delete(self, key: str) -> None:
+        """Elimina un bloque (su espacio se recupera al compactar)."""
+        entry = self._index.pop(key, None)
+        if entry is None:
+            return
+        self._dead += entry[1]
+        if self._dead > self._size // 2 and self._size >= MIN_COMPACT_BYTES:
+            self.compact()
+
+    def compact(self) -> None:
+        """Reescribe el archivo con los bloques vigentes."""
+        tmp_path = f"{self.path}.compact"
+        index, position = {}, 0
+        with open(tmp_path, "wb") as out:
+            for key, (offset, length, raw_length, version) in self._index.items():
+                view = self._view(offset, length)
+                out.write(view)
+                view.release()
+                index[key] = (position, length, raw_length, version)
+                position += length
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "r+b")
+        self._index, self._size, self._dead = index, position, 0
+
+    def stats(self) -> Dict[str, int]:
+        """Bloques, bytes comprimidos y originales, tamaño del archivo y basura pendiente."""
+        return {
+            "cold_threads": len(self._index),
+            "cold_bytes": sum(entry[1] for entry in self._index.values()),
+            "cold_raw_bytes": sum(entry[2] for entry in self._index.values()),
+            "file_bytes": self._size,
+            "dead_bytes": self._dead,
+        }
+
+    def close(self) -> None:
+        """Cierra el archivo y elimina el área de intercambio."""
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
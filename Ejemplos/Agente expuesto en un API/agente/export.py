@@ -0,0 +1,342 @@
+"""
+Exportación e importación masiva de conversaciones del agente.
+
+Las conversaciones se transmiten como un flujo de registros:
+- {"kind": "thread", ...}: cabecera de un hilo con los metadatos de su último checkpoint
+- {"kind": "message", ...}: un mensaje completo del hilo (incluye tool_call_id, ids, etc.)
+
+Formatos soportados:
+- "ndjson.gz": un registro JSON por línea, comprimido con gzip
+- "msgpack": cada registro en msgpack precedido por su longitud (4 bytes big-endian)
+
+Tanto la codificación como la decodificación son incrementales, por lo que la
+memoria utilizada no depende del número de mensajes exportados o importados.
+
+Un registro inválido detiene la importación con ValueError. Los hilos completos
+anteriores al error quedan importados y el hilo en curso se descarta (vuelve a su estado
+previo); como los mensajes conservan su id, basta con reintentar la importación.
+"""
+
+import json
+import struct
+import uuid
+import zlib
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+from langchain_core.messages import message_to_dict, messages_from_dict
+
+
+# Tipo de contenido de cada formato
+FORMATS = {
+    "ndjson.gz": "application/gzip",
+    "msgpack": "application/x-msgpack",
+}
+
+# Tamaño de los bloques emitidos al codificar
+CHUNK_SIZE = 64 * 1024
+
+# Prefijo de longitud de los registros msgpack
+_LENGTH_PREFIX = struct.Struct(">I")
+
+
+def _msgpack():
+    """Carga la librería msgpack disponible (msgpack u ormsgpack)."""
+    try:
+        import msgpack
+        return msgpack
+    except ImportError:
+        pass
+    try:
+        import ormsgpack
+        return ormsgpack
+    except ImportError:
+        raise ImportError(
+            "El formato msgpack requiere la librería msgpack. Instalar con: pip install msgpack"
+        )
+
+
+def _check_format(fmt: str) -> None:
+    """Valida que el formato solicitado esté soportado."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato no soportado: {fmt}. Usa uno de {list(FORMATS)}")
+
+
+def thread_record(thread_id: str, state) -> Dict[str, Any]:
+    """
+    Construye el registro de cabecera de un hilo a partir de su estado.
+
+    Args:
+        thread_id: Identificador del hilo.
+        state: Snapshot del grafo (resultado de graph.get_state).
+
+    Returns:
+        Registro serializable con los metadatos del último checkpoint.
+    """
+    # Las escrituras ya están contenidas en los mensajes exportados
+    metadata = {k: v for k, v in (state.metadata or {}).items() if k != "writes"}
+    return {
+        "kind": "thread",
+        "thread_id": thread_id,
+        "checkpoint_id": state.config["configurable"].get("checkpoint_id"),
+        "created_at": state.created_at,
+        "metadata": json.loads(json.dumps(metadata, default=str)),
+        "message_count": len(state.values.get("messages", [])),
+    }
+
+
+def message_record(thread_id: str, message) -> Dict[str, Any]:
+    """Construye el registro de un mensaje sin pérdida de información."""
+    return {"kind": "message", "thread_id": thread_id, "message": message_to_dict(message)}
+
+
+def message_from_record(record: Dict[str, Any]):
+    """
+    Reconstruye el mensaje de LangChain de un registro de tipo "message".
+
+    Raises:
+        ValueError: Si el registro no contiene un mensaje válido.
+    """
+    message = record.get("message")
+    if not isinstance(message, dict) or "type" not in message or not isinstance(message.get("data"), dict):
+        raise ValueError("Registro de mensaje sin un campo 'message' válido")
+    try:
+        return messages_from_dict([message])[0]
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError(f"Mensaje inválido: {e}")
+
+
+def encode_records(records: Iterable[Dict[str, Any]], fmt: str = "ndjson.gz") -> Iterator[bytes]:
+    """
+    Codifica un flujo de registros en bloques de bytes.
+
+    Args:
+        records: Registros a codificar.
+        fmt: Formato de salida ("ndjson.gz" o "msgpack").
+
+    Yields:
+        Bloques de bytes listos para escribir en un archivo o respuesta HTTP.
+    """
+    _check_format(fmt)
+    buffer = bytearray()
+
+    if fmt == "msgpack":
+        packer = _msgpack()
+        for record in records:
+            payload = packer.packb(record, default=str)
+            buffer += _LENGTH_PREFIX.pack(len(payload))
+            buffer += payload
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+    else:
+        # wbits=31 produce un flujo gzip estándar
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for record in records:
+            line = json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            buffer += compressor.compress(line.encode("utf-8"))
+            if len(buffer) >= CHUNK_SIZE:
+                yield bytes(buffer)
+                buffer.clear()
+        buffer += compressor.flush()
+
+    if buffer:
+        yield bytes(buffer)
+
+
+class RecordDecoder:
+    """
+    Decodificador incremental de registros.
+
+    Recibe bloques de bytes de cualquier tamaño (por ejemplo, del cuerpo de una
+    solicitud HTTP) y devuelve los registros completos a medida que aparecen.
+    """
+
+    def __init__(self, fmt: str = "ndjson.gz"):
+        """
+        Inicializa el decodificador.
+
+        Args:
+            fmt: Formato de entrada ("ndjson.gz" o "msgpack").
+        """
+        _check_format(fmt)
+        self.fmt = fmt
+        self._buffer = bytearray()
+        if fmt == "msgpack":
+            self._unpacker = _msgpack()
+        else:
+            self._decompressor = zlib.decompressobj(31)
+
+    def feed(self, chunk: bytes) -> List[Dict[str, Any]]:
+        """
+        Procesa un bloque de bytes.
+
+        Args:
+            chunk: Bloque recibido.
+
+        Returns:
+            Registros completos contenidos hasta el momento.
+        """
+        if self.fmt == "msgpack":
+            self._buffer += chunk
+            return self._drain_msgpack()
+
+        try:
+            self._buffer += self._decompressor.decompress(chunk)
+        except zlib.error as e:
+            raise ValueError(f"Flujo gzip inválido: {e}")
+        return self._drain_lines()
+
+    def close(self) -> List[Dict[str, Any]]:
+        """
+        Finaliza la decodificación.
+
+        Returns:
+            Registros pendientes.
+
+        Raises:
+            ValueError: Si el flujo terminó con un registro incompleto.
+        """
+        records = []
+        if self.fmt != "msgpack":
+            self._buffer += self._decompressor.flush()
+            records = self._drain_lines()
+            if self._buffer.strip():
+                records.append(json.loads(self._buffer))
+                self._buffer.clear()
+
+        if self._buffer:
+            raise ValueError("El flujo de importación terminó con un registro incompleto")
+        return records
+
+    def _drain_lines(self) -> List[Dict[str, Any]]:
+        """Extrae las líneas completas del buffer."""
+        records = []
+        end = self._buffer.rfind(b"\n")
+        if end < 0:
+            return records
+        for line in bytes(self._buffer[:end]).split(b"\n"):
+            if line.strip():
+                records.append(json.loads(line))
+        del self._buffer[:end + 1]
+        return records
+
+    def _drain_msgpack(self) -> List[Dict[str, Any]]:
+        """Extrae los registros msgpack completos del buffer."""
+        records = []
+        offset = 0
+        prefix = _LENGTH_PREFIX.size
+        while len(self._buffer) - offset >= prefix:
+            (length,) = _LENGTH_PREFIX.unpack_from(self._buffer, offset)
+            if len(self._buffer) - offset - prefix < length:
+                break
+            start = offset + prefix
+            records.append(self._unpacker.unpackb(bytes(self._buffer[start:start + length])))
+            offset = start + length
+        del self._buffer[:offset]
+        return records
+
+
+def decode_chunks(chunks: Iterable[bytes], fmt: str = "ndjson.gz") -> Iterator[Dict[str, Any]]:
+    """
+    Decodifica un flujo de bloques de bytes (por ejemplo, un archivo leído por partes).
+
+    Args:
+        chunks: Bloques de bytes.
+        fmt: Formato de entrada.
+
+    Yields:
+        Registros decodificados.
+    """
+    decoder = RecordDecoder(fmt)
+    for chunk in chunks:
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+class ConversationImporter:
+    """
+    Importador incremental de conversaciones.
+
+    Agrupa los mensajes de cada hilo en lotes y los escribe en la memoria del
+    agente con una sola operación por lote, en lugar de una por mensaje. Los lotes se
+    escriben con un id de importación, de modo que abort puede descartar el hilo en curso.
+    """
+
+    def __init__(self, agent, batch_size: int = 500):
+        """
+        Inicializa el importador.
+
+        Args:
+            agent: Instancia de MemoryAgent donde se importarán los hilos.
+            batch_size: Número máximo de mensajes por escritura.
+        """
+        self.agent = agent
+        self.batch_size = batch_size
+        self.import_id = uuid.uuid4().hex
+        self.threads = 0
+        self.messages = 0
+        self._thread: Optional[Dict[str, Any]] = None
+        self._batch: List[Any] = []
+        self._written = 0
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """
+        Procesa un registro del flujo de importación.
+
+        Args:
+            record: Registro de tipo "thread" o "message".
+
+        Raises:
+            ValueError: Si el registro es inválido o llega fuera de orden.
+        """
+        if not isinstance(record, dict):
+            raise ValueError(f"Registro inválido: se esperaba un objeto y llegó {type(record).__name__}")
+        kind = record.get("kind")
+        if kind == "thread":
+            thread_id = record.get("thread_id")
+            if not isinstance(thread_id, str) or not thread_id:
+                raise ValueError("Registro de hilo sin thread_id")
+            self.flush()
+            self._thread = record
+            self._written = 0
+            self.threads += 1
+        elif kind == "message":
+            if self._thread is None or record.get("thread_id") != self._thread["thread_id"]:
+                raise ValueError("Mensaje recibido fuera del bloque de su hilo")
+            self._batch.append(message_from_record(record))
+            if len(self._batch) >= self.batch_size:
+                self.flush()
+        else:
+            raise ValueError(f"Tipo de registro desconocido: {kind}")
+
+    def flush(self) -> None:
+        """Escribe el lote pendiente del hilo actual."""
+        if not self._batch:
+            return
+        self.agent.import_messages(self._thread["thread_id"], self._batch, self._thread, self.import_id)
+        self.messages += len(self._batch)
+        self._written += len(self._batch)
+        self._batch = []
+
+    def abort(self) -> None:
+        """
+        Descarta el hilo en curso tras un error: sus lotes ya escritos se revierten y
+        el hilo queda como antes de la importación. Los hilos completos se conservan.
+        """
+        if self._thread is not None:
+            if self._written:
+                self.agent.discard_turn(self._thread["thread_id"], self.import_id)
+            self.threads -= 1
+            self.messages -= self._written
+        self._thread = None
+        self._batch = []
+        self._written = 0
+
+    def close(self) -> Dict[str, int]:
+        """
+        Finaliza la importación.
+
+        Returns:
+            Número de hilos y mensajes importados.
+        """
+        self.flush()
+        return {"threads": self.threads, "messages": self.messages}
@@ -0,0 +1,257 @@
+"""
+Contabilidad de tokens para el agente con memoria y los flujos de trabajo.
+
+Este módulo permite:
+- Leer el consumo exacto de tokens que reporta el modelo (usage_metadata)
+- Estimar localmente los tokens cuando el proveedor no los reporta
+- Recortar el contexto o rechazar una solicitud antes de llamar al modelo
+  cuando supera el presupuesto de tokens configurado
+- Acumular el consumo de cualquier grafo de LangGraph mediante un callback
+"""
+
+import json
+import math
+import threading
+from typing import List, Dict, Any, Optional, Sequence
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, AIMessage, trim_messages
+
+
+# Aproximación habitual: un token equivale a ~4 caracteres de texto
+CHARS_PER_TOKEN = 4
+
+# Tokens adicionales que cada mensaje consume por su rol y delimitadores
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Políticas disponibles cuando el prompt excede el presupuesto
+BUDGET_POLICIES = ("trim", "reject")
+
+
+class TokenBudgetExceeded(Exception):
+    """Se lanza cuando un prompt no cabe en el presupuesto de tokens."""
+
+    def __init__(self, required: int, budget: int):
+        self.required = required
+        self.budget = budget
+        super().__init__(
+            f"El prompt requiere ~{required} tokens y el presupuesto es de {budget} tokens"
+        )
+
+
+def estimate_tokens(text: Any) -> int:
+    """
+    Estima localmente el número de tokens de un texto.
+
+    Args:
+        text: Texto a estimar. Si no es una cadena se serializa a JSON.
+
+    Returns:
+        Número aproximado de tokens.
+    """
+    if not text:
+        return 0
+    if not isinstance(text, str):
+        text = json.dumps(text, ensure_ascii=False, default=str)
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def count_message_tokens(messages: Sequence[BaseMessage]) -> int:
+    """
+    Estima los tokens de una lista de mensajes, incluyendo llamadas a herramientas.
+
+    Args:
+        messages: Mensajes que formarán el prompt.
+
+    Returns:
+        Número aproximado de tokens del prompt.
+    """
+    total = 0
+    for msg in messages:
+        total += MESSAGE_OVERHEAD_TOKENS + estimate_tokens(msg.content)
+        tool_calls = getattr(msg, "tool_calls", None)
+        if tool_calls:
+            total += estimate_tokens([{"name": tc["name"], "args": tc["args"]} for tc in tool_calls])
+    return total
+
+
+def ensure_usage_metadata(response: AIMessage, prompt: Sequence[BaseMessage]) -> AIMessage:
+    """
+    Completa el consumo de tokens de una respuesta cuando el modelo no lo reporta.
+
+    Args:
+        response: Respuesta generada por el modelo.
+        prompt: Mensajes enviados al modelo para generar la respuesta.
+
+    Returns:
+        La misma respuesta con usage_metadata garantizado.
+    """
+    if getattr(response, "usage_metadata", None):
+        return response
+
+    input_tokens = count_message_tokens(prompt)
+    output_tokens = count_message_tokens([response]) - MESSAGE_OVERHEAD_TOKENS
+    response.usage_metadata = {
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+    }
+    response.response_metadata["token_usage_estimated"] = True
+    return response
+
+
+def get_usage(message: BaseMessage) -> Dict[str, int]:
+    """
+    Obtiene el consumo de tokens registrado en un mensaje del asistente.
+
+    Args:
+        message: Mensaje a inspeccionar.
+
+    Returns:
+        Diccionario con input_tokens, output_tokens y total_tokens (ceros si no aplica).
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    return {
+        "input_tokens": usage.get("input_tokens", 0),
+        "output_tokens": usage.get("output_tokens", 0),
+        "total_tokens": usage.get("total_tokens", 0),
+    }
+
+
+def sum_usage(messages: Sequence[BaseMessage]) -> Dict[str, int]:
+    """
+    Suma el consumo de tokens de todos los mensajes del asistente.
+
+    Args:
+        messages: Mensajes de la conversación.
+
+    Returns:
+        Totales de input_tokens, output_tokens y total_tokens.
+    """
+    totals = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+    for msg in messages:
+        if msg.type != "ai":
+            continue
+        for key, value in get_usage(msg).items():
+            totals[key] += value
+    return totals
+
+
+def fit_to_budget(
+    messages: List[BaseMessage],
+    max_tokens: Optional[int],
+    policy: str = "trim",
+) -> List[BaseMessage]:
+    """
+    Aplica el presupuesto de tokens a un prompt antes de enviarlo al modelo.
+
+    Con la política "trim" se descartan los turnos más antiguos conservando el
+    mensaje del sistema y sin separar llamadas a herramientas de sus resultados.
+    Con la política "reject" el prompt se rechaza si no cabe completo.
+
+    Args:
+        messages: Prompt completo (mensaje del sistema seguido del historial).
+        max_tokens: Presupuesto máximo de tokens. None desactiva el control.
+        policy: "trim" o "reject".
+
+    Returns:
+        Prompt que cabe en el presupuesto.
+
+    Raises:
+        TokenBudgetExceeded: Si el prompt no puede ajustarse al presupuesto.
+    """
+    if max_tokens is None:
+        return messages
+
+    required = count_message_tokens(messages)
+    if required <= max_tokens:
+        return messages
+
+    if policy == "trim":
+        trimmed = trim_messages(
+            messages,
+            max_tokens=max_tokens,
+            token_counter=count_message_tokens,
+            strategy="last",
+            start_on="human",
+            include_system=True,
+        )
+        # Si solo sobrevive el mensaje del sistema, el turno actual no cabe
+        if any(msg.type != "system" for msg in trimmed):
+            return trimmed
+
+    raise TokenBudgetExceeded(required, max_tokens)
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Callback que acumula los tokens de todas las llamadas al LLM de un grafo.
+
+    Se pasa en la configuración de la invocación:
+        contador = TokenUsageCallback()
+        graph.invoke(entrada, config={"callbacks": [contador]})
+        print(contador.summary())
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._prompts: Dict[Any, int] = {}
+        self.calls = 0
+        self.estimated_calls = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        """Guarda la estimación del prompt por si el modelo no reporta su consumo."""
+        with self._lock:
+            self._prompts[run_id] = sum(count_message_tokens(batch) for batch in messages)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        """Versión para modelos de texto plano."""
+        with self._lock:
+            self._prompts[run_id] = sum(estimate_tokens(p) for p in prompts)
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        """Suma los tokens reportados o estimados de la llamada finalizada."""
+        input_tokens = output_tokens = 0
+        reported = False
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    reported = True
+                    input_tokens += usage.get("input_tokens", 0)
+                    output_tokens += usage.get("output_tokens", 0)
+                elif message is not None:
+                    output_tokens += count_message_tokens([message]) - MESSAGE_OVERHEAD_TOKENS
+                else:
+                    output_tokens += estimate_tokens(generation.text)
+
+        with self._lock:
+            prompt_estimate = self._prompts.pop(run_id, 0)
+            if not reported:
+                input_tokens = prompt_estimate
+                self.estimated_calls += 1
+            self.calls += 1
+            self.input_tokens += input_tokens
+            self.output_tokens += output_tokens
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        """Descarta la estimación de una llamada fallida."""
+        with self._lock:
+            self._prompts.pop(run_id, None)
+
+    @property
+    def total_tokens(self) -> int:
+        """Total de tokens de entrada y salida acumulados."""
+        return self.input_tokens + self.output_tokens
+
+    def summary(self) -> Dict[str, int]:
+        """Resumen del consumo acumulado."""
+        return {
+            "llm_calls": self.calls,
+            "estimated_calls": self.estimated_calls,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "total_tokens": self.total_tokens,
+        }
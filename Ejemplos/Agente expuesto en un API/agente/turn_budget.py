@@ -0,0 +1,147 @@
+"""
+Presupuestos del ciclo ReAct de un turno: rondas, herramientas, tiempo y tokens.
+
+El ciclo assistant <-> tools se repite mientras el modelo pida herramientas, y un modelo
+confundido puede encadenar llamadas durante muchas rondas gastando latencia y cuota.
+TurnBudget acota cada turno:
+- max_steps: rondas de herramientas (cada paso assistant -> tools)
+- max_tool_calls: llamadas a herramientas ejecutadas
+- max_seconds: tiempo transcurrido desde el inicio del turno
+- max_tokens: tokens consumidos por las llamadas al modelo del turno
+
+Los presupuestos se revisan cada vez que el modelo pide herramientas. Si alguno se
+agotó, esas herramientas no se ejecutan (una ronda nunca se ejecuta a medias) y el
+agente pide al modelo, ya sin herramientas, una respuesta final con lo obtenido hasta
+ese momento. A diferencia del plazo de guarded_turn, que cancela el turno, aquí el
+turno termina con una respuesta e informa qué presupuesto se agotó.
+"""
+
+import time
+from typing import Any, Dict, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage
+
+from agente.tokens import sum_usage
+
+
+# Presupuestos que puede informar una respuesta, en el orden en que se revisan
+TURN_BUDGETS = ("steps", "tool_calls", "tokens", "time")
+
+# Supersteps que LangGraph permite por defecto en una ejecución
+DEFAULT_RECURSION_LIMIT = 25
+
+
+def turn_messages(messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+    """Mensajes del turno en curso: los posteriores al último mensaje del usuario."""
+    for index in range(len(messages) - 1, -1, -1):
+        if messages[index].type == "human":
+            return list(messages[index + 1:])
+    return list(messages)
+
+
+class TurnBudget:
+    """
+    Límites de un turno del agente; None no limita.
+
+    Ejemplo:
+        defaults = TurnBudget(max_steps=5, max_seconds=20)
+        budget = defaults.start(max_tool_calls=3)  # turno que comienza ahora
+        reason = budget.exhausted(turn_messages(state["messages"]))
+    """
+
+    __slots__ = ("max_steps", "max_tool_calls", "max_seconds", "max_tokens", "started")
+
+    def __init__(
+        self,
+        max_steps: Optional[int] = None,
+        max_tool_calls: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ):
+        """
+        Args:
+            max_steps: Rondas de herramientas por turno (0: responder sin herramientas).
+            max_tool_calls: Llamadas a herramientas por turno.
+            max_seconds: Segundos desde el inicio del turno tras los que no se inician
+                        más rondas de herramientas.
+            max_tokens: Tokens totales de las llamadas al modelo del turno.
+
+        Raises:
+            ValueError: Si algún límite es negativo (o cero, para tiempo y tokens).
+        """
+        for name, value, minimum in (
+            ("max_steps", max_steps, 0),
+            ("max_tool_calls", max_tool_calls, 0),
+            ("max_seconds", max_seconds, 1e-9),
+            ("max_tokens", max_tokens, 1),
+        ):
+            if value is not None and value < minimum:
+                raise ValueError(f"{name} debe ser {'mayor que 0' if minimum else 'mayor o igual que 0'}")
+        self.max_steps = max_steps
+        self.max_tool_calls = max_tool_calls
+        self.max_seconds = max_seconds
+        self.max_tokens = max_tokens
+        self.started = time.monotonic()
+
+    def start(
+        self,
+        max_steps: Optional[int] = None,
+        max_tool_calls: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+    ) -> "TurnBudget":
+        """Presupuesto de un turno que comienza ahora; los límites indicados reemplazan a estos."""
+        return TurnBudget(
+            max_steps if max_steps is not None else self.max_steps,
+            max_tool_calls if max_tool_calls is not None else self.max_tool_calls,
+            max_seconds if max_seconds is not None else self.max_seconds,
+            max_tokens if max_tokens is not None else self.max_tokens,
+        )
+
+    @property
+    def elapsed(self) -> float:
+        """Segundos desde el inicio del turno."""
+        return time.monotonic() - self.started
+
+    @property
+    def recursion_limit(self) -> int:
+        """Supersteps que necesita el turno: el límite por defecto de LangGraph no debe cortarlo antes."""
+        if self.max_steps is None:
+            return DEFAULT_RECURSION_LIMIT
+        # assistant + (tools + assistant) por ronda + la respuesta final
+        return max(DEFAULT_RECURSION_LIMIT, 2 * self.max_steps + 3)
+
+    def exhausted(self, messages: Sequence[BaseMessage]) -> Optional[str]:
+        """
+        Presupuesto que impide ejecutar las herramientas pedidas, o None.
+
+        Args:
+            messages: Mensajes del turno (ver turn_messages); el último es la respuesta
+                     del asistente con las llamadas a herramientas pendientes.
+
+        Returns:
+            "steps", "tool_calls", "tokens", "time" o None si hay presupuesto.
+        """
+        responses = [message for message in messages if message.type == "ai"]
+        if not responses:
+            return None
+        if self.max_steps is not None and len(responses) - 1 >= self.max_steps:
+            return "steps"
+        if self.max_tool_calls is not None:
+            calls = sum(len(message.tool_calls or []) for message in responses)
+            if calls > self.max_tool_calls:
+                return "tool_calls"
+        if self.max_tokens is not None and sum_usage(responses)["total_tokens"] >= self.max_tokens:
+            return "tokens"
+        if self.max_seconds is not None and self.elapsed >= self.max_seconds:
+            return "time"
+        return None
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Límites del presupuesto."""
+        return {
+            "max_steps": self.max_steps,
+            "max_tool_calls": self.max_tool_calls,
+            "max_seconds": self.max_seconds,
+            "max_tokens": self.max_tokens,
+        }
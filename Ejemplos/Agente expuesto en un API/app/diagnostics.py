@@ -0,0 +1,397 @@
+"""
+Diagnóstico de memoria del proceso.
+
+Cuando el RSS de un trabajador crece no se sabe si la causa es el historial de las
+conversaciones, el cliente del modelo, alguna caché o una fuga. Este módulo ofrece:
+- Diferencias entre instantáneas de tracemalloc agrupadas por módulo o paquete
+- Tamaño profundo aproximado del estado guardado de un hilo y los hilos más pesados
+- Tamaño de las cachés registradas y de las que se encuentran en los módulos cargados
+  (instancias de clases *Cache y funciones con functools.lru_cache)
+
+Pensado para activarse brevemente en producción: tracemalloc solo se inicia a pedido y
+se detiene solo al vencer un plazo máximo, los recorridos tienen un límite de objetos,
+el estado de un hilo se mide fuera del lock de su partición (que solo se toma para
+copiar las referencias) y los hilos más pesados se preseleccionan con el índice de
+hilos (sin recorrer todas las conversaciones).
+"""
+
+import collections
+import functools
+import gc
+import os
+import sys
+import threading
+import time
+import tracemalloc
+import types
+import weakref
+from typing import Any, Dict, List, Optional, Tuple
+
+
+# Objetos que no pertenecen al estado de un valor (se comparten con todo el proceso)
+_SKIP_TYPES = (
+    types.ModuleType, type, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+    types.CodeType, types.FrameType, weakref.ReferenceType, threading.Thread,
+)
+_ATOMIC_TYPES = (str, bytes, bytearray, int, float, complex, bool, type(None))
+
+# Objetos visitados como máximo por cada cálculo de tamaño profundo
+DEFAULT_MAX_OBJECTS = 200_000
+
+# Marcos de tracemalloc que no son memoria de la aplicación
+_TRACE_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def _slot_names(cls: type) -> List[str]:
+    names = []
+    for klass in cls.__mro__:
+        slots = klass.__dict__.get("__slots__", ())
+        names.extend([slots] if isinstance(slots, str) else slots)
+    return names
+
+
+def deep_sizeof(obj: Any, max_objects: int = DEFAULT_MAX_OBJECTS) -> Tuple[int, int]:
+    """
+    Tamaño profundo aproximado de un objeto.
+
+    Recorre contenedores, __dict__ y __slots__ sin contar dos veces el mismo objeto ni
+    entrar en módulos, clases o funciones.
+
+    Args:
+        obj: Objeto a medir.
+        max_objects: Límite de objetos visitados.
+
+    Returns:
+        Tupla (bytes, objetos visitados). Si se alcanzó el límite el tamaño es parcial.
+    """
+    seen = set()
+    size = 0
+    stack = [obj]
+    while stack and len(seen) < max_objects:
+        current = stack.pop()
+        if id(current) in seen or isinstance(current, _SKIP_TYPES):
+            continue
+        seen.add(id(current))
+        size += sys.getsizeof(current)
+        if isinstance(current, _ATOMIC_TYPES):
+            continue
+        if isinstance(current, dict):
+            stack.extend(current.keys())
+            stack.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, collections.deque)):
+            stack.extend(current)
+        else:
+            attributes = getattr(current, "__dict__", None)
+            if attributes is not None:
+                stack.append(attributes)
+            for name in _slot_names(type(current)):
+                if name not in ("__dict__", "__weakref__") and hasattr(current, name):
+                    stack.append(getattr(current, name))
+    return size, len(seen)
+
+
+def process_memory() -> Dict[str, Any]:
+    """RSS actual y máximo del proceso y contadores del recolector de basura."""
+    rss = None
+    try:
+        with open("/proc/self/statm") as f:
+            rss = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        pass
+    peak = None
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reporta KiB y macOS bytes
+        peak = peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        pass
+    return {"rss_bytes": rss, "peak_rss_bytes": peak, "gc_counts": gc.get_count()}
+
+
+def _store_for(saver, thread_id: str):
+    """CompactMemorySaver (o partición) donde se guarda un hilo."""
+    return saver.shard_for(thread_id) if hasattr(saver, "shard_for") else saver
+
+
+def thread_footprint(saver, thread_id: str, max_objects: int = DEFAULT_MAX_OBJECTS) -> Optional[Dict[str, Any]]:
+    """
+    Tamaño profundo del estado guardado de un hilo (checkpoints, mensajes y escrituras).
+
+    Incluye el prefijo que un hilo bifurcado comparte con su origen. Un hilo volcado a la
+    capa fría no se carga: ocupa 0 bytes en memoria y se informa su tamaño comprimido.
+
+    Returns:
+        thread_id, bytes, objetos visitados y si el recorrido quedó truncado, o None si
+        el hilo no existe.
+    """
+    store = _store_for(saver, thread_id)
+    with store._lock:
+        if store.cold is not None and thread_id in store.cold:
+            cold_bytes, raw_bytes = store.cold.entry_size(thread_id)
+            info = store.threads.get(thread_id)
+            return {
+                "thread_id": thread_id,
+                "bytes": 0,
+                "indexed_bytes": info.bytes if info is not None else None,
+                "message_count": info.message_count if info is not None else None,
+                "objects": 0,
+                "truncated": False,
+                "cold": True,
+                "cold_bytes": cold_bytes,
+                "cold_raw_bytes": raw_bytes,
+            }
+        if thread_id not in store.storage:
+            return None
+        # Copia superficial de los contenedores del hilo: el recorrido se hace sin el
+        # lock para no detener los turnos de la partición
+        state = (
+            {ns: dict(checkpoints) for ns, checkpoints in store.storage[thread_id].items()},
+            {key: dict(writes) for key, writes in store.writes.get(thread_id, {}).items()},
+        )
+        info = store.threads.get(thread_id)
+    size, objects = deep_sizeof(state, max_objects)
+    return {
+        "thread_id": thread_id,
+        "bytes": size,
+        "indexed_bytes": info.bytes if info is not None else None,
+        "message_count": info.message_count if info is not None else None,
+        "objects": objects,
+        "truncated": objects >= max_objects,
+        "cold": False,
+    }
+
+
+def heaviest_threads(saver, top: int = 10, candidates: int = 3) -> List[Dict[str, Any]]:
+    """
+    Hilos con mayor tamaño profundo.
+
+    Solo se miden los top * candidates hilos con más bytes según el índice de hilos.
+
+    Returns:
+        Lista ordenada de thread_footprint, del más pesado al más liviano.
+    """
+    page = saver.list_thread_infos(limit=top * candidates, sort="bytes")
+    footprints = [thread_footprint(saver, info["thread_id"]) for info in page["threads"]]
+    footprints = [footprint for footprint in footprints if footprint is not None]
+    return sorted(footprints, key=lambda footprint: footprint["bytes"], reverse=True)[:top]
+
+
+def _entries(obj: Any) -> Optional[int]:
+    try:
+        return len(obj)
+    except TypeError:
+        for value in getattr(obj, "__dict__", {}).values():
+            if isinstance(value, dict):
+                return len(value)
+    return None
+
+
+def _module_level_objects() -> List[Any]:
+    """Variables globales de los módulos cargados y los atributos de sus clases."""
+    objects = []
+    for module in list(sys.modules.values()):
+        for value in list(getattr(module, "__dict__", {}).values()):
+            objects.append(value)
+            if isinstance(value, type) and value.__module__ == module.__name__:
+                objects.extend(list(value.__dict__.values()))
+    return objects
+
+
+def cache_sizes(registered: Dict[str, Any], max_objects: int = 100_000) -> List[Dict[str, Any]]:
+    """
+    Tamaño de las cachés del proceso.
+
+    Además de las registradas, se buscan cachés solo en las variables globales de los
+    módulos y en sus clases (sin recorrer el heap completo): las cachés que viven dentro
+    de otros objetos deben registrarse.
+
+    Args:
+        registered: Cachés conocidas por nombre (por ejemplo, el almacén de idempotencia).
+        max_objects: Límite de objetos visitados por caché.
+
+    Returns:
+        Lista con nombre, entradas y bytes aproximados de cada caché; también incluye las
+        instancias de clases *Cache y las funciones con functools.lru_cache en uso.
+    """
+    found = [(name, obj) for name, obj in registered.items() if obj is not None]
+    known = {id(obj) for _, obj in found}
+    lru_caches = []
+    for obj in _module_level_objects():
+        if id(obj) in known:
+            continue
+        known.add(id(obj))
+        if isinstance(obj, functools._lru_cache_wrapper):
+            info = obj.cache_info()
+            if info.currsize:
+                lru_caches.append({
+                    "name": f"{getattr(obj, '__module__', '?')}.{getattr(obj, '__qualname__', '?')}",
+                    "kind": "lru_cache",
+                    "entries": info.currsize,
+                    "max_entries": info.maxsize,
+                    "hits": info.hits,
+                    "misses": info.misses,
+                    "bytes": None,
+                })
+        elif type(obj).__name__.endswith("Cache"):
+            found.append((f"{type(obj).__module__}.{type(obj).__qualname__}@{id(obj):x}", obj))
+
+    result = []
+    for name, obj in found:
+        size, objects = deep_sizeof(obj, max_objects)
+        result.append({
+            "name": name,
+            "kind": type(obj).__name__,
+            "entries": _entries(obj),
+            "max_entries": getattr(obj, "max_entries", None),
+            "bytes": size,
+            "truncated": objects >= max_objects,
+        })
+    result.sort(key=lambda cache: cache["bytes"] or 0, reverse=True)
+    return result + sorted(lru_caches, key=lambda cache: cache["entries"], reverse=True)
+
+
+class MemoryDiagnostics:
+    """
+    Sesiones acotadas de tracemalloc con diferencias entre instantáneas.
+
+    Ejemplo:
+        diagnostics = MemoryDiagnostics(max_duration=300)
+        diagnostics.start(frames=1, duration=60)
+        ...                                # tráfico normal
+        print(diagnostics.diff(top=20))    # crecimiento por módulo desde el inicio
+    """
+
+    def __init__(self, max_duration: float = 300.0, max_frames: int = 25):
+        """
+        Args:
+            max_duration: Segundos máximos que tracemalloc puede quedar activo.
+            max_frames: Marcos máximos por asignación (más marcos, más sobrecarga).
+        """
+        self.max_duration = max_duration
+        self.max_frames = max_frames
+        self._lock = threading.Lock()
+        self._baseline: Optional[tracemalloc.Snapshot] = None
+        self._baseline_at: Optional[float] = None
+        self._expires_at: Optional[float] = None
+        self._timer: Optional[threading.Timer] = None
+        self._owns_tracing = False
+
+    @property
+    def tracing(self) -> bool:
+        """Indica si hay una sesión activa."""
+        return self._baseline is not None
+
+    def start(self, frames: int = 1, duration: Optional[float] = None) -> Dict[str, Any]:
+        """
+        Inicia tracemalloc (si no estaba activo) y toma la instantánea de referencia.
+
+        Args:
+            frames: Marcos guardados por asignación.
+            duration: Segundos hasta la detención automática (máximo max_duration).
+
+        Returns:
+            Estado de la sesión.
+        """
+        duration = min(duration or self.max_duration, self.max_duration)
+        with self._lock:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(max(1, min(frames, self.max_frames)))
+                self._owns_tracing = True
+            self._baseline = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+            self._baseline_at = time.time()
+            self._expires_at = self._baseline_at + duration
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(duration, self.stop)
+            self._timer.daemon = True
+            self._timer.start()
+        return self.status()
+
+    def stop(self) -> Dict[str, Any]:
+        """Termina la sesión; detiene tracemalloc solo si lo inició esta clase."""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if self._owns_tracing and tracemalloc.is_tracing():
+                tracemalloc.stop()
+            self._owns_tracing = False
+            self._baseline = None
+            self._baseline_at = None
+            self._expires_at = None
+        return self.status()
+
+    def status(self) -> Dict[str, Any]:
+        """Estado de tracemalloc, memoria rastreada y sobrecarga del propio rastreo."""
+        tracing = tracemalloc.is_tracing()
+        current, peak = tracemalloc.get_traced_memory() if tracing else (0, 0)
+        return {
+            "tracing": self.tracing,
+            "frames": tracemalloc.get_traceback_limit() if tracing else None,
+            "since": self._baseline_at,
+            "expires_in": round(self._expires_at - time.time(), 1) if self._expires_at else None,
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory() if tracing else 0,
+        }
+
+    def diff(self, top: int = 20, group_by: str = "module", reset: bool = False) -> Dict[str, Any]:
+        """
+        Crecimiento de la memoria desde la instantánea de referencia.
+
+        Args:
+            top: Número de grupos a reportar (ordenados por crecimiento absoluto).
+            group_by: "module" (nombre completo del módulo) o "package" (primer componente).
+            reset: Usar la instantánea actual como nueva referencia.
+
+        Returns:
+            Crecimiento total y por grupo (bytes y bloques, actuales y diferencia).
+
+        Raises:
+            RuntimeError: Si no hay una sesión activa.
+            ValueError: Si group_by no es válido.
+        """
+        if group_by not in ("module", "package"):
+            raise ValueError("group_by debe ser 'module' o 'package'")
+        with self._lock:
+            baseline, baseline_at = self._baseline, self._baseline_at
+        if baseline is None:
+            raise RuntimeError("tracemalloc no está activo: inicia una sesión primero")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_TRACE_FILTERS)
+        modules = {
+            os.path.abspath(module.__file__): name
+            for name, module in list(sys.modules.items())
+            if getattr(module, "__file__", None)
+        }
+        module_names = set(modules.values())
+        groups: Dict[str, Dict[str, int]] = {}
+        for stat in snapshot.compare_to(baseline, "filename"):
+            filename = stat.traceback[0].filename
+            name = modules.get(os.path.abspath(filename), filename)
+            if group_by == "package" and name in module_names:
+                name = name.split(".")[0]
+            group = groups.setdefault(name, {"size": 0, "size_diff": 0, "count": 0, "count_diff": 0})
+            group["size"] += stat.size
+            group["size_diff"] += stat.size_diff
+            group["count"] += stat.count
+            group["count_diff"] += stat.count_diff
+
+        if reset:
+            with self._lock:
+                if self._baseline is baseline:
+                    self._baseline, self._baseline_at = snapshot, time.time()
+
+        ranked = sorted(groups.items(), key=lambda item: abs(item[1]["size_diff"]), reverse=True)
+        return {
+            "group_by": group_by,
+            "seconds": round(time.time() - baseline_at, 1),
+            "size_diff": sum(group["size_diff"] for group in groups.values()),
+            "groups": [{group_by: name, **values} for name, values in ranked[:top]],
+        }
@@ -0,0 +1,70 @@
+"""
+Cancelación de solicitudes HTTP cuando el cliente se desconecta.
+
+Starlette no cancela un endpoint que no es de streaming cuando el cliente cierra la
+conexión: el turno del agente seguiría ejecutándose hasta el final y su respuesta se
+descartaría. cancel_on_disconnect ejecuta el trabajo como tarea y, en paralelo, espera el
+mensaje http.disconnect del servidor; si llega antes que el resultado, cancela la tarea
+(lo que cancela el grafo y la llamada al modelo en curso) y lanza ClientDisconnected.
+
+Se espera el mensaje en lugar de consultar request.is_disconnected(): esa consulta no
+espera y, detrás de un middleware de Starlette (BaseHTTPMiddleware), nunca llega a ver
+la desconexión.
+"""
+
+import asyncio
+from typing import Any, Awaitable
+
+from starlette.requests import Request
+
+
+# Código de estado (convención de nginx) para las solicitudes cuyo cliente se desconectó
+CLIENT_CLOSED_REQUEST = 499
+
+
+class ClientDisconnected(Exception):
+    """Se lanza cuando el cliente se desconectó antes de recibir la respuesta."""
+
+    def __init__(self):
+        super().__init__("El cliente se desconectó antes de recibir la respuesta")
+
+
+async def _wait_disconnect(request: Request) -> None:
+    """Espera hasta que el servidor informa que el cliente se desconectó."""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
+
+
+async def cancel_on_disconnect(request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Ejecuta un trabajo y lo cancela si el cliente se desconecta.
+
+    Args:
+        request: Solicitud HTTP en curso (con el cuerpo ya leído).
+        work: Corrutina del trabajo.
+
+    Returns:
+        Resultado del trabajo.
+
+    Raises:
+        ClientDisconnected: Si el cliente se desconectó; el trabajo ya terminó de cancelarse.
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_wait_disconnect(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        if not task.done():
+            task.cancel()
+            # Esperar a que el turno se revierta antes de responder
+            await asyncio.wait({task})
+            if not task.cancelled() and task.exception() is None:
+                return task.result()
+            raise ClientDisconnected()
+        return task.result()
+    except asyncio.CancelledError:
+        task.cancel()
+        raise
+    finally:
+        watcher.cancel()
@@ -0,0 +1,108 @@
+"""
+Cierre ordenado de la aplicación con drenado de los turnos en curso.
+
+Al desplegar una nueva versión, el proceso recibe la señal de apagado con turnos del
+agente a medio ejecutar. DrainController:
+- Registra cada turno en curso como una tarea propia
+- Al comenzar el drenado deja de admitir trabajo nuevo (ShuttingDown)
+- Espera a que los turnos en curso terminen hasta un plazo y cancela los restantes
+- Reporta cuántos turnos terminaron y cuántos se cancelaron
+"""
+
+import asyncio
+from typing import Any, Awaitable, Dict, Set
+
+
+class ShuttingDown(Exception):
+    """Se lanza al intentar iniciar un turno mientras la aplicación se está cerrando."""
+
+    def __init__(self):
+        super().__init__("El servidor se está reiniciando, vuelve a intentarlo en unos segundos")
+
+
+class DrainController:
+    """
+    Seguimiento de los turnos en curso para poder drenarlos al cerrar.
+
+    Ejemplo:
+        drain = DrainController()
+        result = await drain.run(procesar_turno())   # en cada solicitud
+        report = await drain.drain(timeout=25)       # al cerrar la aplicación
+    """
+
+    def __init__(self):
+        self.draining = False
+        self._tasks: Set[asyncio.Task] = set()
+
+    @property
+    def in_flight(self) -> int:
+        """Número de turnos en curso."""
+        return len(self._tasks)
+
+    def check(self) -> None:
+        """
+        Comprueba que la aplicación admite trabajo nuevo.
+
+        Raises:
+            ShuttingDown: Si el drenado ya comenzó.
+        """
+        if self.draining:
+            raise ShuttingDown()
+
+    async def run(self, work: Awaitable[Any]) -> Any:
+        """
+        Ejecuta un turno como tarea registrada.
+
+        Args:
+            work: Corrutina del turno.
+
+        Returns:
+            Resultado del turno.
+
+        Raises:
+            ShuttingDown: Si el drenado ya comenzó o si el turno se canceló por superar
+                         el plazo de drenado.
+        """
+        if self.draining:
+            if asyncio.iscoroutine(work):
+                work.close()
+            raise ShuttingDown()
+
+        task = asyncio.ensure_future(work)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        try:
+            return await task
+        except asyncio.CancelledError:
+            # Cancelado por el drenado (no por el cliente): se informa como reintentable
+            if self.draining and task.cancelled() and not _current_task_cancelling():
+                raise ShuttingDown()
+            raise
+
+    async def drain(self, timeout: float) -> Dict[str, int]:
+        """
+        Deja de admitir turnos y espera a los que están en curso.
+
+        Args:
+            timeout: Segundos máximos de espera antes de cancelar los turnos restantes.
+
+        Returns:
+            Número de turnos terminados ("drained") y cancelados ("cancelled").
+        """
+        self.draining = True
+        tasks = set(self._tasks)
+        if not tasks:
+            return {"drained": 0, "cancelled": 0}
+
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+        return {"drained": len(done), "cancelled": len(pending)}
+
+
+def _current_task_cancelling() -> bool:
+    """Indica si la tarea actual (la solicitud) también fue cancelada."""
+    task = asyncio.current_task()
+    return task is not None and getattr(task, "cancelling", lambda: 0)() > 0
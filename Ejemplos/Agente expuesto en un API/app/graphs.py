@@ -0,0 +1,242 @@
+"""
+Alojamiento de los grafos declarados en langgraph.json.
+
+La API solo exponía el MemoryAgent global. GraphRegistry sirve todos los grafos de
+langgraph.json desde el mismo proceso:
+- Cada grafo se importa y compila la primera vez que se usa (el inicio sigue siendo rápido)
+- Los grafos cargados quedan en una caché caliente para las solicitudes siguientes
+- Las solicitudes concurrentes a un grafo sin cargar esperan una única compilación
+- Un grafo sin uso durante idle_ttl segundos se descarga, de modo que la memoria depende
+  de los grafos que realmente se usan; los grafos fijados (pinned) nunca se descargan
+- Un grafo con ejecuciones en curso no se descarga
+
+Cada entrada de langgraph.json tiene la forma "./ruta/modulo.py:atributo", donde el
+atributo puede ser un grafo compilado, una función que construye el grafo (recibe el
+modelo de chat si tiene un parámetro llm) o una clase con atributo graph (MemoryAgent).
+"""
+
+import asyncio
+import contextlib
+import importlib
+import importlib.util
+import inspect
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+
+@dataclass
+class _LoadedGraph:
+    """Grafo compilado en la caché y su uso."""
+    graph: Any
+    loaded_at: float
+    last_used: float
+    load_seconds: float
+    in_use: int = 0
+    runs: int = 0
+
+
+def load_graph_specs(config_path: str) -> Dict[str, str]:
+    """
+    Lee las entradas "graphs" de un archivo langgraph.json.
+
+    Returns:
+        Diccionario nombre -> "./ruta/modulo.py:atributo".
+    """
+    with open(config_path, encoding="utf-8") as f:
+        return json.load(f).get("graphs", {})
+
+
+class GraphRegistry:
+    """
+    Grafos con carga diferida, caché caliente y descarga por inactividad.
+
+    Ejemplo:
+        graphs = GraphRegistry(load_graph_specs("langgraph.json"), base_dir=".", llm_factory=lambda: llm)
+        graphs.start()
+        async with graphs.use("router") as graph:
+            result = await graph.ainvoke({"input": "Cuéntame un chiste"})
+    """
+
+    def __init__(
+        self,
+        specs: Dict[str, str],
+        base_dir: str,
+        llm_factory: Optional[Callable[[], Any]] = None,
+        idle_ttl: float = 600.0,
+    ):
+        """
+        Inicializa el registro sin cargar ningún grafo.
+
+        Args:
+            specs: Nombre -> "./ruta/modulo.py:atributo", como en langgraph.json.
+            base_dir: Directorio respecto del cual se resuelven las rutas.
+            llm_factory: Función que devuelve el modelo de chat para los constructores
+                        de grafos que lo reciben.
+            idle_ttl: Segundos sin uso tras los que se descarga un grafo.
+        """
+        self.specs = dict(specs)
+        self.base_dir = os.path.abspath(base_dir)
+        self.llm_factory = llm_factory
+        self.idle_ttl = idle_ttl
+        self._loaders: Dict[str, Callable[[], Any]] = {}
+        self._pinned = set()
+        self._loaded: Dict[str, _LoadedGraph] = {}
+        self._load_locks: Dict[str, asyncio.Lock] = {}
+        self._loads: Dict[str, int] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    def register(self, name: str, loader: Callable[[], Any], pinned: bool = False) -> None:
+        """
+        Registra (o reemplaza) la forma de construir un grafo.
+
+        Args:
+            name: Nombre del grafo.
+            loader: Función sin argumentos que devuelve el grafo compilado.
+            pinned: Si es True el grafo no se descarga por inactividad.
+        """
+        self._loaders[name] = loader
+        if pinned:
+            self._pinned.add(name)
+        self._loaded.pop(name, None)
+
+    def __len__(self) -> int:
+        """Número de grafos cargados en la caché."""
+        return len(self._loaded)
+
+    @property
+    def names(self) -> List[str]:
+        """Nombres de todos los grafos disponibles."""
+        return sorted(set(self.specs) | set(self._loaders))
+
+    def start(self) -> None:
+        """Inicia la tarea que descarga los grafos inactivos."""
+        if self._reaper is None:
+            self._reaper = asyncio.create_task(self._reap_idle())
+
+    async def stop(self) -> None:
+        """Detiene la tarea de descarga y vacía la caché."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await self._reaper
+            self._reaper = None
+        self._loaded.clear()
+
+    def _import_target(self, spec: str) -> Any:
+        """Importa el atributo de una entrada "./ruta/modulo.py:atributo"."""
+        path, _, attribute = spec.partition(":")
+        if not attribute:
+            raise ValueError(f"Entrada inválida '{spec}': se esperaba ruta.py:atributo")
+        path = os.path.abspath(os.path.join(self.base_dir, path))
+        if self.base_dir not in sys.path:
+            sys.path.insert(0, self.base_dir)
+        relative = os.path.relpath(path, self.base_dir)
+        if not relative.startswith(".."):
+            # Importar como módulo del proyecto para no duplicar módulos ya importados
+            module = importlib.import_module(os.path.splitext(relative)[0].replace(os.sep, "."))
+        else:
+            module_spec = importlib.util.spec_from_file_location(os.path.splitext(os.path.basename(path))[0], path)
+            module = importlib.util.module_from_spec(module_spec)
+            module_spec.loader.exec_module(module)
+        return getattr(module, attribute)
+
+    def _build(self, name: str) -> Any:
+        """Construye un grafo a partir de su loader o de su entrada en langgraph.json."""
+        if name in self._loaders:
+            return self._loaders[name]()
+
+        target = self._import_target(self.specs[name])
+        if hasattr(target, "ainvoke") and hasattr(target, "astream"):
+            return target
+        wants_llm = "llm" in inspect.signature(target).parameters
+        built = target(llm=self.llm_factory()) if wants_llm and self.llm_factory else target()
+        # Clases como MemoryAgent exponen el grafo compilado en el atributo graph
+        return getattr(built, "graph", built)
+
+    async def get(self, name: str) -> Any:
+        """
+        Grafo compilado, cargándolo si es necesario.
+
+        Raises:
+            KeyError: Si el grafo no está declarado.
+        """
+        if name not in self.specs and name not in self._loaders:
+            raise KeyError(f"Grafo {name} no encontrado")
+        entry = self._loaded.get(name)
+        if entry is None:
+            lock = self._load_locks.setdefault(name, asyncio.Lock())
+            async with lock:
+                entry = self._loaded.get(name)
+                if entry is None:
+                    start = time.perf_counter()
+                    # Importar y compilar fuera del bucle de eventos
+                    graph = await asyncio.to_thread(self._build, name)
+                    now = time.monotonic()
+                    entry = _LoadedGraph(graph, now, now, time.perf_counter() - start)
+                    self._loaded[name] = entry
+                    self._loads[name] = self._loads.get(name, 0) + 1
+        entry.last_used = time.monotonic()
+        return entry.graph
+
+    @contextlib.asynccontextmanager
+    async def use(self, name: str) -> AsyncIterator[Any]:
+        """
+        Grafo compilado reservado durante una ejecución (no se descarga mientras tanto).
+
+        Raises:
+            KeyError: Si el grafo no está declarado.
+        """
+        graph = await self.get(name)
+        entry = self._loaded[name]
+        entry.in_use += 1
+        entry.runs += 1
+        try:
+            yield graph
+        finally:
+            entry.in_use -= 1
+            entry.last_used = time.monotonic()
+
+    def unload_idle(self) -> List[str]:
+        """
+        Descarga los grafos sin uso durante más de idle_ttl segundos.
+
+        Returns:
+            Nombres de los grafos descargados.
+        """
+        now = time.monotonic()
+        idle = [
+            name for name, entry in self._loaded.items()
+            if name not in self._pinned and entry.in_use == 0 and now - entry.last_used > self.idle_ttl
+        ]
+        for name in idle:
+            del self._loaded[name]
+        return idle
+
+    async def _reap_idle(self) -> None:
+        interval = max(1.0, min(self.idle_ttl / 2, 60.0))
+        while True:
+            await asyncio.sleep(interval)
+            for name in self.unload_idle():
+                print(f"💤 Grafo {name} descargado por inactividad")
+
+    def status(self) -> List[Dict[str, Any]]:
+        """Estado de cada grafo: cargado, ejecuciones en curso, cargas y tiempo de compilación."""
+        now = time.monotonic()
+        result = []
+        for name in self.names:
+            entry = self._loaded.get(name)
+            result.append({
+                "name": name,
+                "loaded": entry is not None,
+                "pinned": name in self._pinned,
+                "loads": self._loads.get(name, 0),
+                "in_use": entry.in_use if entry else 0,
+                "runs": entry.runs if entry else 0,
+                "idle_seconds": round(now - entry.last_used, 3) if entry else None,
+                "load_seconds": round(entry.load_seconds, 6) if entry else None,
+            })
+        return result
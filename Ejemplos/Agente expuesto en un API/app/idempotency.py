@@ -0,0 +1,186 @@
+"""
+Claves de idempotencia para los reintentos de /chat.
+
+Cuando un cliente agota su tiempo de espera y reintenta, el agente vuelve a ejecutar
+todo el ciclo ReAct: se paga dos veces al LLM y el turno queda duplicado en el hilo.
+Con la cabecera Idempotency-Key:
+- La primera solicitud registra la clave como "en curso" y guarda su respuesta al terminar
+- Los reintentos con la misma clave esperan a la ejecución en curso o reproducen la
+  respuesta guardada sin volver a ejecutar el agente
+- Reutilizar una clave con un cuerpo distinto es un error del cliente
+- Las respuestas caducan tras ttl segundos y el almacén guarda como máximo max_entries
+  claves (se descartan primero las respuestas que caducan antes). Las claves en curso
+  nunca se descartan: si todas lo están, una clave nueva se rechaza
+- Si la ejecución falla la clave se libera, así un reintento posterior vuelve a ejecutarse
+- Si la ejecución se cancela (por ejemplo, al cerrar la aplicación) la clave se libera y
+  un reintento que la estaba esperando la ejecuta de nuevo
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+class IdempotencyKeyReused(Exception):
+    """Se lanza cuando una clave ya usada llega con un cuerpo de solicitud distinto."""
+
+    def __init__(self, key: str):
+        self.key = key
+        super().__init__(f"La clave de idempotencia '{key}' ya se usó con otra solicitud")
+
+
+class IdempotencyStoreFull(Exception):
+    """Se lanza cuando no cabe una clave nueva porque todas las almacenadas están en curso."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        super().__init__(f"Hay {max_entries} solicitudes con clave de idempotencia en curso")
+
+
+class _Entry:
+    """Estado de una clave: en curso (future pendiente) o completada."""
+
+    __slots__ = ("fingerprint", "future", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future, expires_at: float):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at = expires_at
+
+
+def fingerprint(payload: Dict[str, Any]) -> str:
+    """Huella del cuerpo de una solicitud para detectar claves reutilizadas."""
+    data = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """
+    Almacén en memoria, acotado y con caducidad, de respuestas por clave de idempotencia.
+
+    Ejemplo:
+        store = IdempotencyStore(ttl=3600)
+        response, replayed = await store.run(key, fingerprint(body), lambda: procesar(body))
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 3600.0):
+        """
+        Inicializa el almacén.
+
+        Args:
+            max_entries: Número máximo de claves almacenadas.
+            ttl: Segundos durante los que se conserva una respuesta.
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.replays = 0
+        # Claves en curso y claves completadas; estas en orden de caducidad (el ttl es fijo)
+        self._in_flight: Dict[str, _Entry] = {}
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._in_flight) + len(self._entries)
+
+    def _get(self, key: str) -> Optional[_Entry]:
+        entry = self._in_flight.get(key)
+        return entry if entry is not None else self._entries.get(key)
+
+    def _purge(self, now: float) -> None:
+        """Elimina desde el principio las claves completadas que ya caducaron."""
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[key]
+
+    def _reserve(self, key: str, entry: _Entry) -> None:
+        """Registra una clave en curso, descartando la respuesta que caduca antes si no cabe."""
+        if len(self) >= self.max_entries:
+            if not self._entries:
+                raise IdempotencyStoreFull(self.max_entries)
+            self._entries.popitem(last=False)
+        self._in_flight[key] = entry
+
+    def _complete(self, key: str, entry: _Entry) -> None:
+        """Pasa una clave en curso a completada, al final del orden de caducidad."""
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+            entry.expires_at = time.monotonic() + self.ttl
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+
+    def _release(self, key: str, entry: _Entry) -> None:
+        """Libera una clave en curso cuya ejecución no terminó."""
+        if self._in_flight.get(key) is entry:
+            del self._in_flight[key]
+
+    async def run(self, key: str, request_fingerprint: str,
+                  execute: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Ejecuta la operación una sola vez por clave.
+
+        Args:
+            key: Clave de idempotencia enviada por el cliente.
+            request_fingerprint: Huella del cuerpo de la solicitud.
+            execute: Función asíncrona que produce la respuesta.
+
+        Returns:
+            Tupla (respuesta, reproducida). reproducida es True si la respuesta proviene
+            de una ejecución anterior o en curso.
+
+        Raises:
+            IdempotencyKeyReused: Si la clave se usó con otro cuerpo de solicitud.
+            IdempotencyStoreFull: Si la clave es nueva y el almacén está lleno de claves
+                en curso.
+        """
+        self._purge(time.monotonic())
+
+        entry = self._get(key)
+        while entry is not None:
+            if entry.fingerprint != request_fingerprint:
+                raise IdempotencyKeyReused(key)
+            try:
+                # shield: si este reintento se cancela, la ejecución original continúa
+                result = await asyncio.shield(entry.future)
+            except asyncio.CancelledError:
+                if not entry.future.cancelled():
+                    raise
+                # Se canceló la ejecución original y no este reintento: se ejecuta aquí
+                entry = self._get(key)
+                continue
+            self.replays += 1
+            return result, True
+
+        future = asyncio.get_running_loop().create_future()
+        entry = _Entry(request_fingerprint, future, float("inf"))
+        self._reserve(key, entry)
+
+        try:
+            result = await execute()
+        except BaseException as e:
+            # Los errores no se guardan: la clave queda libre para un nuevo intento
+            self._release(key, entry)
+            if isinstance(e, Exception):
+                future.set_exception(e)
+                # Marca la excepción como recuperada aunque ningún reintento esté esperando
+                future.exception()
+            else:
+                future.cancel()
+            raise
+
+        future.set_result(result)
+        self._complete(key, entry)
+        return result, False
+
+    def stats(self) -> Dict[str, Any]:
+        """Claves almacenadas, en curso y respuestas reproducidas."""
+        return {
+            "keys": len(self),
+            "in_flight": len(self._in_flight),
+            "replays": self.replays,
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+        }
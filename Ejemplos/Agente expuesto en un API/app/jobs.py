@@ -0,0 +1,334 @@
+"""
+Cola de trabajos asíncronos para turnos de chat de larga duración.
+
+/chat mantiene abierta la solicitud HTTP durante todo el ciclo ReAct, lo que puede
+superar el tiempo de espera del proxy en turnos con muchas herramientas. Con JobQueue:
+- POST /jobs encola el turno y devuelve su identificador de inmediato
+- Un número acotado de trabajadores procesa la cola; los turnos de un mismo hilo de
+  conversación se ejecutan en orden, uno a la vez. Un trabajo cuyo hilo está ocupado
+  espera detrás del turno en curso sin ocupar un trabajador
+- El estado, la salida parcial y el resultado se guardan en SQLite (en un hilo aparte,
+  fuera del event loop), de modo que los trabajos pendientes se retoman al reiniciar. Los
+  interrumpidos a mitad de ejecución se deshacen en su hilo antes de repetirse
+- Los suscriptores reciben los eventos del turno a medida que se generan (SSE)
+"""
+
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Set
+
+
+# Estados de un trabajo
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+FINISHED_STATUSES = (COMPLETED, FAILED)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    request TEXT NOT NULL,
+    partial TEXT NOT NULL DEFAULT '',
+    result TEXT,
+    error TEXT,
+    error_status INTEGER,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at);
+"""
+
+# Intervalo mínimo entre escrituras de la salida parcial (segundos)
+PARTIAL_FLUSH_INTERVAL = 0.5
+
+
+class JobQueue:
+    """
+    Cola persistente de turnos de chat procesada por trabajadores asíncronos.
+
+    Cada turno recibe en la solicitud turn_id = identificador del trabajo, con el que
+    discard_turn puede deshacerlo si el proceso se detuvo a mitad de ejecución.
+
+    Ejemplo:
+        jobs = JobQueue("jobs.sqlite3", lambda req: agent.astream_chat(**req))
+        await jobs.start()
+        job_id = await jobs.submit({"message": "Suma 3 y 4", "thread_id": "a"})
+        print(await jobs.get(job_id))
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        run_turn: Callable[[Dict[str, Any]], AsyncIterator[Dict[str, Any]]],
+        max_concurrency: int = 4,
+        error_status: Optional[Callable[[Exception], int]] = None,
+        discard_turn: Optional[Callable[[Dict[str, Any]], Any]] = None,
+    ):
+        """
+        Inicializa la cola.
+
+        Args:
+            db_path: Archivo SQLite donde se persisten los trabajos.
+            run_turn: Función que recibe la solicitud (con turn_id) y devuelve los eventos
+                     del turno (como MemoryAgent.astream_chat); el último evento es "done".
+            max_concurrency: Número de trabajadores.
+            error_status: Función que traduce una excepción a código HTTP (500 por defecto).
+            discard_turn: Función que deshace en su hilo el turno de una solicitud (con
+                         turn_id) interrumpida por la detención del proceso, antes de
+                         repetirla (como MemoryAgent.discard_turn).
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser al menos 1")
+        self.db_path = db_path
+        self.run_turn = run_turn
+        self.max_concurrency = max_concurrency
+        self.error_status = error_status or (lambda e: 500)
+        self.discard_turn = discard_turn
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self._busy: Set[asyncio.Task] = set()
+        self._closing = False
+        self._subscribers: Dict[str, List[asyncio.Queue]] = {}
+        # thread_id -> trabajos del hilo en orden; el primero es el que se ejecuta
+        self._thread_jobs: Dict[str, Deque[str]] = {}
+
+    async def start(self) -> int:
+        """
+        Inicia los trabajadores y vuelve a encolar el trabajo pendiente.
+
+        Los trabajos que estaban en ejecución cuando el proceso se detuvo se deshacen en
+        su hilo (discard_turn) y se reinician desde el principio.
+
+        Returns:
+            Número de trabajos retomados.
+        """
+        self._pending = asyncio.Queue()
+        self._closing = False
+        self._thread_jobs = {}
+        interrupted = await self._query("SELECT id, request FROM jobs WHERE status = ?", (RUNNING,))
+        for job_id, request in interrupted:
+            if self.discard_turn is not None:
+                self.discard_turn(self._turn_request(job_id, request))
+            await self._update(job_id, status=QUEUED, partial="")
+        rows = await self._query("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,))
+        for (job_id,) in rows:
+            self._pending.put_nowait(job_id)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        return len(rows)
+
+    async def stop(self, timeout: float = 0.0) -> Dict[str, int]:
+        """
+        Detiene los trabajadores y cierra la base de datos.
+
+        Los trabajadores libres se detienen de inmediato; los que ejecutan un trabajo
+        disponen de hasta timeout segundos para terminarlo. Los trabajos cancelados
+        vuelven a la cola y se retoman en el próximo inicio.
+
+        Args:
+            timeout: Segundos de espera para los trabajos en curso.
+
+        Returns:
+            Número de trabajos terminados ("drained") y cancelados ("cancelled").
+        """
+        self._closing = True
+        busy = set(self._busy)
+        for worker in self._workers:
+            if worker not in busy:
+                worker.cancel()
+
+        done, pending = set(), set()
+        if busy:
+            done, pending = await asyncio.wait(busy, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        await asyncio.to_thread(self._close)
+        return {"drained": len(done), "cancelled": len(pending)}
+
+    async def submit(self, request: Dict[str, Any]) -> str:
+        """
+        Encola un turno de chat.
+
+        Args:
+            request: Argumentos de run_turn (message, thread_id, max_prompt_tokens).
+
+        Returns:
+            Identificador del trabajo.
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        await self._execute(
+            "INSERT INTO jobs (id, status, request, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (job_id, QUEUED, json.dumps(request, ensure_ascii=False), now, now),
+        )
+        self._pending.put_nowait(job_id)
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Consulta un trabajo.
+
+        Returns:
+            Estado, salida parcial, resultado y error del trabajo, o None si no existe.
+        """
+        rows = await self._query(
+            "SELECT id, status, request, partial, result, error, error_status, created_at, updated_at "
+            "FROM jobs WHERE id = ?",
+            (job_id,),
+        )
+        if not rows:
+            return None
+        row = rows[0]
+        request = json.loads(row[2])
+        return {
+            "job_id": row[0],
+            "status": row[1],
+            "thread_id": request.get("thread_id", "default"),
+            "partial_response": row[3],
+            "result": json.loads(row[4]) if row[4] else None,
+            "error": row[5],
+            "error_status": row[6],
+            "created_at": row[7],
+            "updated_at": row[8],
+        }
+
+    async def counts(self) -> Dict[str, int]:
+        """Número de trabajos por estado."""
+        rows = await self._query("SELECT status, COUNT(*) FROM jobs GROUP BY status")
+        return {status: count for status, count in rows}
+
+    async def subscribe(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Eventos de un trabajo a medida que se generan.
+
+        El primer evento es {"type": "status", ...} con el estado actual; si el trabajo
+        ya terminó también es el último.
+
+        Yields:
+            Eventos "status", "token", "tool_call", "tool_result", "done" y "error".
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        self._subscribers.setdefault(job_id, []).append(queue)
+        try:
+            job = await self.get(job_id)
+            if job is None:
+                return
+            yield {"type": "status", **job}
+            if job["status"] in FINISHED_STATUSES:
+                return
+            while True:
+                event = await queue.get()
+                yield event
+                if event["type"] in ("done", "error"):
+                    return
+        finally:
+            queue_list = self._subscribers.get(job_id, [])
+            if queue in queue_list:
+                queue_list.remove(queue)
+            if not queue_list:
+                self._subscribers.pop(job_id, None)
+
+    def _publish(self, job_id: str, event: Dict[str, Any]) -> None:
+        for queue in self._subscribers.get(job_id, []):
+            queue.put_nowait(event)
+
+    def _locked_query(self, sql: str, params: tuple) -> List[tuple]:
+        with self._db_lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def _locked_execute(self, sql: str, params: tuple) -> None:
+        with self._db_lock, self._db:
+            self._db.execute(sql, params)
+
+    def _close(self) -> None:
+        with self._db_lock:
+            self._db.close()
+
+    async def _query(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Consulta SQLite en un hilo aparte para no bloquear el event loop."""
+        return await asyncio.to_thread(self._locked_query, sql, params)
+
+    async def _execute(self, sql: str, params: tuple = ()) -> None:
+        """Escritura SQLite en un hilo aparte para no bloquear el event loop."""
+        await asyncio.to_thread(self._locked_execute, sql, params)
+
+    async def _update(self, job_id: str, **fields) -> None:
+        fields["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        await self._execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    @staticmethod
+    def _turn_request(job_id: str, request: str) -> Dict[str, Any]:
+        """Solicitud del turno de un trabajo: turn_id identifica sus checkpoints."""
+        return {**json.loads(request), "turn_id": job_id}
+
+    async def _worker(self) -> None:
+        current = asyncio.current_task()
+        while not self._closing:
+            job_id = await self._pending.get()
+            rows = await self._query("SELECT request, status FROM jobs WHERE id = ?", (job_id,))
+            if not rows or rows[0][1] != QUEUED:
+                continue
+            request = self._turn_request(job_id, rows[0][0])
+
+            # Los turnos de un mismo hilo se ejecutan en orden de llegada: si el hilo
+            # está ocupado, el trabajo espera su turno sin retener al trabajador
+            thread_id = request.get("thread_id", "default")
+            thread_jobs = self._thread_jobs.setdefault(thread_id, deque())
+            if thread_jobs and thread_jobs[0] != job_id:
+                if job_id not in thread_jobs:
+                    thread_jobs.append(job_id)
+                continue
+            if not thread_jobs:
+                thread_jobs.append(job_id)
+
+            self._busy.add(current)
+            try:
+                await self._run(job_id, request)
+            finally:
+                self._busy.discard(current)
+                thread_jobs.popleft()
+                if thread_jobs:
+                    # El siguiente trabajo del hilo vuelve a la cola y lo toma cualquier trabajador
+                    self._pending.put_nowait(thread_jobs[0])
+                else:
+                    self._thread_jobs.pop(thread_id, None)
+
+    async def _run(self, job_id: str, request: Dict[str, Any]) -> None:
+        await self._update(job_id, status=RUNNING)
+        self._publish(job_id, {"type": "status", "status": RUNNING})
+        partial: List[str] = []
+        last_flush = time.monotonic()
+        try:
+            async for event in self.run_turn(request):
+                if event["type"] == "token":
+                    partial.append(event["content"])
+                    if time.monotonic() - last_flush >= PARTIAL_FLUSH_INTERVAL:
+                        await self._update(job_id, partial="".join(partial))
+                        last_flush = time.monotonic()
+                if event["type"] == "done":
+                    result = {key: value for key, value in event.items() if key != "type"}
+                    await self._update(
+                        job_id, status=COMPLETED, partial="".join(partial),
+                        result=json.dumps(result, ensure_ascii=False, default=str),
+                    )
+                self._publish(job_id, event)
+        except asyncio.CancelledError:
+            # Se detiene el proceso: el trabajo se retoma en el próximo inicio
+            await self._update(job_id, status=QUEUED, partial="")
+            raise
+        except Exception as e:
+            code = self.error_status(e)
+            await self._update(job_id, status=FAILED, error=str(e), error_status=code)
+            self._publish(job_id, {"type": "error", "status": code, "detail": str(e)})
@@ -7,19 +7,38 @@ permitiendo interacciones de chat, gestión de conversaciones y monitoreo del si
 
 import os
 import sys
+import json
+import uuid
+import secrets
+import asyncio
 from typing import List, Dict, Any, Optional
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 
 # Agregar el directorio padre al path para importaciones
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from fastapi import FastAPI, HTTPException, status
+from fastapi import FastAPI, HTTPException, status, Depends, Header, Query, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from pydantic import BaseModel, Field
 import uvicorn
 
+from agente.cancellation import TurnDeadlineExceeded, guarded_stream, guarded_turn
+from agente.cassette import replay_only
 from agente.memory_agent import MemoryAgent
+from agente.tokens import TokenBudgetExceeded
+from agente.turn_budget import TurnBudget
+from agente.checkpointer import THREAD_SORT_FIELDS
+from agente.export import FORMATS, ConversationImporter, RecordDecoder, encode_records
+from app.idempotency import IdempotencyStore, IdempotencyStoreFull, IdempotencyKeyReused, fingerprint
+from app.jobs import JobQueue
+from app.drain import DrainController, ShuttingDown
+from app.disconnect import CLIENT_CLOSED_REQUEST, ClientDisconnected, cancel_on_disconnect
+from app.graphs import GraphRegistry, load_graph_specs
+from app.diagnostics import MemoryDiagnostics, cache_sizes, heaviest_threads, process_memory, thread_footprint
+from tool.executor import ToolExecutor, ToolLimits
 
 
 # Modelos Pydantic para las solicitudes y respuestas
@@ -27,6 +46,24 @@ class ChatRequest(BaseModel):
     """Modelo para solicitudes de chat."""
     message: str = Field(..., description="Mensaje del usuario", min_length=1)
     thread_id: str = Field(default="default", description="ID del hilo de conversación")
+    max_prompt_tokens: Optional[int] = Field(
+        default=None, ge=1, description="Presupuesto de tokens por llamada al modelo para esta solicitud"
+    )
+    timeout: Optional[float] = Field(
+        default=None, gt=0, description="Plazo del turno en segundos (por defecto TURN_TIMEOUT)"
+    )
+    max_steps: Optional[int] = Field(
+        default=None, ge=0, description="Rondas de herramientas del turno (por defecto TURN_MAX_STEPS)"
+    )
+    max_tool_calls: Optional[int] = Field(
+        default=None, ge=0, description="Llamadas a herramientas del turno (por defecto TURN_MAX_TOOL_CALLS)"
+    )
+    max_seconds: Optional[float] = Field(
+        default=None, gt=0, description="Segundos tras los que el turno no usa más herramientas (por defecto TURN_MAX_SECONDS)"
+    )
+    max_tokens: Optional[int] = Field(
+        default=None, ge=1, description="Tokens totales de las llamadas al modelo del turno (por defecto TURN_MAX_TOKENS)"
+    )
 
 
 class ChatResponse(BaseModel):
@@ -35,6 +72,12 @@ class ChatResponse(BaseModel):
     thread_id: str = Field(..., description="ID del hilo de conversación")
     message_count: int = Field(..., description="Número total de mensajes en la conversación")
     tools_used: List[Dict[str, Any]] = Field(default=[], description="Herramientas utilizadas en esta respuesta")
+    token_usage: Dict[str, int] = Field(default={}, description="Tokens consumidos en este turno")
+    thread_token_usage: Dict[str, int] = Field(default={}, description="Tokens acumulados en el hilo de conversación")
+    budget_exhausted: Optional[str] = Field(
+        default=None,
+        description="Presupuesto del turno que se agotó (steps, tool_calls, tokens o time); la respuesta usa lo obtenido hasta entonces"
+    )
 
 
 class ConversationHistoryResponse(BaseModel):
@@ -42,6 +85,77 @@ class ConversationHistoryResponse(BaseModel):
     thread_id: str = Field(..., description="ID del hilo de conversación")
     messages: List[Dict[str, Any]] = Field(..., description="Lista de mensajes del historial")
     message_count: int = Field(..., description="Número total de mensajes")
+    token_usage: Dict[str, int] = Field(default={}, description="Tokens acumulados en el hilo de conversación")
+
+
+class ForkRequest(BaseModel):
+    """Modelo para bifurcar una conversación."""
+    checkpoint_id: Optional[str] = Field(
+        default=None, description="Checkpoint de origen (por defecto el más reciente)"
+    )
+    new_thread_id: Optional[str] = Field(
+        default=None, min_length=1, description="ID del hilo nuevo (por defecto se genera uno)"
+    )
+
+
+class ForkResponse(BaseModel):
+    """Modelo para el resultado de una bifurcación."""
+    thread_id: str = Field(..., description="ID del hilo nuevo")
+    forked_from: str = Field(..., description="ID del hilo de origen")
+    checkpoint_id: str = Field(..., description="Checkpoint desde el que se bifurcó")
+    message_count: int = Field(..., description="Mensajes heredados del hilo de origen")
+
+
+class ImportResponse(BaseModel):
+    """Modelo para el resultado de una importación masiva."""
+    threads: int = Field(..., description="Número de hilos importados")
+    messages: int = Field(..., description="Número de mensajes importados")
+
+
+class ThreadExpireRequest(BaseModel):
+    """Criterios para eliminar conversaciones en bloque (se combinan con Y)."""
+    idle_seconds: Optional[float] = Field(default=None, gt=0, description="Sin actividad durante más de estos segundos")
+    created_before: Optional[float] = Field(default=None, description="Creadas antes de esta fecha (epoch)")
+    min_messages: Optional[int] = Field(default=None, ge=0, description="Con al menos este número de mensajes")
+    min_bytes: Optional[int] = Field(default=None, ge=0, description="Con al menos este tamaño en bytes")
+    thread_prefix: Optional[str] = Field(default=None, min_length=1, description="Cuyo thread_id comienza con este prefijo")
+
+
+class ThreadExpireResponse(BaseModel):
+    """Modelo para el resultado de una expiración en bloque."""
+    deleted: int = Field(..., description="Número de conversaciones eliminadas")
+    thread_ids: List[str] = Field(..., description="Conversaciones eliminadas")
+
+
+class JobResponse(BaseModel):
+    """Modelo para el estado de un trabajo asíncrono."""
+    job_id: str = Field(..., description="ID del trabajo")
+    status: str = Field(..., description="Estado: queued, running, completed o failed")
+    thread_id: str = Field(..., description="ID del hilo de conversación")
+    partial_response: str = Field(default="", description="Texto generado hasta el momento")
+    result: Optional[ChatResponse] = Field(default=None, description="Respuesta final del agente")
+    error: Optional[str] = Field(default=None, description="Error si el trabajo falló")
+    error_status: Optional[int] = Field(default=None, description="Código HTTP equivalente al error")
+    created_at: float = Field(..., description="Fecha de creación (epoch)")
+    updated_at: float = Field(..., description="Fecha de la última actualización (epoch)")
+
+
+class GraphRunRequest(BaseModel):
+    """Modelo para ejecutar uno de los grafos alojados."""
+    input: Dict[str, Any] = Field(..., description="Estado de entrada del grafo")
+    thread_id: Optional[str] = Field(
+        default=None, min_length=1, description="Hilo de ejecución (por defecto se genera uno)"
+    )
+    timeout: Optional[float] = Field(
+        default=None, gt=0, description="Plazo de la ejecución en segundos (por defecto TURN_TIMEOUT)"
+    )
+
+
+class GraphRunResponse(BaseModel):
+    """Modelo para el resultado de un grafo."""
+    graph: str = Field(..., description="Nombre del grafo")
+    thread_id: str = Field(..., description="Hilo de ejecución")
+    output: Dict[str, Any] = Field(..., description="Estado final del grafo")
 
 
 class HealthResponse(BaseModel):
@@ -54,21 +168,183 @@ class HealthResponse(BaseModel):
 # Variable global para el agente
 agent = None
 
+# Cola de trabajos asíncronos (se crea al iniciar la aplicación)
+jobs = None
+
+# Grafos de langgraph.json, cargados bajo demanda (se crea al iniciar la aplicación)
+graphs = None
+
+# Archivo con los grafos a alojar y segundos sin uso tras los que se descarga un grafo
+LANGGRAPH_CONFIG = os.environ.get(
+    "LANGGRAPH_CONFIG",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "langgraph.json")
+)
+GRAPH_IDLE_TTL = float(os.environ.get("GRAPH_IDLE_TTL", "600"))
+
+# Grafo del agente global: se sirve solo por /chat, /ws/chat/{thread_id} y /jobs, que
+# aplican idempotencia, presupuestos de turno y plazos y usan los thread_id del cliente
+AGENT_GRAPH = "memory_agent"
+
+# Turnos en curso, drenados al cerrar la aplicación
+drain = DrainController()
+
+# Segundos que los turnos en curso pueden seguir ejecutándose tras la señal de apagado
+SHUTDOWN_TIMEOUT = float(os.environ.get("SHUTDOWN_TIMEOUT", "25"))
+
+# Drenado de turnos y trabajos; se crea una sola vez (ver begin_drain)
+drain_task = None
+
+# Plazo por defecto de cada turno o ejecución de grafo (sin definir: sin plazo)
+TURN_TIMEOUT = float(os.environ["TURN_TIMEOUT"]) if os.environ.get("TURN_TIMEOUT") else None
+
+# Presupuestos por defecto del ciclo ReAct de cada turno (vacío: sin límite)
+TURN_MAX_STEPS = os.environ.get("TURN_MAX_STEPS", "10")
+TURN_MAX_TOOL_CALLS = os.environ.get("TURN_MAX_TOOL_CALLS")
+TURN_MAX_SECONDS = os.environ.get("TURN_MAX_SECONDS")
+TURN_MAX_TOKENS = os.environ.get("TURN_MAX_TOKENS")
+
+# Archivo donde se guardan las conversaciones al cerrar y desde el que se restauran al iniciar
+SNAPSHOT_PATH = os.environ.get("CHECKPOINT_SNAPSHOT_PATH")
+
+# Capa fría de conversaciones (opcional): directorio de volcado, máximo de conversaciones
+# en memoria y segundos sin actividad tras los que una conversación se vuelca
+SPILL_DIR = os.environ.get("CHECKPOINT_SPILL_DIR")
+MAX_HOT_THREADS = os.environ.get("CHECKPOINT_MAX_HOT_THREADS")
+SPILL_AFTER = os.environ.get("CHECKPOINT_SPILL_AFTER")
+
+# Tarea que vuelca las conversaciones inactivas (se crea al iniciar la aplicación)
+spill_task = None
+
+# Configuración de las sesiones WebSocket (por proceso de trabajo)
+WS_MAX_CONNECTIONS = int(os.environ.get("WS_MAX_CONNECTIONS", "100"))
+WS_PING_INTERVAL = float(os.environ.get("WS_PING_INTERVAL", "20"))
+WS_MAX_MISSED_PINGS = 2
+WS_SEND_QUEUE_SIZE = 256
+WS_MAX_PENDING_MESSAGES = 8
+
+# Conexiones WebSocket abiertas en este proceso
+active_websockets = 0
+
+# Respuestas de /chat por clave de idempotencia (por proceso de trabajo)
+idempotency_store = IdempotencyStore(
+    max_entries=int(os.environ.get("IDEMPOTENCY_MAX_KEYS", "10000")),
+    ttl=float(os.environ.get("IDEMPOTENCY_TTL", "3600"))
+)
+
+# Diagnóstico de memoria (opcional): MEMORY_DIAGNOSTICS=1 habilita /admin/memory/*
+MEMORY_DIAGNOSTICS = os.environ.get("MEMORY_DIAGNOSTICS", "").lower() in ("1", "true", "yes")
+memory_diagnostics = MemoryDiagnostics(
+    max_duration=float(os.environ.get("MEMORY_TRACE_MAX_SECONDS", "300"))
+)
+
+
+def verify_admin_token(x_admin_token: Optional[str] = Header(default=None)):
+    """
+    Protege los endpoints de administración.
+    
+    Las solicitudes deben incluir en la cabecera X-Admin-Token el valor de la variable
+    de entorno ADMIN_TOKEN. Sin ADMIN_TOKEN los endpoints /admin/* no están disponibles.
+    """
+    expected = os.environ.get("ADMIN_TOKEN")
+    if not expected:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Endpoints de administración deshabilitados (definir ADMIN_TOKEN para habilitarlos)"
+        )
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token.encode(), expected.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de administración inválido"
+        )
+
+
+def require_memory_diagnostics():
+    """Los endpoints de diagnóstico de memoria solo existen con MEMORY_DIAGNOSTICS=1."""
+    if not MEMORY_DIAGNOSTICS:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Diagnóstico de memoria deshabilitado (MEMORY_DIAGNOSTICS=1 para habilitarlo)"
+        )
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gestión del ciclo de vida de la aplicación."""
-    global agent
+    global agent, jobs, graphs, spill_task, drain_task
     
-    # Startup
+    # Startup (un reinicio en el mismo proceso vuelve a admitir trabajo)
+    drain.draining = False
+    drain_task = None
     try:
         # Verificar que la API key esté disponible
-        if not os.environ.get("GOOGLE_API_KEY"):
+        if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
             raise ValueError("GOOGLE_API_KEY no está configurada en las variables de entorno")
         
-        # Inicializar el agente
-        agent = MemoryAgent()
+        # Pool de procesos para las herramientas costosas, con límites por llamada
+        tool_executor = ToolExecutor(
+            max_workers=int(os.environ.get("TOOL_WORKERS", "2")),
+            limits=ToolLimits(
+                timeout=float(os.environ.get("TOOL_TIMEOUT", "2")),
+                max_operand_digits=int(os.environ.get("TOOL_MAX_OPERAND_DIGITS", "1000")),
+                max_result_digits=int(os.environ.get("TOOL_MAX_RESULT_DIGITS", "10000"))
+            )
+        )
+        
+        # Inicializar el agente con el presupuesto de tokens configurado
+        max_prompt_tokens = os.environ.get("MAX_PROMPT_TOKENS")
+        agent = MemoryAgent(
+            max_prompt_tokens=int(max_prompt_tokens) if max_prompt_tokens else None,
+            budget_policy=os.environ.get("TOKEN_BUDGET_POLICY", "trim"),
+            checkpoint_shards=int(os.environ.get("CHECKPOINT_SHARDS", "16")),
+            tool_executor=tool_executor,
+            spill_dir=SPILL_DIR,
+            max_hot_threads=int(MAX_HOT_THREADS) if MAX_HOT_THREADS else None,
+            spill_after=float(SPILL_AFTER) if SPILL_AFTER else None,
+            turn_timeout=TURN_TIMEOUT,
+            turn_budget=TurnBudget(
+                max_steps=int(TURN_MAX_STEPS) if TURN_MAX_STEPS else None,
+                max_tool_calls=int(TURN_MAX_TOOL_CALLS) if TURN_MAX_TOOL_CALLS else None,
+                max_seconds=float(TURN_MAX_SECONDS) if TURN_MAX_SECONDS else None,
+                max_tokens=int(TURN_MAX_TOKENS) if TURN_MAX_TOKENS else None
+            )
+        )
         print("✅ Agente con memoria inicializado correctamente")
+        if SPILL_DIR:
+            print(f"✅ Capa fría de conversaciones en {SPILL_DIR}")
+            if SPILL_AFTER:
+                spill_task = asyncio.create_task(spill_idle_threads(float(SPILL_AFTER)))
+        
+        # Restaurar las conversaciones guardadas en el último cierre
+        if SNAPSHOT_PATH:
+            restored = await run_in_threadpool(agent.load_snapshot, SNAPSHOT_PATH)
+            print(f"✅ Conversaciones restauradas: {restored['threads']} hilos, {restored['messages']} mensajes")
+        
+        # Iniciar los trabajadores de la cola de trabajos
+        jobs = JobQueue(
+            os.environ.get("JOBS_DB_PATH", "jobs.sqlite3"),
+            lambda request: agent.astream_chat(**request),
+            max_concurrency=int(os.environ.get("JOBS_CONCURRENCY", "4")),
+            error_status=_error_status,
+            discard_turn=lambda request: agent.discard_turn(request["thread_id"], request["turn_id"])
+        )
+        resumed = await jobs.start()
+        print(f"✅ Cola de trabajos iniciada ({resumed} trabajos pendientes retomados)")
+        
+        # Registrar los grafos de langgraph.json sin compilarlos, salvo el del agente global
+        specs = load_graph_specs(LANGGRAPH_CONFIG) if os.path.exists(LANGGRAPH_CONFIG) else {}
+        graphs = GraphRegistry(
+            {name: spec for name, spec in specs.items() if name != AGENT_GRAPH},
+            base_dir=os.path.dirname(LANGGRAPH_CONFIG),
+            llm_factory=lambda: agent.llm,
+            idle_ttl=GRAPH_IDLE_TTL
+        )
+        graphs.start()
+        print(f"✅ Grafos disponibles: {', '.join(graphs.names)}")
         
     except Exception as e:
         print(f"❌ Error al inicializar el agente: {e}")
@@ -76,8 +352,80 @@ async def lifespan(app: FastAPI):
     
     yield
     
-    # Shutdown
+    # Shutdown: normalmente el drenado ya terminó al recibir la señal (run_server.py); si el
+    # servidor no lo inició, se drena aquí lo que quede
     print("🔄 Cerrando aplicación...")
+    await begin_drain()
+    
+    if graphs is not None:
+        await graphs.stop()
+    
+    memory_diagnostics.stop()
+    
+    if spill_task is not None:
+        spill_task.cancel()
+        with suppress(asyncio.CancelledError):
+            await spill_task
+    
+    if SNAPSHOT_PATH and agent is not None:
+        saved = await run_in_threadpool(agent.save_snapshot, SNAPSHOT_PATH)
+        print(f"💾 Conversaciones guardadas: {saved['threads']} hilos, {saved['messages']} mensajes")
+    
+    if agent is not None and SPILL_DIR:
+        # Después de la instantánea: el archivo de la capa fría es solo de este proceso
+        agent.memory.close()
+    
+    if agent is not None and agent.tool_executor is not None:
+        agent.tool_executor.shutdown()
+
+
+def begin_drain() -> asyncio.Task:
+    """
+    Deja de admitir trabajo y drena los turnos y trabajos en curso (una sola vez).
+    
+    Se llama al recibir la señal de apagado, antes de que el servidor cierre las
+    conexiones: mientras tanto /health responde 503 y las solicitudes nuevas reciben 503
+    con Retry-After. Turnos y trabajos comparten un único plazo de SHUTDOWN_TIMEOUT.
+    
+    Returns:
+        Tarea del drenado (la misma en todas las llamadas).
+    """
+    global drain_task
+    if drain_task is None:
+        # Desde ahora el middleware rechaza las solicitudes nuevas
+        drain.draining = True
+        drain_task = asyncio.ensure_future(_drain_in_flight())
+    return drain_task
+
+
+async def _drain_in_flight() -> None:
+    """Espera a los turnos y a los trabajos en curso a la vez, con el mismo plazo."""
+    print(f"⏳ Esperando hasta {SHUTDOWN_TIMEOUT:.0f}s a {drain.in_flight} turnos en curso...")
+    stop_jobs = jobs.stop(SHUTDOWN_TIMEOUT) if jobs is not None else asyncio.sleep(0, None)
+    turns, job_counts = await asyncio.gather(drain.drain(SHUTDOWN_TIMEOUT), stop_jobs)
+    print(f"✅ Turnos: {turns['drained']} completados, {turns['cancelled']} cancelados")
+    if job_counts is not None:
+        print(f"✅ Trabajos: {job_counts['drained']} completados, "
+              f"{job_counts['cancelled']} devueltos a la cola")
+
+
+async def spill_idle_threads(spill_after: float):
+    """Vuelca periódicamente a la capa fría las conversaciones inactivas."""
+    interval = max(1.0, min(spill_after / 2, 60.0))
+    while True:
+        await asyncio.sleep(interval)
+        spilled = await run_in_threadpool(agent.memory.spill_idle)
+        if spilled:
+            print(f"🧊 {spilled} conversaciones volcadas a la capa fría")
+
+
+def _error_status(error: Exception) -> int:
+    """Código HTTP equivalente a un error del agente."""
+    if isinstance(error, TokenBudgetExceeded):
+        return status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    if isinstance(error, TurnDeadlineExceeded):
+        return status.HTTP_504_GATEWAY_TIMEOUT
+    return status.HTTP_500_INTERNAL_SERVER_ERROR
 
 
 # Crear la aplicación FastAPI
@@ -90,6 +438,18 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+@app.middleware("http")
+async def reject_when_draining(request: Request, call_next):
+    """Rechaza solicitudes nuevas mientras la aplicación se está cerrando."""
+    if drain.draining and request.url.path not in ("/", "/health"):
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"detail": str(ShuttingDown())},
+            headers={"Retry-After": "5"}
+        )
+    return await call_next(request)
+
+
 # Configurar CORS
 app.add_middleware(
     CORSMiddleware,
@@ -119,6 +479,13 @@ async def health_check():
             detail="El agente no está inicializado"
         )
     
+    # Durante el cierre el balanceador debe dejar de enviar tráfico a esta instancia
+    if drain.draining:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La aplicación se está cerrando"
+        )
+    
     return HealthResponse(
         status="healthy",
         agent_ready=True,
@@ -127,12 +494,25 @@ async def health_check():
 
 
 @app.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key")
+):
     """
     Envía un mensaje al agente y recibe una respuesta.
     
     El agente mantiene memoria de la conversación usando el thread_id,
     lo que permite referencias a mensajes anteriores y continuidad en la conversación.
+    
+    Con la cabecera Idempotency-Key los reintentos de una misma solicitud no vuelven a
+    ejecutar el agente: esperan a la ejecución en curso o reciben la respuesta guardada.
+    
+    Si el cliente se desconecta o vence el plazo (timeout o TURN_TIMEOUT) el turno se
+    cancela, incluida la llamada al modelo en curso, y el hilo vuelve al estado anterior.
+    Con Idempotency-Key la desconexión no cancela el turno, para que el reintento reciba
+    su resultado.
     """
     if agent is None:
         raise HTTPException(
@@ -140,17 +520,72 @@ async def chat_with_agent(request: ChatRequest):
             detail="El agente no está disponible"
         )
     
-    try:
-        # Procesar el mensaje con el agente
-        result = agent.chat(message=request.message, thread_id=request.thread_id)
+    async def run_chat() -> ChatResponse:
+        # Procesar el mensaje con el agente como turno drenable
+        turn = drain.run(agent.achat(
+            message=request.message,
+            thread_id=request.thread_id,
+            max_prompt_tokens=request.max_prompt_tokens,
+            timeout=request.timeout,
+            max_steps=request.max_steps,
+            max_tool_calls=request.max_tool_calls,
+            max_seconds=request.max_seconds,
+            max_tokens=request.max_tokens
+        ))
+        result = await (turn if idempotency_key else cancel_on_disconnect(http_request, turn))
         
         return ChatResponse(
             response=result["response"],
             thread_id=result["thread_id"],
             message_count=result["message_count"],
-            tools_used=result["tools_used"]
+            tools_used=result["tools_used"],
+            token_usage=result["token_usage"],
+            thread_token_usage=result["thread_token_usage"],
+            budget_exhausted=result["budget_exhausted"]
         )
+    
+    try:
+        if not idempotency_key:
+            return await run_chat()
         
+        result, replayed = await idempotency_store.run(
+            idempotency_key, fingerprint(request.model_dump()), run_chat
+        )
+        if replayed:
+            response.headers["Idempotent-Replayed"] = "true"
+        return result
+        
+    except IdempotencyKeyReused as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=str(e)
+        )
+    except IdempotencyStoreFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except ClientDisconnected:
+        # Nadie recibirá esta respuesta; solo queda en los registros de acceso
+        agent.cancellations.record_disconnect("http")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except ShuttingDown as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except TokenBudgetExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except TurnDeadlineExceeded as e:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -158,6 +593,331 @@ async def chat_with_agent(request: ChatRequest):
         )
 
 
+@app.websocket("/ws/chat/{thread_id}")
+async def websocket_chat(websocket: WebSocket, thread_id: str):
+    """
+    Sesión de chat persistente sobre WebSocket para un hilo de conversación.
+    
+    Mensajes del cliente (JSON):
+    - {"type": "message", "message": "...", "max_prompt_tokens": 2000, "timeout": 30, "max_steps": 5}
+      (también max_tool_calls, max_seconds y max_tokens, como en /chat)
+    - {"type": "ping"} / {"type": "pong"}
+    
+    Mensajes del servidor: los eventos de MemoryAgent.astream_chat ("token",
+    "tool_call", "tool_result", "done"), "error", "ping" y "pong".
+    
+    Si la sesión se cierra con un turno en curso, el turno se cancela y se revierte.
+    """
+    global active_websockets
+    
+    await websocket.accept()
+    if agent is None:
+        await websocket.close(code=1011, reason="El agente no está disponible")
+        return
+    if drain.draining:
+        await websocket.close(code=1012, reason="El servidor se está reiniciando")
+        return
+    if active_websockets >= WS_MAX_CONNECTIONS:
+        await websocket.close(code=1013, reason="Demasiadas conexiones, intenta más tarde")
+        return
+    
+    active_websockets += 1
+    # Colas acotadas: si el cliente lee despacio, la generación espera (backpressure)
+    outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE_SIZE)
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=WS_MAX_PENDING_MESSAGES)
+    sender = asyncio.create_task(_websocket_sender(websocket, outbox))
+    worker = asyncio.create_task(_websocket_worker(thread_id, inbox, outbox))
+    missed_pings = 0
+    
+    try:
+        while True:
+            try:
+                frame = await asyncio.wait_for(websocket.receive(), WS_PING_INTERVAL)
+            except asyncio.TimeoutError:
+                # Keepalive: se cierra la sesión si el cliente deja de responder
+                if missed_pings >= WS_MAX_MISSED_PINGS:
+                    await websocket.close(code=1001, reason="Sin respuesta al ping")
+                    break
+                missed_pings += 1
+                await outbox.put({"type": "ping"})
+                continue
+            
+            if frame["type"] == "websocket.disconnect":
+                break
+            missed_pings = 0
+            raw = frame.get("text")
+            if raw is None:
+                # receive_text() fallaría con KeyError y cerraría la sesión sin código
+                await outbox.put({"type": "error", "status": 400, "detail": "Solo se admiten mensajes de texto (JSON)"})
+                continue
+            try:
+                data = json.loads(raw)
+                kind = data.get("type")
+            except (ValueError, AttributeError):
+                await outbox.put({"type": "error", "status": 400, "detail": "Mensaje JSON inválido"})
+                continue
+            
+            if kind == "ping":
+                await outbox.put({"type": "pong"})
+            elif kind == "pong":
+                continue
+            elif kind == "message":
+                if not isinstance(data.get("message"), str) or not data["message"]:
+                    await outbox.put({"type": "error", "status": 422, "detail": "El campo 'message' es obligatorio"})
+                elif inbox.full():
+                    await outbox.put({"type": "error", "status": 429, "detail": "Demasiados mensajes pendientes"})
+                else:
+                    inbox.put_nowait(data)
+            else:
+                await outbox.put({"type": "error", "status": 400, "detail": f"Tipo de mensaje desconocido: {kind}"})
+    
+    except WebSocketDisconnect:
+        pass
+    finally:
+        active_websockets -= 1
+        worker.cancel()
+        sender.cancel()
+
+
+async def _websocket_worker(thread_id: str, inbox: asyncio.Queue, outbox: asyncio.Queue) -> None:
+    """Procesa en orden los mensajes de una sesión y encola los eventos generados."""
+    async def forward(data: Dict[str, Any]) -> None:
+        async for event in agent.astream_chat(
+            message=data["message"],
+            thread_id=thread_id,
+            max_prompt_tokens=data.get("max_prompt_tokens"),
+            timeout=data.get("timeout"),
+            max_steps=data.get("max_steps"),
+            max_tool_calls=data.get("max_tool_calls"),
+            max_seconds=data.get("max_seconds"),
+            max_tokens=data.get("max_tokens")
+        ):
+            await outbox.put(event)
+    
+    while True:
+        data = await inbox.get()
+        try:
+            await drain.run(forward(data))
+        except asyncio.CancelledError:
+            # La sesión se cerró con el turno en curso
+            agent.cancellations.record_disconnect("websocket")
+            raise
+        except ShuttingDown as e:
+            await outbox.put({"type": "error", "status": 503, "detail": str(e)})
+        except TokenBudgetExceeded as e:
+            await outbox.put({"type": "error", "status": 413, "detail": str(e)})
+        except TurnDeadlineExceeded as e:
+            await outbox.put({"type": "error", "status": 504, "detail": str(e)})
+        except ValueError as e:
+            # Presupuestos del turno inválidos (en /chat los valida el modelo de la solicitud)
+            await outbox.put({"type": "error", "status": 400, "detail": str(e)})
+        except Exception as e:
+            await outbox.put({"type": "error", "status": 500, "detail": f"Error al procesar el mensaje: {str(e)}"})
+
+
+async def _websocket_sender(websocket: WebSocket, outbox: asyncio.Queue) -> None:
+    """Envía al cliente los eventos encolados."""
+    try:
+        while True:
+            await websocket.send_json(await outbox.get())
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+
+
+@app.post("/jobs", response_model=JobResponse, status_code=status.HTTP_202_ACCEPTED)
+async def create_job(request: ChatRequest):
+    """
+    Encola un turno de chat y devuelve el trabajo de inmediato.
+    
+    Útil para turnos largos que superarían el tiempo de espera de una solicitud HTTP.
+    El resultado se consulta con GET /jobs/{job_id} o GET /jobs/{job_id}/events.
+    """
+    if jobs is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="La cola de trabajos no está disponible"
+        )
+    
+    job_id = await jobs.submit(request.model_dump())
+    return JobResponse(**await jobs.get(job_id))
+
+
+@app.get("/jobs/{job_id}", response_model=JobResponse)
+async def get_job(job_id: str):
+    """Consulta el estado, la salida parcial y el resultado de un trabajo."""
+    job = await jobs.get(job_id) if jobs is not None else None
+    if job is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo {job_id} no encontrado"
+        )
+    return JobResponse(**job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+    Suscripción Server-Sent Events a un trabajo.
+    
+    Emite el estado actual y luego los tokens y eventos de herramientas a medida que se
+    generan, terminando con un evento "done" o "error".
+    """
+    if jobs is None or await jobs.get(job_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Trabajo {job_id} no encontrado"
+        )
+    
+    async def events():
+        async for event in jobs.subscribe(job_id):
+            yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
+def _graph_run_config(thread_id: str) -> Dict[str, Any]:
+    """Configuración de una ejecución de grafo; turn_id identifica sus checkpoints."""
+    return {"configurable": {"thread_id": thread_id, "turn_id": uuid.uuid4().hex}}
+
+
+def _require_graph(name: str) -> None:
+    """Comprueba que el grafo esté declarado en langgraph.json y no sea el del agente."""
+    if name == AGENT_GRAPH:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"El grafo {AGENT_GRAPH} se usa mediante /chat, /ws/chat/{{thread_id}} o /jobs"
+        )
+    if graphs is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Los grafos no están disponibles"
+        )
+    if name not in graphs.names:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Grafo {name} no encontrado"
+        )
+
+
+@app.get("/graphs")
+async def list_graphs():
+    """
+    Lista los grafos de langgraph.json.
+    
+    Indica cuáles están cargados en memoria, sus ejecuciones en curso, cuántas veces se
+    compilaron y cuánto tardó la última compilación.
+    """
+    if graphs is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Los grafos no están disponibles"
+        )
+    return {"idle_ttl": graphs.idle_ttl, "graphs": graphs.status()}
+
+
+@app.post("/graphs/{name}/invoke", response_model=GraphRunResponse)
+async def invoke_graph(name: str, request: GraphRunRequest, http_request: Request):
+    """
+    Ejecuta uno de los grafos de langgraph.json y devuelve su estado final.
+    
+    El grafo se compila en la primera solicitud y queda en caché hasta que pasa
+    GRAPH_IDLE_TTL segundos sin uso. La ejecución se cancela si el cliente se desconecta
+    o vence el plazo (timeout o TURN_TIMEOUT).
+    """
+    _require_graph(name)
+    thread_id = request.thread_id or uuid.uuid4().hex
+    config = _graph_run_config(thread_id)
+    timeout = request.timeout if request.timeout is not None else TURN_TIMEOUT
+    
+    async def run():
+        async with graphs.use(name) as graph:
+            return await guarded_turn(
+                graph, config, graph.ainvoke(request.input, config), timeout, agent.cancellations
+            )
+    
+    try:
+        output = await cancel_on_disconnect(http_request, drain.run(run()))
+    except ClientDisconnected:
+        agent.cancellations.record_disconnect("http")
+        return Response(status_code=CLIENT_CLOSED_REQUEST)
+    except ShuttingDown as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail=str(e),
+            headers={"Retry-After": "5"}
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=_error_status(e),
+            detail=f"Error al ejecutar el grafo {name}: {str(e)}"
+        )
+    
+    return GraphRunResponse(graph=name, thread_id=thread_id, output=jsonable_encoder(output))
+
+
+@app.post("/graphs/{name}/stream")
+async def stream_graph(name: str, request: GraphRunRequest):
+    """
+    Ejecuta uno de los grafos de langgraph.json como Server-Sent Events.
+    
+    Emite un evento "update" con la salida de cada nodo a medida que termina, un evento
+    "custom" con lo que un nodo emite durante su ejecución (get_stream_writer) y un
+    evento final "done" o "error". Si el cliente se desconecta o vence el plazo la
+    ejecución se cancela.
+    """
+    _require_graph(name)
+    thread_id = request.thread_id or uuid.uuid4().hex
+    config = _graph_run_config(thread_id)
+    timeout = request.timeout if request.timeout is not None else TURN_TIMEOUT
+    queue: asyncio.Queue = asyncio.Queue()
+    
+    async def produce():
+        async with graphs.use(name) as graph:
+            stream = guarded_stream(
+                graph, config, graph.astream(request.input, config, stream_mode=["updates", "custom"]),
+                timeout, agent.cancellations
+            )
+            async for mode, chunk in stream:
+                if mode == "custom":
+                    await queue.put({"type": "custom", "data": jsonable_encoder(chunk)})
+                    continue
+                for node, update in chunk.items():
+                    await queue.put({"type": "update", "node": node, "data": jsonable_encoder(update)})
+    
+    async def run():
+        try:
+            await drain.run(produce())
+            await queue.put({"type": "done", "graph": name, "thread_id": thread_id})
+        except ShuttingDown as e:
+            await queue.put({"type": "error", "status": status.HTTP_503_SERVICE_UNAVAILABLE, "detail": str(e)})
+        except Exception as e:
+            await queue.put({"type": "error", "status": _error_status(e), "detail": str(e)})
+    
+    async def events():
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await queue.get()
+                yield f"event: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False, default=str)}\n\n"
+                if event["type"] in ("done", "error"):
+                    return
+        finally:
+            # El cliente se desconectó: detener la ejecución del grafo
+            if not task.done():
+                agent.cancellations.record_disconnect("sse")
+                task.cancel()
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
+    )
+
+
 @app.get("/conversation/{thread_id}", response_model=ConversationHistoryResponse)
 async def get_conversation_history(thread_id: str):
     """
@@ -174,10 +934,17 @@ async def get_conversation_history(thread_id: str):
     try:
         history = agent.get_conversation_history(thread_id)
         
+        # Totales del hilo a partir del consumo registrado en cada respuesta
+        token_usage = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        for msg in history:
+            for key, value in msg.get("token_usage", {}).items():
+                token_usage[key] += value
+        
         return ConversationHistoryResponse(
             thread_id=thread_id,
             messages=history,
-            message_count=len(history)
+            message_count=len(history),
+            token_usage=token_usage
         )
         
     except Exception as e:
@@ -187,6 +954,61 @@ async def get_conversation_history(thread_id: str):
         )
 
 
+@app.get("/conversation/{thread_id}/checkpoints")
+async def list_conversation_checkpoints(thread_id: str):
+    """
+    Lista los checkpoints de una conversación, del más reciente al más antiguo.
+    
+    Cada checkpoint indica cuántos mensajes tenía la conversación en ese punto y
+    puede usarse como origen de POST /conversation/{thread_id}/fork.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    checkpoints = agent.list_checkpoints(thread_id)
+    if not checkpoints:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Conversación {thread_id} no encontrada"
+        )
+    return {"thread_id": thread_id, "checkpoints": checkpoints}
+
+
+@app.post("/conversation/{thread_id}/fork", response_model=ForkResponse, status_code=status.HTTP_201_CREATED)
+async def fork_conversation(thread_id: str, request: ForkRequest):
+    """
+    Bifurca una conversación desde cualquiera de sus checkpoints.
+    
+    El hilo nuevo comparte el historial del original sin copiarlo (copy-on-write):
+    bifurcar no vuelve a ejecutar ningún turno y no depende de la longitud de la conversación.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    try:
+        return ForkResponse(**agent.fork_conversation(
+            thread_id,
+            new_thread_id=request.new_thread_id,
+            checkpoint_id=request.checkpoint_id
+        ))
+    except KeyError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=e.args[0]
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+
 @app.delete("/conversation/{thread_id}")
 async def clear_conversation(thread_id: str):
     """
@@ -202,20 +1024,18 @@ async def clear_conversation(thread_id: str):
     
     try:
         success = agent.clear_conversation(thread_id)
-        
-        if success:
-            return {"message": f"Conversación {thread_id} limpiada exitosamente"}
-        else:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="No se pudo limpiar la conversación"
-            )
-            
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Error al limpiar la conversación: {str(e)}"
         )
+    
+    if not success:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Conversación {thread_id} no encontrada"
+        )
+    return {"message": f"Conversación {thread_id} limpiada exitosamente"}
 
 
 @app.get("/tools")
@@ -249,6 +1069,257 @@ async def get_available_tools():
     return {"tools": tools_info}
 
 
+@app.get("/admin/threads", dependencies=[Depends(verify_admin_token)])
+async def list_threads(
+    offset: int = Query(default=0, ge=0, description="Conversaciones a omitir"),
+    limit: int = Query(default=50, ge=1, le=1000, description="Tamaño de la página"),
+    sort: str = Query(default="last_active", description=f"Campo de ordenamiento: {', '.join(THREAD_SORT_FIELDS)}"),
+    order: str = Query(default="desc", description="Orden: asc o desc")
+):
+    """
+    Lista paginada de conversaciones con su fecha de creación, última actividad,
+    número de mensajes y tamaño en bytes.
+    
+    Se responde desde el índice de hilos, sin leer los mensajes.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    if sort not in THREAD_SORT_FIELDS or order not in ("asc", "desc"):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"sort debe ser uno de {list(THREAD_SORT_FIELDS)} y order asc o desc"
+        )
+    
+    page = agent.list_thread_summaries(offset, limit, sort, descending=order == "desc")
+    return {"offset": offset, "limit": limit, **page}
+
+
+@app.get("/admin/threads/stats", dependencies=[Depends(verify_admin_token)])
+async def thread_stats():
+    """Totales de conversaciones, mensajes y bytes, inactividad y conversaciones más grandes."""
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    return agent.thread_stats()
+
+
+@app.post("/admin/threads/expire", response_model=ThreadExpireResponse, dependencies=[Depends(verify_admin_token)])
+async def expire_threads(request: ThreadExpireRequest):
+    """
+    Elimina en bloque las conversaciones que cumplen todos los criterios indicados,
+    por ejemplo las que llevan 7 días sin actividad (idle_seconds=604800).
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    try:
+        deleted = agent.expire_threads(**request.model_dump())
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    return ThreadExpireResponse(deleted=len(deleted), thread_ids=deleted)
+
+
+@app.get("/admin/cancellations", dependencies=[Depends(verify_admin_token)])
+async def cancellation_stats():
+    """
+    Turnos cancelados y gasto del modelo descartado.
+    
+    Incluye los turnos cancelados y vencidos, las desconexiones por transporte (http,
+    sse, websocket), las llamadas al modelo completadas cuyo resultado se descartó con
+    sus tokens, y las llamadas interrumpidas con sus tokens de entrada estimados.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    return agent.cancellations.as_dict()
+
+
+_MEMORY_DEPENDENCIES = [Depends(verify_admin_token), Depends(require_memory_diagnostics)]
+
+
+@app.get("/admin/memory", dependencies=_MEMORY_DEPENDENCIES)
+async def memory_overview():
+    """
+    Resumen de memoria del proceso: RSS, estado de tracemalloc, tamaño del historial de
+    conversaciones según el índice de hilos y tamaño de cada caché.
+    """
+    caches = {
+        "idempotency": idempotency_store,
+        "graphs": graphs,
+        "cassette": getattr(agent.llm, "_cassette", None),
+    }
+    stats = agent.thread_stats()
+    return {
+        "process": process_memory(),
+        "tracemalloc": memory_diagnostics.status(),
+        "conversations": {key: stats[key] for key in ("threads", "messages", "bytes")},
+        "caches": await run_in_threadpool(cache_sizes, caches),
+    }
+
+
+@app.post("/admin/memory/tracemalloc/start", dependencies=_MEMORY_DEPENDENCIES)
+async def start_tracemalloc(
+    frames: int = Query(default=1, ge=1, le=25, description="Marcos guardados por asignación"),
+    duration: float = Query(default=60, gt=0, description="Segundos hasta la detención automática")
+):
+    """
+    Inicia una sesión de tracemalloc y toma la instantánea de referencia.
+    
+    La sesión se detiene sola tras duration segundos (como máximo MEMORY_TRACE_MAX_SECONDS),
+    de modo que olvidar detenerla no deja la sobrecarga activa en producción.
+    """
+    return await run_in_threadpool(memory_diagnostics.start, frames, duration)
+
+
+@app.post("/admin/memory/tracemalloc/stop", dependencies=_MEMORY_DEPENDENCIES)
+async def stop_tracemalloc():
+    """Detiene la sesión de tracemalloc y libera sus instantáneas."""
+    return memory_diagnostics.stop()
+
+
+@app.get("/admin/memory/tracemalloc/diff", dependencies=_MEMORY_DEPENDENCIES)
+async def tracemalloc_diff(
+    top: int = Query(default=20, ge=1, le=200, description="Grupos a reportar"),
+    group_by: str = Query(default="module", description="module o package"),
+    reset: bool = Query(default=False, description="Usar la instantánea actual como nueva referencia")
+):
+    """Crecimiento de la memoria desde el inicio de la sesión, agrupado por módulo o paquete."""
+    try:
+        return await run_in_threadpool(memory_diagnostics.diff, top, group_by, reset)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
+    except RuntimeError as e:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=str(e)
+        )
+
+
+@app.get("/admin/memory/threads", dependencies=_MEMORY_DEPENDENCIES)
+async def memory_heaviest_threads(
+    top: int = Query(default=10, ge=1, le=100, description="Número de hilos a reportar")
+):
+    """Hilos con mayor tamaño profundo del estado guardado."""
+    return {"threads": await run_in_threadpool(heaviest_threads, agent.memory, top)}
+
+
+@app.get("/admin/memory/threads/{thread_id}", dependencies=_MEMORY_DEPENDENCIES)
+async def memory_thread_footprint(thread_id: str):
+    """Tamaño profundo aproximado del estado guardado de un hilo."""
+    footprint = await run_in_threadpool(thread_footprint, agent.memory, thread_id)
+    if footprint is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Conversación {thread_id} no encontrada"
+        )
+    return footprint
+
+
+@app.get("/admin/export", dependencies=[Depends(verify_admin_token)])
+async def export_conversations(
+    format: str = Query(default="ndjson.gz", description="Formato: ndjson.gz o msgpack"),
+    thread_prefix: Optional[str] = Query(default=None, description="Exportar solo hilos con este prefijo"),
+    thread_id: Optional[List[str]] = Query(default=None, description="Hilos específicos a exportar")
+):
+    """
+    Exporta conversaciones completas como un flujo binario.
+    
+    Incluye todos los campos de cada mensaje (ids, tool_call_id, llamadas a herramientas)
+    y los metadatos del último checkpoint de cada hilo. La respuesta se genera de forma
+    incremental, sin cargar todas las conversaciones en memoria.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    if format not in FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Formato no soportado. Usa uno de {list(FORMATS)}"
+        )
+    
+    records = agent.export_conversations(thread_ids=thread_id, thread_prefix=thread_prefix)
+    return StreamingResponse(
+        encode_records(records, format),
+        media_type=FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="conversaciones.{format}"'}
+    )
+
+
+@app.post("/admin/import", response_model=ImportResponse, dependencies=[Depends(verify_admin_token)])
+async def import_conversations(
+    request: Request,
+    format: str = Query(default="ndjson.gz", description="Formato: ndjson.gz o msgpack"),
+    batch_size: int = Query(default=500, ge=1, description="Mensajes escritos por operación")
+):
+    """
+    Importa conversaciones desde un flujo generado por /admin/export.
+    
+    El cuerpo se procesa a medida que llega y los mensajes se escriben en lotes.
+    Reimportar un mismo archivo no duplica mensajes porque se conservan sus ids.
+    Ante un registro inválido responde 400: los hilos completos anteriores quedan
+    importados, el hilo en curso se descarta y basta con reintentar la importación.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="El agente no está disponible"
+        )
+    
+    try:
+        decoder = RecordDecoder(format)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Archivo de importación inválido: {str(e)}"
+        )
+    importer = ConversationImporter(agent, batch_size)
+    
+    try:
+        async for chunk in request.stream():
+            records = decoder.feed(chunk)
+            if records:
+                await run_in_threadpool(_add_records, importer, records)
+        
+        await run_in_threadpool(_add_records, importer, decoder.close())
+        return ImportResponse(**await run_in_threadpool(importer.close))
+        
+    except ValueError as e:
+        await run_in_threadpool(importer.abort)
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=(
+                f"Archivo de importación inválido: {str(e)}. Hilos importados antes del "
+                f"error: {importer.threads}; reintentar la importación es seguro"
+            )
+        )
+
+
+def _add_records(importer: ConversationImporter, records: List[Dict[str, Any]]) -> None:
+    """Agrega un bloque de registros al importador (se ejecuta fuera del event loop)."""
+    for record in records:
+        importer.add(record)
+
+
 # Manejo de errores globales
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
@@ -0,0 +1,131 @@
+"""
+Benchmark de contención del checkpointer en memoria.
+
+Cada hilo de ejecución simula una conversación propia: en cada turno lee el último
+checkpoint, guarda uno nuevo con dos mensajes más y registra una escritura pendiente,
+igual que LangGraph en cada super-step. Opcionalmente espera entre turnos (fuera del
+lock) para simular la latencia del LLM.
+
+Compara CompactMemorySaver (un único lock) con ShardedMemorySaver (un lock por
+partición) y reporta:
+- Turnos por segundo del conjunto de hilos
+- Latencia p50 y p99 de las operaciones de checkpoint de un turno
+- Adquisiciones del lock que tuvieron que esperar y tiempo total de espera
+
+Con el GIL, el trabajo dentro del lock es CPU y el throughput total está acotado por un
+núcleo; la diferencia se ve sobre todo en la espera por el lock y en la latencia de
+cola. En un intérprete sin GIL las particiones también escalan el throughput.
+
+Uso:
+    python benchmarks/bench_checkpointer.py
+    python benchmarks/bench_checkpointer.py --particiones 1 --particiones 32 --hilos 64 --pausa 0.001
+"""
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+# Agregar el directorio del proyecto al path para las importaciones
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from agente.checkpointer import CompactMemorySaver, ShardedMemorySaver
+
+
+def make_saver(shards: int):
+    """Checkpointer con el número de particiones indicado (1 = un único lock)."""
+    return ShardedMemorySaver(shards=shards) if shards > 1 else CompactMemorySaver()
+
+
+def run_conversation(saver, thread_id: str, turns: int, pause: float, latencies: list) -> None:
+    """Simula los turnos de una conversación contra el checkpointer."""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    messages = []
+    for i in range(turns):
+        start = time.perf_counter()
+        saver.get_tuple(config)
+        messages = messages + [
+            HumanMessage(content=f"Pregunta {i}", id=f"{thread_id}-h{i}"),
+            AIMessage(content=f"Respuesta {i}", id=f"{thread_id}-a{i}"),
+        ]
+        checkpoint = empty_checkpoint()
+        checkpoint["channel_values"] = {"messages": messages}
+        config = saver.put(config, checkpoint, {"source": "loop", "step": i}, {})
+        saver.put_writes(config, [("messages", messages[-1])], "assistant")
+        latencies.append(time.perf_counter() - start)
+        if pause:
+            time.sleep(pause)
+
+
+def percentile(values: list, p: float) -> float:
+    """Percentil p (0-100) por el método del rango más cercano."""
+    ordered = sorted(values)
+    return ordered[max(0, min(len(ordered) - 1, int(len(ordered) * p / 100)))]
+
+
+def measure(shards: int, threads: int, turns: int, pause: float) -> dict:
+    """
+    Ejecuta una medición.
+
+    Args:
+        shards: Particiones del checkpointer.
+        threads: Conversaciones concurrentes (una por hilo de ejecución).
+        turns: Turnos por conversación.
+        pause: Espera entre turnos fuera del lock (segundos).
+
+    Returns:
+        Métricas de la medición.
+    """
+    saver = make_saver(shards)
+    latencies = []
+    workers = [
+        threading.Thread(target=run_conversation, args=(saver, f"hilo_{i}", turns, pause, latencies))
+        for i in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+
+    stats = saver.stats()
+    return {
+        "turns_per_second": threads * turns / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "contended": stats["lock_contended"],
+        "wait_ms": stats["lock_wait_seconds"] * 1000,
+    }
+
+
+def main():
+    """Función principal del benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark de contención del checkpointer")
+    parser.add_argument("--particiones", type=int, action="append",
+                        help="Particiones a comparar (repetible, por defecto 1 y 16)")
+    parser.add_argument("--hilos", type=int, action="append",
+                        help="Conversaciones concurrentes (repetible, por defecto 1, 4, 16 y 64)")
+    parser.add_argument("--turnos", type=int, default=40, help="Turnos por conversación")
+    parser.add_argument("--pausa", type=float, default=0.0, help="Espera entre turnos fuera del lock (s)")
+    args = parser.parse_args()
+
+    print("📏 Benchmark de contención del checkpointer")
+    print(f"   {args.turnos} turnos por conversación, pausa {args.pausa * 1000:.1f} ms")
+    print("=" * 78)
+    print(f"{'Particiones':>11}{'Hilos':>7}{'Turnos/s':>11}{'p50 ms':>9}{'p99 ms':>9}"
+          f"{'Esperas':>10}{'Espera total ms':>18}")
+
+    for shards in args.particiones or [1, 16]:
+        for threads in args.hilos or [1, 4, 16, 64]:
+            r = measure(shards, threads, args.turnos, args.pausa)
+            print(f"{shards:>11}{threads:>7}{r['turns_per_second']:>11.0f}{r['p50_ms']:>9.2f}"
+                  f"{r['p99_ms']:>9.2f}{r['contended']:>10}{r['wait_ms']:>18.1f}")
+
+
+if __name__ == "__main__":
+    main()
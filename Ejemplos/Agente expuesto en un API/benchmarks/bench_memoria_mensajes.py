@@ -0,0 +1,142 @@
+"""
+Benchmark de memoria del historial de conversaciones.
+
+Compara los bytes por mensaje almacenado de MemorySaver frente a CompactMemorySaver
+ejecutando el mismo grafo ReAct (asistente ↔ herramientas) sin llamar a ningún LLM:
+el nodo del asistente produce mensajes con los mismos metadatos que devuelve Gemini.
+
+Uso:
+    python benchmarks/bench_memoria_mensajes.py [--hilos 100] [--turnos 10]
+"""
+
+import argparse
+import gc
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Agregar el directorio del proyecto al path para las importaciones
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph, START, MessagesState
+from langgraph.prebuilt import tools_condition
+
+from agente.checkpointer import CompactMemorySaver
+
+
+def assistant(state: MessagesState):
+    """Simula la respuesta del modelo: primero pide una herramienta y luego responde."""
+    last = state["messages"][-1]
+    metadata = {
+        "response_metadata": {
+            "finish_reason": "STOP",
+            "model_name": "gemini-1.5-pro",
+            "safety_ratings": [
+                {"category": "HARM_CATEGORY_HARASSMENT", "probability": "NEGLIGIBLE", "blocked": False},
+                {"category": "HARM_CATEGORY_HATE_SPEECH", "probability": "NEGLIGIBLE", "blocked": False},
+            ],
+        },
+        "usage_metadata": {"input_tokens": 120, "output_tokens": 18, "total_tokens": 138},
+    }
+    if last.type == "human":
+        call_id = f"call_{len(state['messages'])}"
+        return {"messages": [AIMessage(
+            content="",
+            tool_calls=[{"name": "multiply", "args": {"a": 6, "b": 7}, "id": call_id}],
+            **metadata
+        )]}
+    return {"messages": [AIMessage(content="El resultado de multiplicar 6 por 7 es 42.", **metadata)]}
+
+
+def tools(state: MessagesState):
+    """Simula la ejecución de la herramienta solicitada."""
+    call = state["messages"][-1].tool_calls[0]
+    return {"messages": [ToolMessage(content="42", name=call["name"], tool_call_id=call["id"])]}
+
+
+def build_graph(checkpointer):
+    """Construye el mismo grafo ReAct que usa MemoryAgent."""
+    builder = StateGraph(MessagesState)
+    builder.add_node("assistant", assistant)
+    builder.add_node("tools", tools)
+    builder.add_edge(START, "assistant")
+    builder.add_conditional_edges("assistant", tools_condition)
+    builder.add_edge("tools", "assistant")
+    return builder.compile(checkpointer=checkpointer)
+
+
+def run(checkpointer_cls, threads: int, turns: int) -> dict:
+    """
+    Ejecuta la carga con un checkpointer y mide la memoria retenida.
+
+    Args:
+        checkpointer_cls: Clase del checkpointer a evaluar.
+        threads: Número de hilos de conversación.
+        turns: Turnos por hilo.
+
+    Returns:
+        Métricas de memoria y tiempo.
+    """
+    gc.collect()
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+
+    checkpointer = checkpointer_cls()
+    graph = build_graph(checkpointer)
+    start = time.perf_counter()
+    for t in range(threads):
+        config = {"configurable": {"thread_id": f"hilo_{t}"}}
+        for turn in range(turns):
+            graph.invoke({"messages": [HumanMessage(content=f"Multiplica 6 por 7 (turno {turn})")]}, config)
+    elapsed = time.perf_counter() - start
+
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+
+    # Medir la lectura del historial (cuando se construye un prompt)
+    config = {"configurable": {"thread_id": "hilo_0"}}
+    start = time.perf_counter()
+    messages = graph.get_state(config).values["messages"]
+    read_ms = (time.perf_counter() - start) * 1000
+
+    stored_messages = threads * len(messages)
+    return {
+        "retained_bytes": retained,
+        "bytes_per_message": retained / stored_messages,
+        "messages": stored_messages,
+        "write_seconds": elapsed,
+        "read_ms": read_ms,
+    }
+
+
+def main():
+    """Función principal del benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark de memoria del historial")
+    parser.add_argument("--hilos", type=int, default=100, help="Número de hilos")
+    parser.add_argument("--turnos", type=int, default=10, help="Turnos por hilo")
+    args = parser.parse_args()
+
+    print("📏 Benchmark de memoria del historial de conversaciones")
+    print(f"   {args.hilos} hilos × {args.turnos} turnos (4 mensajes por turno)")
+    print("=" * 60)
+
+    results = {}
+    for name, cls in (("MemorySaver", MemorySaver), ("CompactMemorySaver", CompactMemorySaver)):
+        results[name] = result = run(cls, args.hilos, args.turnos)
+        print(f"\n🧪 {name}")
+        print(f"   Memoria retenida:    {result['retained_bytes'] / 1024 / 1024:.1f} MB")
+        print(f"   Bytes por mensaje:   {result['bytes_per_message']:.0f}")
+        print(f"   Tiempo de escritura: {result['write_seconds']:.2f} s")
+        print(f"   Lectura de un hilo:  {result['read_ms']:.2f} ms")
+
+    ratio = results["MemorySaver"]["bytes_per_message"] / results["CompactMemorySaver"]["bytes_per_message"]
+    print("\n" + "=" * 60)
+    print(f"✅ CompactMemorySaver usa {ratio:.1f}x menos bytes por mensaje almacenado")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Benchmark de los siete patrones de LangGraph de los notebooks.
+
+Ejecuta cada patrón contra FakeChatModel (sin red ni API key) y reporta:
+- Overhead: mediana del tiempo por ejecución con latencia de LLM 0 (costo propio del framework)
+- Super-steps: pasos del grafo por ejecución
+- Llamadas y tiempo total de LLM frente al tiempo real con la latencia configurada;
+  la eficiencia paralela es tiempo de LLM / tiempo real (> 1 indica paralelismo)
+- Memoria: pico de asignaciones por ejecución (tracemalloc)
+
+Las métricas se pueden guardar como línea base y comparar en ejecuciones posteriores.
+
+Uso:
+    python benchmarks/bench_workflows.py [--latencia 0.05] [--repeticiones 5]
+    python benchmarks/bench_workflows.py --guardar benchmarks/baseline_workflows.json
+    python benchmarks/bench_workflows.py --comparar benchmarks/baseline_workflows.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+# Agregar el directorio del proyecto al path para las importaciones
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from langchain_core.messages import HumanMessage
+
+from agente.memory_agent import MemoryAgent
+from workflows.fake_llm import FakeChatModel
+from workflows.extraction import build_structured_graph
+from workflows.chain import build_chain_graph
+from workflows.parallel import build_parallel_graph
+from workflows.router import build_router_graph
+from workflows.orchestrator import build_orchestrator_graph
+from workflows.evaluator import build_evaluator_graph
+
+
+# Patrón -> (fábrica del grafo, entradas de la ejecución i). Las entradas cambian en
+# cada ejecución para que las cachés de planes, pasos y calificaciones no intervengan.
+PATTERNS = {
+    "1_estructurado": (
+        build_structured_graph,
+        lambda i: {"question": f"¿Cómo se relaciona el calcio con el colesterol? ({i})"},
+    ),
+    "2_encadenamiento": (
+        build_chain_graph,
+        lambda i: {"topic": f"aviones {i}"},
+    ),
+    "3_paralelizacion": (
+        build_parallel_graph,
+        lambda i: {"topic": f"gatos {i}"},
+    ),
+    "4_enrutamiento": (
+        build_router_graph,
+        lambda i: {"input": f"Escribe un chiste sobre perros ({i})"},
+    ),
+    "5_orquestador": (
+        build_orchestrator_graph,
+        lambda i: {"topic": f"Leyes de escalado de los LLM ({i})"},
+    ),
+    "6_evaluador": (
+        build_evaluator_graph,
+        lambda i: {"topic": f"gatos {i}"},
+    ),
+    "7_agente_memoria": (
+        lambda llm: MemoryAgent(llm=llm).graph,
+        lambda i: {"messages": [HumanMessage(content=f"Multiplica {i} por 7")]},
+    ),
+}
+
+# Métricas comparadas con la línea base (un valor mayor es una regresión)
+COMPARED = ("overhead_ms", "peak_kb", "super_steps", "llm_calls")
+
+# Margen absoluto del overhead para no confundir el ruido de medición con una regresión
+OVERHEAD_NOISE_MS = 1.0
+
+
+def _config(i: int) -> dict:
+    return {"configurable": {"thread_id": f"bench_{i}"}}
+
+
+async def count_super_steps(graph, inputs, config) -> int:
+    """Cuenta los super-steps de una ejecución con el stream de depuración."""
+    steps = set()
+    async for event in graph.astream(inputs, config, stream_mode="debug"):
+        if event.get("type") == "task":
+            steps.add(event["step"])
+    return len(steps)
+
+
+async def run_pattern(name: str, latency: float, repetitions: int) -> dict:
+    """
+    Mide un patrón.
+
+    Args:
+        name: Nombre del patrón en PATTERNS.
+        latency: Latencia simulada de cada llamada al LLM (segundos).
+        repetitions: Ejecuciones por medición.
+
+    Returns:
+        Métricas del patrón.
+    """
+    factory, make_inputs = PATTERNS[name]
+    llm = FakeChatModel(latency=0.0)
+    graph = factory(llm)
+    run = iter(range(10 ** 9))
+
+    async def invoke():
+        i = next(run)
+        return await graph.ainvoke(make_inputs(i), _config(i))
+
+    # Calentamiento y conteo de pasos
+    await invoke()
+    i = next(run)
+    super_steps = await count_super_steps(graph, make_inputs(i), _config(i))
+
+    # Overhead del framework (LLM instantáneo), mediana por ejecución
+    timings = []
+    for _ in range(repetitions):
+        start = time.perf_counter()
+        await invoke()
+        timings.append(time.perf_counter() - start)
+    overhead_ms = statistics.median(timings) * 1000
+
+    # Pico de memoria por ejecución
+    gc.collect()
+    tracemalloc.start()
+    await invoke()
+    peak_kb = tracemalloc.get_traced_memory()[1] / 1024
+    tracemalloc.stop()
+
+    # Tiempo real frente a tiempo de LLM con latencia
+    llm.latency = latency
+    llm.reset()
+    start = time.perf_counter()
+    for _ in range(repetitions):
+        await invoke()
+    wall = (time.perf_counter() - start) / repetitions
+    llm_seconds = llm.llm_seconds / repetitions
+
+    return {
+        "overhead_ms": overhead_ms,
+        "super_steps": super_steps,
+        "llm_calls": llm.calls / repetitions,
+        "wall_ms": wall * 1000,
+        "llm_ms": llm_seconds * 1000,
+        "parallel_efficiency": llm_seconds / wall if wall else 0.0,
+        "peak_kb": peak_kb,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Compara los resultados con una línea base.
+
+    Returns:
+        Lista de regresiones (patrón, métrica, base, actual).
+    """
+    regressions = []
+    for name, metrics in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        for metric in COMPARED:
+            if metric not in base:
+                continue
+            if metric == "overhead_ms":
+                limit = max(base[metric] * (1 + tolerance), base[metric] + OVERHEAD_NOISE_MS)
+            elif metric == "peak_kb":
+                limit = base[metric] * (1 + tolerance)
+            else:
+                limit = base[metric]
+            if metrics[metric] > limit:
+                regressions.append((name, metric, base[metric], metrics[metric]))
+    return regressions
+
+
+def main():
+    """Función principal del benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark de los patrones de LangGraph")
+    parser.add_argument("--latencia", type=float, default=0.05, help="Latencia simulada por llamada (s)")
+    parser.add_argument("--repeticiones", type=int, default=5, help="Ejecuciones por medición")
+    parser.add_argument("--patron", action="append", choices=list(PATTERNS), help="Patrón a medir (repetible)")
+    parser.add_argument("--guardar", help="Guardar los resultados como línea base en este archivo")
+    parser.add_argument("--comparar", help="Comparar con la línea base de este archivo")
+    parser.add_argument("--tolerancia", type=float, default=0.5,
+                        help="Aumento relativo permitido de overhead y memoria")
+    args = parser.parse_args()
+
+    print("📏 Benchmark de patrones de LangGraph (modelo simulado)")
+    print(f"   Latencia por llamada: {args.latencia * 1000:.0f} ms, {args.repeticiones} repeticiones")
+    print("=" * 96)
+    print(f"{'Patrón':<20}{'Overhead ms':>12}{'Pasos':>7}{'Llamadas':>10}"
+          f"{'Real ms':>10}{'LLM ms':>10}{'Eficiencia':>12}{'Pico KB':>10}")
+
+    results = {}
+    for name in args.patron or PATTERNS:
+        results[name] = r = asyncio.run(run_pattern(name, args.latencia, args.repeticiones))
+        print(f"{name:<20}{r['overhead_ms']:>12.2f}{r['super_steps']:>7}{r['llm_calls']:>10.1f}"
+              f"{r['wall_ms']:>10.1f}{r['llm_ms']:>10.1f}{r['parallel_efficiency']:>11.2f}x{r['peak_kb']:>10.0f}")
+
+    if args.guardar:
+        Path(args.guardar).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"\n💾 Línea base guardada en {args.guardar}")
+
+    if args.comparar:
+        baseline = json.loads(Path(args.comparar).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerancia)
+        print("\n" + "=" * 96)
+        if not regressions:
+            print(f"✅ Sin regresiones respecto a {args.comparar}")
+            return
+        for name, metric, base, current in regressions:
+            print(f"❌ {name}: {metric} {base:.2f} → {current:.2f}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
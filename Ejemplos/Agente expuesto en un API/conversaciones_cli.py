@@ -0,0 +1,109 @@
+"""
+Herramienta de línea de comandos para respaldar y migrar conversaciones.
+
+Usa los endpoints /admin/export y /admin/import de la API para transferir
+conversaciones completas en streaming, sin cargarlas en memoria.
+
+Ejemplos:
+    python conversaciones_cli.py exportar respaldo.ndjson.gz
+    python conversaciones_cli.py exportar respaldo.msgpack --prefijo cliente_
+    python conversaciones_cli.py importar respaldo.ndjson.gz --url http://otro-servidor:8000
+"""
+
+import argparse
+import os
+import sys
+import time
+import requests
+
+
+CHUNK_SIZE = 64 * 1024
+
+
+def detect_format(path: str) -> str:
+    """Deduce el formato a partir de la extensión del archivo."""
+    return "msgpack" if path.endswith(".msgpack") else "ndjson.gz"
+
+
+def admin_headers() -> dict:
+    """Cabeceras con el token de administración (el servidor exige ADMIN_TOKEN)."""
+    token = os.environ.get("ADMIN_TOKEN")
+    return {"X-Admin-Token": token} if token else {}
+
+
+def exportar(args) -> None:
+    """Descarga las conversaciones a un archivo."""
+    params = {"format": args.formato or detect_format(args.archivo)}
+    if args.prefijo:
+        params["thread_prefix"] = args.prefijo
+    if args.thread:
+        params["thread_id"] = args.thread
+
+    inicio = time.time()
+    total = 0
+    with requests.get(f"{args.url}/admin/export", params=params, headers=admin_headers(), stream=True) as response:
+        response.raise_for_status()
+        with open(args.archivo, "wb") as f:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                f.write(chunk)
+                total += len(chunk)
+
+    print(f"✅ Exportados {total / 1024:.1f} KB a {args.archivo} en {time.time() - inicio:.1f}s")
+
+
+def importar(args) -> None:
+    """Sube un archivo exportado previamente."""
+    params = {
+        "format": args.formato or detect_format(args.archivo),
+        "batch_size": args.lote
+    }
+
+    def leer_archivo():
+        with open(args.archivo, "rb") as f:
+            while chunk := f.read(CHUNK_SIZE):
+                yield chunk
+
+    inicio = time.time()
+    response = requests.post(
+        f"{args.url}/admin/import", params=params, headers=admin_headers(), data=leer_archivo()
+    )
+    response.raise_for_status()
+    resultado = response.json()
+    print(f"✅ Importados {resultado['threads']} hilos y {resultado['messages']} mensajes "
+          f"en {time.time() - inicio:.1f}s")
+
+
+def main():
+    """Punto de entrada de la herramienta."""
+    parser = argparse.ArgumentParser(description="Exportar e importar conversaciones del agente")
+    parser.add_argument("--url", default="http://localhost:8000", help="URL base de la API")
+    subparsers = parser.add_subparsers(dest="comando", required=True)
+
+    parser_exportar = subparsers.add_parser("exportar", help="Exportar conversaciones a un archivo")
+    parser_exportar.add_argument("archivo", help="Archivo de salida (.ndjson.gz o .msgpack)")
+    parser_exportar.add_argument("--formato", choices=["ndjson.gz", "msgpack"])
+    parser_exportar.add_argument("--prefijo", help="Exportar solo hilos con este prefijo")
+    parser_exportar.add_argument("--thread", action="append", help="Hilo específico (repetible)")
+    parser_exportar.set_defaults(func=exportar)
+
+    parser_importar = subparsers.add_parser("importar", help="Importar conversaciones desde un archivo")
+    parser_importar.add_argument("archivo", help="Archivo de entrada (.ndjson.gz o .msgpack)")
+    parser_importar.add_argument("--formato", choices=["ndjson.gz", "msgpack"])
+    parser_importar.add_argument("--lote", type=int, default=500, help="Mensajes por escritura")
+    parser_importar.set_defaults(func=importar)
+
+    args = parser.parse_args()
+    args.url = args.url.rstrip("/")
+
+    try:
+        args.func(args)
+    except requests.exceptions.ConnectionError:
+        print("❌ Error: No se puede conectar a la API. ¿Está el servidor ejecutándose?")
+        sys.exit(1)
+    except requests.exceptions.HTTPError as e:
+        print(f"❌ Error HTTP: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
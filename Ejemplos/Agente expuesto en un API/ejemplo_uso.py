@@ -6,6 +6,7 @@ Este script demuestra cómo usar el agente directamente sin la API REST,
 """
 
 import os
+from agente.cassette import replay_only
 from agente.memory_agent import MemoryAgent
 
 def ejemplo_basico():
@@ -14,7 +15,7 @@ def ejemplo_basico():
     print("=" * 45)
     
     # Verificar API key
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
         print("❌ Por favor, configura GOOGLE_API_KEY en tus variables de entorno")
         return
     
@@ -59,7 +60,7 @@ def ejemplo_conversaciones_multiples():
     print("\n\n🔀 Ejemplo de conversaciones múltiples")
     print("=" * 45)
     
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
         print("❌ Por favor, configura GOOGLE_API_KEY en tus variables de entorno")
         return
     
@@ -102,7 +103,7 @@ def ejemplo_manejo_errores():
     print("\n\n⚠️ Ejemplo de manejo de errores")
     print("=" * 45)
     
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
         print("❌ Por favor, configura GOOGLE_API_KEY en tus variables de entorno")
         return
     
@@ -126,7 +127,7 @@ def ejemplo_interactivo():
     print("=" * 45)
     print("Escribe 'salir' para terminar")
     
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
         print("❌ Por favor, configura GOOGLE_API_KEY en tus variables de entorno")
         return
     
@@ -159,7 +160,7 @@ def ejemplo_interactivo():
 
 if __name__ == "__main__":
     # Verificar configuración
-    if not os.environ.get("GOOGLE_API_KEY"):
+    if not os.environ.get("GOOGLE_API_KEY") and not replay_only():
         print("⚠️ GOOGLE_API_KEY no está configurada")
         print("\n💡 Configúrala con uno de estos métodos:")
         print("1. Variable de entorno: export GOOGLE_API_KEY=tu_clave")
@@ -5,6 +5,7 @@ Este script facilita el inicio del servidor con configuración personalizada
 y proporciona un punto de entrada único para la aplicación.
 """
 
+import asyncio
 import os
 import sys
 import uvicorn
@@ -86,6 +87,43 @@ def check_api_key():
         print(f"✅ Google API Key encontrada: {masked_key}")
         return True
 
+class DrainingServer(uvicorn.Server):
+    """
+    Servidor que drena los turnos en curso antes de cerrar las conexiones.
+    
+    uvicorn ejecuta el cierre de la aplicación (lifespan) recién después de cerrar los
+    sockets y esperar a todas las conexiones, cuando ya no queda nada que drenar. Con
+    la primera señal este servidor sigue aceptando conexiones y llama a begin_drain:
+    /health responde 503 para que el balanceador retire la instancia, las solicitudes
+    nuevas reciben 503 con Retry-After y los turnos en curso terminan (o se cancelan al
+    vencer SHUTDOWN_TIMEOUT). Recién entonces comienza el cierre normal de uvicorn.
+    Una segunda señal cierra de inmediato.
+    """
+    
+    def __init__(self, config: uvicorn.Config):
+        super().__init__(config)
+        self._draining = False
+    
+    def handle_exit(self, sig, frame) -> None:
+        if self._draining or self.should_exit:
+            return super().handle_exit(sig, frame)
+        self._draining = True
+        # uvicorn >= 0.29 vuelve a lanzar al salir las señales capturadas; 0.24 no las guarda
+        captured = getattr(self, "_captured_signals", None)
+        if captured is not None:
+            captured.append(sig)
+        # El manejador de señales corre entre instrucciones del bucle de eventos
+        asyncio.get_event_loop().call_soon_threadsafe(self._begin_drain)
+    
+    def _begin_drain(self) -> None:
+        from app.main import begin_drain
+        
+        def exit_when_drained(task: asyncio.Task) -> None:
+            self.should_exit = True
+        
+        begin_drain().add_done_callback(exit_when_drained)
+
+
 def main():
     """Función principal para ejecutar el servidor."""
     print("🚀 Iniciando servidor del Agente con Memoria API")
@@ -126,16 +164,33 @@ def main():
     print("\n" + "=" * 50)
     print("🟢 Iniciando servidor...")
     
+    # Los turnos ya se drenaron al cerrar; esto acota la espera de las conexiones restantes
+    # (por ejemplo, sesiones WebSocket abiertas)
+    shutdown_timeout = int(float(os.environ.get("SHUTDOWN_TIMEOUT", "25")))
+    
     try:
         # Ejecutar el servidor
-        uvicorn.run(
-            "app.main:app",
-            host=host,
-            port=port,
-            reload=reload,
-            log_level=log_level,
-            access_log=True
-        )
+        if reload:
+            # Con recarga automática uvicorn ejecuta la aplicación en un subproceso
+            uvicorn.run(
+                "app.main:app",
+                host=host,
+                port=port,
+                reload=reload,
+                log_level=log_level,
+                access_log=True,
+                timeout_graceful_shutdown=shutdown_timeout
+            )
+        else:
+            config = uvicorn.Config(
+                "app.main:app",
+                host=host,
+                port=port,
+                log_level=log_level,
+                access_log=True,
+                timeout_graceful_shutdown=shutdown_timeout
+            )
+            DrainingServer(config).run()
     except KeyboardInterrupt:
         print("\n\n🛑 Servidor detenido por el usuario")
     except Exception as e:
@@ -0,0 +1,14 @@
+"""
+Configuración común de las pruebas.
+
+Las pruebas no usan red ni GOOGLE_API_KEY: el modelo es FakeChatModel (o una subclase)
+y el checkpointer vive en memoria. Ejecutar desde el directorio del proyecto:
+
+    python -m pytest tests -q
+"""
+
+import os
+import sys
+
+# Importar los paquetes del proyecto (agente, app, tool, workflows) como en run_server.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,26 @@
+"""Pruebas de la protección de los endpoints de administración."""
+
+import pytest
+
+from fastapi import HTTPException
+
+from app.main import verify_admin_token
+
+
+def test_admin_endpoints_are_disabled_without_admin_token(monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+
+    for token in (None, "", "cualquiera"):
+        with pytest.raises(HTTPException) as error:
+            verify_admin_token(token)
+        assert error.value.status_code == 404
+
+
+def test_admin_token_must_match(monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "secreto")
+
+    verify_admin_token("secreto")
+    for token in (None, "", "otro"):
+        with pytest.raises(HTTPException) as error:
+            verify_admin_token(token)
+        assert error.value.status_code == 401
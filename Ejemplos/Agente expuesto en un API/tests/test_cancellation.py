@@ -0,0 +1,161 @@
+"""Pruebas de la cancelación de turnos: plazos, desconexiones y reversión del hilo."""
+
+import asyncio
+
+import pytest
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from agente.cancellation import CancellationStats, TurnDeadlineExceeded, guarded_stream, guarded_turn
+from agente.checkpointer import CompactMemorySaver
+from agente.memory_agent import MemoryAgent
+from workflows.fake_llm import FakeChatModel
+
+
+def history(agent, thread_id):
+    return [(message["type"], message["content"]) for message in agent.get_conversation_history(thread_id)]
+
+
+def test_deadline_cancels_the_turn_and_not_the_consumer():
+    agent = MemoryAgent(llm=FakeChatModel(latency=0.2))
+    agent.chat("hola", "t")
+    before = history(agent, "t")
+
+    async def consume():
+        events = []
+        with pytest.raises(TurnDeadlineExceeded):
+            async for event in agent.astream_chat("suma 2 y 3", "t", timeout=0.3):
+                events.append(event["type"])
+                # Trabajo lento del consumidor (como enviar por el WebSocket) mientras vence el plazo
+                await asyncio.sleep(0.5)
+        task = asyncio.current_task()
+        return events, task.cancelling() if hasattr(task, "cancelling") else 0
+
+    events, cancelling = asyncio.run(consume())
+
+    assert events[0] == "tool_call" and "done" not in events
+    assert cancelling == 0
+    assert history(agent, "t") == before
+    assert agent.cancellations.as_dict()["turns"]["deadline"] == 1
+
+
+def test_cancelled_caller_rolls_back_the_turn():
+    agent = MemoryAgent(llm=FakeChatModel(latency=0.2))
+    agent.chat("hola", "t")
+    before = history(agent, "t")
+
+    async def disconnect():
+        task = asyncio.ensure_future(agent.achat("suma 2 y 3", "t"))
+        await asyncio.sleep(0.1)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(disconnect())
+
+    assert history(agent, "t") == before
+    assert agent.cancellations.as_dict()["turns"]["cancelled"] == 1
+    assert agent.memory.thread_info("t")["message_count"] == len(before)
+
+
+def slow_graph():
+    """Grafo de dos pasos cuyo segundo paso tarda config["configurable"]["delay"] segundos."""
+    async def respond(state, config):
+        await asyncio.sleep(config["configurable"]["delay"])
+        return {"messages": [AIMessage(content=config["configurable"]["turn_id"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("receive", lambda state: {})
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "receive")
+    builder.add_edge("receive", "respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=CompactMemorySaver())
+
+
+def test_rollback_keeps_a_concurrent_turn_on_the_same_thread():
+    graph = slow_graph()
+    stats = CancellationStats()
+
+    def run(turn_id, delay, timeout):
+        config = {"configurable": {"thread_id": "t", "turn_id": turn_id, "delay": delay}}
+        work = graph.ainvoke({"messages": [HumanMessage(content=turn_id)]}, config)
+        return guarded_turn(graph, config, work, timeout, stats)
+
+    async def turns():
+        slow = asyncio.ensure_future(run("lento", 1.0, 0.3))
+        await asyncio.sleep(0.1)
+        # Este turno termina antes de que venza el plazo del primero
+        await run("rapido", 0.05, None)
+        with pytest.raises(TurnDeadlineExceeded):
+            await slow
+
+    asyncio.run(turns())
+
+    messages = graph.get_state({"configurable": {"thread_id": "t"}}).values["messages"]
+    assert messages[-1].content == "rapido"
+    assert stats.as_dict()["turns"]["deadline"] == 1
+    # Solo se descartaron los checkpoints del turno vencido
+    metadata = [item.metadata.get("turn_id") for item in graph.checkpointer.list({"configurable": {"thread_id": "t"}})]
+    assert "lento" not in metadata and "rapido" in metadata
+
+
+def held_records(graph, thread_id):
+    """Registros retenidos por el historial del último checkpoint y profundidad de su cadena."""
+    memory = graph.checkpointer
+    stored = memory.storage[thread_id][""][max(memory.storage[thread_id][""])]
+    held, depth, segment = 0, 0, stored.segment
+    while segment is not None:
+        held += len(segment.records)
+        depth += 1
+        segment = segment.parent
+    return held, depth, stored.length
+
+
+def test_rolled_back_messages_are_freed():
+    graph = slow_graph()
+    stats = CancellationStats()
+
+    def run(turn_id, delay, timeout):
+        config = {"configurable": {"thread_id": "t", "turn_id": turn_id, "delay": delay}}
+        work = graph.ainvoke({"messages": [HumanMessage(content=turn_id)]}, config)
+        return guarded_turn(graph, config, work, timeout, stats)
+
+    async def turns():
+        await run("primero", 0, None)
+        with pytest.raises(TurnDeadlineExceeded):
+            await run("vencido", 1.0, 0.2)
+        await run("tercero", 0, None)
+
+    asyncio.run(turns())
+
+    held, depth, length = held_records(graph, "t")
+    assert [m.content for m in graph.get_state({"configurable": {"thread_id": "t"}}).values["messages"]] == [
+        "primero", "primero", "tercero", "tercero",
+    ]
+    # Ni el mensaje del turno vencido queda retenido ni se apila un segmento nuevo
+    assert (held, depth, length) == (4, 1, 4)
+
+
+def test_stream_waits_for_a_slow_consumer():
+    produced = []
+
+    async def source():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    async def consume():
+        ahead = []
+        # Sin checkpointer solo se aplica el plazo
+        async for item in guarded_stream(object(), {}, source(), buffer_size=2):
+            ahead.append(len(produced) - item - 1)
+            await asyncio.sleep(0.01)
+        return ahead
+
+    ahead = asyncio.run(consume())
+
+    # El productor nunca adelanta al consumidor más que la cola más el elemento en curso
+    assert max(ahead) <= 3
+    assert len(produced) == 20
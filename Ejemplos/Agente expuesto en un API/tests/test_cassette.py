@@ -0,0 +1,110 @@
+"""Pruebas del cassette: grabación, reproducción, modo auto y streaming."""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGenerationChunk
+
+from agente.cassette import CassetteChatModel, CassetteMiss
+from workflows.fake_llm import FakeChatModel
+
+
+class StreamingModel(BaseChatModel):
+    """Modelo que emite su respuesta en fragmentos, con espera antes del primero."""
+
+    first_token: float = 0.1
+
+    @property
+    def _llm_type(self) -> str:
+        return "streaming"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        raise NotImplementedError
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        await asyncio.sleep(self.first_token)
+        for text in ("Ho", "la"):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=text))
+
+
+PROMPT = [HumanMessage(content="hola")]
+
+
+def test_recorded_responses_replay_without_the_model(tmp_path):
+    path = str(tmp_path / "c.jsonl")
+    inner = FakeChatModel()
+    recorded = CassetteChatModel(inner=inner, path=path, mode="record").invoke(PROMPT)
+
+    replay = CassetteChatModel(path=path, mode="replay", model_name="FakeChatModel", replay_latency="zero")
+
+    assert replay.invoke(PROMPT).content == recorded.content
+    assert replay.stats == {"hits": 1, "misses": 0, "recorded": 0}
+    assert inner.calls == 1
+
+
+def test_replay_fails_on_unrecorded_requests_and_other_models(tmp_path):
+    path = str(tmp_path / "c.jsonl")
+    CassetteChatModel(inner=FakeChatModel(), path=path, mode="record").invoke(PROMPT)
+
+    replay = CassetteChatModel(path=path, mode="replay", model_name="FakeChatModel")
+    with pytest.raises(CassetteMiss):
+        replay.invoke([HumanMessage(content="otra cosa")])
+
+    other_model = CassetteChatModel(path=path, mode="replay", model_name="otro-modelo")
+    with pytest.raises(CassetteMiss):
+        other_model.invoke(PROMPT)
+
+
+def test_auto_mode_records_only_what_is_missing(tmp_path):
+    inner = FakeChatModel()
+    llm = CassetteChatModel(inner=inner, path=str(tmp_path / "c.jsonl"), mode="auto", replay_latency="zero")
+
+    first = llm.invoke(PROMPT)
+    again = llm.invoke(PROMPT)
+    llm.invoke([HumanMessage(content="otra cosa")])
+
+    assert again.content == first.content
+    assert inner.calls == 2
+    assert llm.stats == {"hits": 1, "misses": 2, "recorded": 2}
+
+
+def test_concurrent_hits_are_all_counted(tmp_path):
+    llm = CassetteChatModel(inner=FakeChatModel(), path=str(tmp_path / "c.jsonl"), replay_latency="zero")
+    llm.invoke(PROMPT)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: llm.invoke(PROMPT), range(200)))
+
+    assert llm.stats["hits"] == 200
+
+
+def test_streaming_replays_chunks_and_time_to_first_token(tmp_path):
+    path = str(tmp_path / "c.jsonl")
+
+    async def stream(llm):
+        start = time.perf_counter()
+        chunks, first = [], None
+        async for chunk in llm.astream(PROMPT):
+            first = first if first is not None else time.perf_counter() - start
+            if chunk.content:
+                chunks.append(chunk.content)
+        return chunks, first
+
+    recorded, _ = asyncio.run(stream(CassetteChatModel(inner=StreamingModel(), path=path, mode="record")))
+    replayed, first = asyncio.run(stream(
+        CassetteChatModel(path=path, mode="replay", model_name="StreamingModel")
+    ))
+    immediate, quick = asyncio.run(stream(
+        CassetteChatModel(path=path, mode="replay", model_name="StreamingModel", replay_latency="zero")
+    ))
+
+    assert recorded == replayed == immediate == ["Ho", "la"]
+    assert first >= 0.08 and quick < 0.05
+    # La respuesta completa también está grabada para invoke
+    replay = CassetteChatModel(path=path, mode="replay", model_name="StreamingModel", replay_latency="zero")
+    assert replay.invoke(PROMPT).content == "Hola"
@@ -0,0 +1,60 @@
+"""Pruebas del encadenamiento: reanudación tras un fallo y memorización de pasos."""
+
+import pytest
+
+from langchain_core.messages import AIMessage
+
+from workflows.chain import ChainRunner, StepCache, build_chain_graph
+
+
+class JokeWriter:
+    """Modelo falso que registra cada paso y puede fallar una vez en el pulido."""
+
+    def __init__(self, fail_polish=False):
+        self.fail_polish = fail_polish
+        self.steps = []
+
+    def invoke(self, prompt):
+        if prompt.startswith("Escribe"):
+            step, content = "generate", "un chiste sin remate"
+        elif prompt.startswith("Haz"):
+            step, content = "improve", "un chiste mejorado"
+        else:
+            step, content = "polish", "un chiste pulido"
+            if self.fail_polish:
+                self.fail_polish = False
+                raise RuntimeError("fallo transitorio")
+        self.steps.append(step)
+        return AIMessage(content=content)
+
+
+def test_failed_run_resumes_from_the_failed_step():
+    llm = JokeWriter(fail_polish=True)
+    runner = ChainRunner(build_chain_graph(llm))
+    inputs = {"topic": "aviones"}
+
+    with pytest.raises(RuntimeError):
+        runner.run(inputs)
+    assert runner.status(runner.run_id_for(inputs))["next"] == ["polish_joke"]
+
+    state = runner.run(inputs)
+
+    assert state["final_joke"] == "un chiste pulido"
+    assert llm.steps == ["generate", "improve", "polish"]
+    # Una ejecución terminada se devuelve sin llamar al modelo
+    assert runner.run(inputs) == state and len(llm.steps) == 3
+
+
+def test_step_cache_skips_steps_whose_input_did_not_change():
+    llm = JokeWriter()
+    cache = StepCache()
+    runner = ChainRunner(build_chain_graph(llm, cache=cache))
+
+    runner.run({"topic": "aviones"})
+    # Otro tema: generate_joke se ejecuta, pero produce el mismo chiste y los pasos
+    # siguientes se reutilizan
+    state = runner.run({"topic": "trenes"})
+
+    assert state["final_joke"] == "un chiste pulido"
+    assert llm.steps == ["generate", "improve", "polish", "generate"]
+    assert cache.hits == 2 and cache.misses == 4
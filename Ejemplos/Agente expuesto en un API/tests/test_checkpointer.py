@@ -0,0 +1,121 @@
+"""Pruebas de CompactMemorySaver y ShardedMemorySaver: bifurcaciones y concurrencia."""
+
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from agente.checkpointer import CompactMemorySaver, ShardedMemorySaver
+
+
+def echo_graph(memory, barrier=None):
+    """Grafo de un nodo que responde con el texto del usuario y el hilo."""
+    def respond(state: MessagesState, config):
+        if barrier is not None:
+            # Los turnos de distintos hilos guardan su checkpoint a la vez
+            barrier.wait()
+        thread_id = config["configurable"]["thread_id"]
+        return {"messages": [AIMessage(content=f"{state['messages'][-1].content} {thread_id}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.add_edge(START, "respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=memory)
+
+
+def history(graph, thread_id):
+    return [m.content for m in graph.get_state({"configurable": {"thread_id": thread_id}}).values["messages"]]
+
+
+def turn(graph, thread_id, text):
+    graph.invoke({"messages": [HumanMessage(content=text)]}, {"configurable": {"thread_id": thread_id}})
+
+
+def forks_on_distinct_shards(memory, count):
+    """Ids de hilos que caen en particiones distintas entre sí y de "origen"."""
+    used, ids = {id(memory.shard_for("origen"))}, []
+    for i in range(1000):
+        shard = id(memory.shard_for(f"f{i}"))
+        if shard not in used:
+            used.add(shard)
+            ids.append(f"f{i}")
+            if len(ids) == count:
+                return ids
+    raise AssertionError("no hay suficientes particiones")
+
+
+@pytest.mark.parametrize("memory", [CompactMemorySaver(), ShardedMemorySaver(shards=8)], ids=["compact", "sharded"])
+def test_fork_does_not_modify_shared_segment(memory):
+    graph = echo_graph(memory)
+    turn(graph, "origen", "hola")
+    base = history(graph, "origen")
+    memory.fork_thread("origen", "f0")
+    memory.fork_thread("origen", "f1")
+
+    turn(graph, "f0", "suma")
+    # El segmento del origen no creció con los mensajes de la bifurcación
+    shard = memory.shard_for("origen") if isinstance(memory, ShardedMemorySaver) else memory
+    checkpoints = shard.storage["origen"][""]
+    latest = checkpoints[max(checkpoints)]
+    assert latest.segment.end == latest.length == len(base)
+
+    turn(graph, "f1", "resta")
+    turn(graph, "origen", "adiós")
+
+    assert history(graph, "f0") == base + ["suma", "suma f0"]
+    assert history(graph, "f1") == base + ["resta", "resta f1"]
+    assert history(graph, "origen") == base + ["adiós", "adiós origen"]
+
+
+def test_concurrent_turns_on_forks_in_different_shards():
+    # Cambios de hilo frecuentes para que los turnos se intercalen dentro de put()
+    previous = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        _run_concurrent_forks()
+    finally:
+        sys.setswitchinterval(previous)
+
+
+def _run_concurrent_forks():
+    memory = ShardedMemorySaver(shards=8)
+    forks = forks_on_distinct_shards(memory, 4)
+    barrier = threading.Barrier(len(forks))
+    graph = echo_graph(memory, barrier)
+    graph_without_barrier = echo_graph(memory)
+    turn(graph_without_barrier, "origen", "hola")
+    base = history(graph_without_barrier, "origen")
+    for fork in forks:
+        memory.fork_thread("origen", fork)
+
+    def run(fork):
+        for i in range(25):
+            turn(graph, fork, f"multiply {i}")
+
+    with ThreadPoolExecutor(len(forks)) as pool:
+        list(pool.map(run, forks))
+
+    for fork in forks:
+        expected = list(base)
+        for i in range(25):
+            expected += [f"multiply {i}", f"multiply {i} {fork}"]
+        assert history(graph, fork) == expected
+    assert history(graph, "origen") == base
+
+
+def test_fork_keeps_index_consistent():
+    memory = ShardedMemorySaver(shards=4)
+    graph = echo_graph(memory)
+    turn(graph, "origen", "hola")
+    memory.fork_thread("origen", "copia")
+    turn(graph, "copia", "otra")
+
+    assert memory.thread_info("origen")["message_count"] == 2
+    assert memory.thread_info("copia")["message_count"] == 4
+    assert memory.thread_stats()["messages"] == 6
+    with pytest.raises(ValueError):
+        memory.fork_thread("origen", "copia")
@@ -0,0 +1,106 @@
+"""Pruebas de la capa fría del checkpointer: volcado, carga y listado de hilos."""
+
+import asyncio
+import threading
+
+from agente.memory_agent import MemoryAgent
+from workflows.fake_llm import FakeChatModel
+
+
+def cold_agent(tmp_path, **kwargs):
+    return MemoryAgent(llm=FakeChatModel(), spill_dir=str(tmp_path), **kwargs)
+
+
+def test_spilled_threads_round_trip(tmp_path):
+    agent = cold_agent(tmp_path, max_hot_threads=1)
+    for thread_id in ("a", "b", "c"):
+        agent.chat("suma 2 y 3", thread_id)
+    histories = {thread_id: agent.get_conversation_history(thread_id) for thread_id in ("a", "b", "c")}
+
+    assert agent.memory.spill_idle(0) >= 1
+    assert all(agent.memory.thread_info(t)["cold"] for t in ("a", "b", "c"))
+
+    # Un turno nuevo sobre un hilo frío lo carga y continúa la conversación
+    agent.chat("hola", "a")
+    assert agent.get_conversation_history("a")[:4] == histories["a"]
+    assert agent.get_conversation_history("b") == histories["b"]
+    stats = agent.memory.tier_stats()
+    assert stats["hot_threads"] <= 1 and stats["page_ins"] >= 2
+    assert agent.memory.thread_info("a")["message_count"] == 8
+
+
+def test_listing_a_cold_thread_does_not_load_it(tmp_path):
+    agent = cold_agent(tmp_path)
+    agent.chat("suma 2 y 3", "a")
+    config = {"configurable": {"thread_id": "a"}}
+    expected = [item.config["configurable"]["checkpoint_id"] for item in agent.memory.list(config)]
+    agent.memory.spill_idle(0)
+
+    listed = list(agent.memory.list(config))
+
+    assert [item.config["configurable"]["checkpoint_id"] for item in listed] == expected
+    assert len(listed[0].checkpoint["channel_values"]["messages"]) == 4
+    assert agent.memory.thread_info("a")["cold"]
+    assert agent.memory.tier_stats()["page_ins"] == 0
+
+
+def test_spill_compresses_outside_the_lock(tmp_path):
+    agent = cold_agent(tmp_path)
+    agent.chat("hola", "a")
+    agent.chat("hola", "b")
+    saver = agent.memory
+    cold = saver.cold
+    compress = cold.compress
+    lock_free = []
+
+    def checked_compress(data):
+        # Un turno de otro hilo puede usar el almacén mientras se comprime
+        probe = threading.Thread(target=lambda: lock_free.append(saver.thread_info("b") is not None), daemon=True)
+        probe.start()
+        probe.join(timeout=1)
+        return compress(data)
+
+    cold.compress = checked_compress
+    assert saver.spill_idle(0) == 2
+    assert lock_free == [True, True]
+
+
+def test_thread_used_while_spilling_stays_hot(tmp_path):
+    agent = cold_agent(tmp_path)
+    agent.chat("hola", "a")
+    saver = agent.memory
+    cold = saver.cold
+    compress = cold.compress
+
+    def compress_while_in_use(data):
+        saver.get_tuple({"configurable": {"thread_id": "a"}})
+        return compress(data)
+
+    cold.compress = compress_while_in_use
+    assert saver._spill("a") is False
+    assert not saver.thread_info("a")["cold"]
+    assert "a" not in cold
+
+
+def test_async_turn_pages_in_off_the_event_loop(tmp_path):
+    agent = cold_agent(tmp_path, checkpoint_shards=2)
+    agent.chat("suma 2 y 3", "a")
+    agent.memory.spill_idle(0)
+    cold = agent.memory.shard_for("a").cold
+    decompress = cold.decompress
+    threads = []
+
+    def recording_decompress(compressed):
+        threads.append(threading.current_thread())
+        return decompress(compressed)
+
+    cold.decompress = recording_decompress
+
+    async def turn():
+        return await agent.achat("hola", "a"), threading.current_thread()
+
+    response, loop_thread = asyncio.run(turn())
+
+    assert response["response"]
+    assert threads and loop_thread not in threads
+    assert agent.memory.thread_info("a")["message_count"] == 8
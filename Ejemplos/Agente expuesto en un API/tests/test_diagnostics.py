@@ -0,0 +1,77 @@
+"""Pruebas del diagnóstico de memoria."""
+
+import functools
+import gc
+import threading
+
+import pytest
+
+from agente.memory_agent import MemoryAgent
+from app import diagnostics
+from workflows.fake_llm import FakeChatModel
+
+
+@functools.lru_cache(maxsize=8)
+def cached_square(value):
+    return value * value
+
+
+class ModuleCache(dict):
+    pass
+
+
+MODULE_CACHE = ModuleCache(a=1)
+
+
+def test_thread_footprint_walks_outside_the_shard_lock(monkeypatch):
+    agent = MemoryAgent(llm=FakeChatModel(), checkpoint_shards=2)
+    agent.chat("suma 2 y 3", "t")
+    store = agent.memory.shard_for("t")
+    lock_free = []
+    deep_sizeof = diagnostics.deep_sizeof
+
+    def probe():
+        with store._lock:
+            lock_free.append(True)
+
+    def checked_deep_sizeof(obj, max_objects=diagnostics.DEFAULT_MAX_OBJECTS):
+        # Otro hilo (un turno de la misma partición) puede tomar el lock durante el recorrido
+        turn = threading.Thread(target=probe, daemon=True)
+        turn.start()
+        turn.join(timeout=1)
+        return deep_sizeof(obj, max_objects)
+
+    monkeypatch.setattr(diagnostics, "deep_sizeof", checked_deep_sizeof)
+    footprint = diagnostics.thread_footprint(agent.memory, "t")
+
+    assert lock_free == [True]
+    assert footprint["bytes"] > 0 and footprint["message_count"] == 4
+    assert diagnostics.thread_footprint(agent.memory, "otro") is None
+
+
+def test_cache_sizes_does_not_walk_the_heap(monkeypatch):
+    cached_square(3)
+
+    def forbidden():
+        raise AssertionError("cache_sizes no debe recorrer gc.get_objects()")
+
+    monkeypatch.setattr(gc, "get_objects", forbidden)
+    registered = {"registrada": {"k": "v"}, "ausente": None}
+    caches = {cache["name"]: cache for cache in diagnostics.cache_sizes(registered)}
+
+    assert caches["registrada"]["entries"] == 1
+    assert "ausente" not in caches
+    assert caches[f"{__name__}.cached_square"]["entries"] == 1
+    assert any(name.startswith(f"{__name__}.ModuleCache@") for name in caches)
+
+
+@pytest.mark.parametrize("shards", [1, 2])
+def test_heaviest_threads_sorted_by_size(shards):
+    agent = MemoryAgent(llm=FakeChatModel(), checkpoint_shards=shards)
+    agent.chat("hola", "corto")
+    for _ in range(3):
+        agent.chat("suma 2 y 3", "largo")
+
+    ranked = diagnostics.heaviest_threads(agent.memory, top=2)
+
+    assert [footprint["thread_id"] for footprint in ranked] == ["largo", "corto"]
@@ -0,0 +1,50 @@
+"""Pruebas de DrainController: espera, plazo y rechazo de trabajo nuevo."""
+
+import asyncio
+
+import pytest
+
+from app.drain import DrainController, ShuttingDown
+
+
+def test_drain_waits_for_turns_and_cancels_the_slow_ones():
+    async def scenario():
+        drain = DrainController()
+        fast = asyncio.ensure_future(drain.run(asyncio.sleep(0.05, "rápido")))
+        slow = asyncio.ensure_future(drain.run(asyncio.sleep(10, "lento")))
+        await asyncio.sleep(0)
+        report = await drain.drain(timeout=0.2)
+        assert report == {"drained": 1, "cancelled": 1}
+        assert await fast == "rápido"
+        with pytest.raises(ShuttingDown):
+            await slow
+        with pytest.raises(ShuttingDown):
+            await drain.run(asyncio.sleep(0))
+
+    asyncio.run(scenario())
+
+
+def test_first_signal_begins_the_drain_without_captured_signals(monkeypatch):
+    import uvicorn
+
+    import run_server
+    from app import main
+
+    async def scenario():
+        drained = asyncio.Event()
+
+        async def drain_in_flight():
+            drained.set()
+
+        monkeypatch.setattr(main, "begin_drain", lambda: asyncio.ensure_future(drain_in_flight()))
+        server = run_server.DrainingServer(uvicorn.Config(main.app))
+        # Como en uvicorn 0.24, que no tiene la lista de señales capturadas
+        if hasattr(server, "_captured_signals"):
+            del server._captured_signals
+
+        server.handle_exit(15, None)
+        await asyncio.wait_for(drained.wait(), 1)
+        await asyncio.sleep(0)
+        return server.should_exit
+
+    assert asyncio.run(scenario()) is True
@@ -0,0 +1,74 @@
+"""Pruebas del evaluador-optimizador: límites del ciclo y caché de calificaciones."""
+
+import asyncio
+import itertools
+
+from langchain_core.messages import AIMessage
+
+from workflows.evaluator import BatchFeedback, CandidateFeedback, EvaluatorOptimizer, GradeCache
+
+
+class Evaluator:
+    """Evaluador falso que nunca acepta un chiste y cuenta sus llamadas."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def ainvoke(self, prompt):
+        self.calls += 1
+        count = prompt.count("\n\n")
+        return BatchFeedback(grades=[
+            CandidateFeedback(index=i, grade="not funny", feedback="más corto") for i in range(1, count + 1)
+        ])
+
+
+class JokeWriter:
+    """Modelo falso: escribe chistes con la latencia indicada (distintos o siempre el mismo)."""
+
+    def __init__(self, latency=0.0, repeat=False):
+        self.latency = latency
+        self.repeat = repeat
+        self.evaluator = Evaluator()
+        self._numbers = itertools.count(1)
+
+    def with_structured_output(self, schema):
+        return self.evaluator
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.latency)
+        return AIMessage(content="el mismo chiste" if self.repeat else f"chiste {next(self._numbers)}")
+
+
+def test_max_rounds_stops_the_loop():
+    llm = JokeWriter()
+
+    result = asyncio.run(EvaluatorOptimizer(llm, n_candidates=2, max_rounds=3).run("gatos"))
+
+    assert not result.accepted
+    assert result.rounds == 3 and result.candidates == 6
+    assert llm.evaluator.calls == 3
+
+
+def test_time_budget_stops_the_loop():
+    llm = JokeWriter(latency=0.1)
+    optimizer = EvaluatorOptimizer(llm, n_candidates=2, max_rounds=100, time_budget=0.25)
+
+    result = asyncio.run(optimizer.run("gatos"))
+
+    assert not result.accepted
+    assert 1 <= result.rounds <= 2
+    assert result.seconds < 0.5
+
+
+def test_cached_grades_skip_the_evaluator():
+    llm = JokeWriter(repeat=True)
+    cache = GradeCache()
+    optimizer = EvaluatorOptimizer(llm, n_candidates=3, max_rounds=3, grade_cache=cache)
+
+    first = asyncio.run(optimizer.run("gatos"))
+    second = asyncio.run(optimizer.run("gatos"))
+
+    # Los candidatos repetidos se califican una sola vez, en la primera ronda
+    assert first.evaluator_calls == 1 and first.cached_grades == 2
+    assert second.evaluator_calls == 0 and second.cached_grades == 3
+    assert llm.evaluator.calls == 1
@@ -0,0 +1,110 @@
+"""Pruebas de la exportación e importación de conversaciones."""
+
+import pytest
+
+from agente.export import ConversationImporter, RecordDecoder, decode_chunks, encode_records
+from agente.memory_agent import MemoryAgent
+from workflows.fake_llm import FakeChatModel
+
+
+def messages(agent, thread_id):
+    """Mensajes completos del hilo (no el historial resumido de get_conversation_history)."""
+    state = agent.graph.get_state({"configurable": {"thread_id": thread_id}})
+    return state.values.get("messages", [])
+
+
+def source_agent():
+    agent = MemoryAgent(llm=FakeChatModel())
+    agent.chat("suma 2 y 3", "cliente-1")
+    agent.chat("multiplica 4 por 5", "cliente-1")
+    agent.chat("hola", "cliente-2")
+    agent.chat("hola", "otro-1")
+    return agent
+
+
+def split(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("fmt", ["ndjson.gz", "msgpack"])
+def test_export_import_round_trip_keeps_tool_links(fmt):
+    if fmt == "msgpack":
+        pytest.importorskip("msgpack")
+    source = source_agent()
+    data = b"".join(encode_records(source.export_conversations(thread_prefix="cliente-"), fmt))
+
+    target = MemoryAgent(llm=FakeChatModel())
+    # Bloques pequeños: los registros quedan partidos entre bloques
+    counts = target.import_conversations(decode_chunks(split(data, 7), fmt), batch_size=3)
+
+    assert counts == {"threads": 2, "messages": len(messages(source, "cliente-1")) + len(messages(source, "cliente-2"))}
+    assert not messages(target, "otro-1")
+    for thread_id in ("cliente-1", "cliente-2"):
+        original, imported = messages(source, thread_id), messages(target, thread_id)
+        assert [(m.type, m.id, m.content) for m in imported] == [(m.type, m.id, m.content) for m in original]
+        assert [getattr(m, "tool_call_id", None) for m in imported] == [getattr(m, "tool_call_id", None) for m in original]
+        assert [getattr(m, "tool_calls", None) for m in imported] == [getattr(m, "tool_calls", None) for m in original]
+
+
+def test_reimport_replaces_messages_instead_of_duplicating():
+    source = source_agent()
+    records = list(source.export_conversations(thread_ids=["cliente-1"]))
+    target = MemoryAgent(llm=FakeChatModel())
+
+    target.import_conversations(records)
+    target.import_conversations(records)
+
+    assert len(messages(target, "cliente-1")) == len(messages(source, "cliente-1"))
+    # La conversación importada puede continuar
+    target.chat("hola", "cliente-1")
+    assert len(messages(target, "cliente-1")) == len(messages(source, "cliente-1")) + 4
+
+
+def test_truncated_stream_is_rejected():
+    data = b"".join(encode_records(source_agent().export_conversations()))
+    decoder = RecordDecoder()
+    decoder.feed(data[:len(data) // 2])
+
+    with pytest.raises(ValueError):
+        decoder.close()
+
+
+def test_message_outside_its_thread_block_is_rejected():
+    records = list(source_agent().export_conversations(thread_ids=["cliente-1", "cliente-2"]))
+    importer = ConversationImporter(MemoryAgent(llm=FakeChatModel()))
+    message = next(record for record in records if record["kind"] == "message" and record["thread_id"] == "cliente-1")
+
+    importer.add(next(record for record in records if record["kind"] == "thread" and record["thread_id"] == "cliente-2"))
+    with pytest.raises(ValueError):
+        importer.add(message)
+
+
+@pytest.mark.parametrize("record", [
+    ["no", "es", "un", "objeto"],
+    {"kind": "thread"},
+    {"kind": "message", "thread_id": "cliente-1"},
+    {"kind": "message", "thread_id": "cliente-1", "message": {"type": "desconocido", "data": {"content": "x"}}},
+])
+def test_malformed_records_raise_value_error(record):
+    importer = ConversationImporter(MemoryAgent(llm=FakeChatModel()))
+    importer.add({"kind": "thread", "thread_id": "cliente-1"})
+
+    with pytest.raises(ValueError):
+        importer.add(record)
+
+
+def test_failed_import_discards_the_thread_in_progress():
+    source = source_agent()
+    records = list(source.export_conversations(thread_ids=["cliente-1", "cliente-2"]))
+    target = MemoryAgent(llm=FakeChatModel())
+    target.chat("hola", "cliente-2")
+    before = messages(target, "cliente-2")
+    # El flujo se corta con un registro inválido a mitad del segundo hilo
+    second = next(i for i, record in enumerate(records) if record["kind"] == "thread" and record["thread_id"] == "cliente-2")
+    broken = records[:second + 3] + [{"kind": "message", "thread_id": "cliente-2"}]
+
+    with pytest.raises(ValueError):
+        target.import_conversations(broken, batch_size=1)
+
+    assert len(messages(target, "cliente-1")) == len(messages(source, "cliente-1"))
+    assert messages(target, "cliente-2") == before
@@ -0,0 +1,56 @@
+"""Pruebas de la extracción por lotes: líneas mal formadas y fallos de escritura."""
+
+import asyncio
+import json
+
+import pytest
+
+from workflows.extraction import BatchExtractor, SearchQuery
+from workflows.fake_llm import FakeChatModel
+
+
+def test_malformed_lines_are_failed_items(tmp_path):
+    source = tmp_path / "preguntas.jsonl"
+    source.write_text(
+        "\n".join([
+            json.dumps("¿Qué es el calcio?"),
+            "{no es json",
+            json.dumps({"id": "sin-clave", "texto": "hola"}),
+            json.dumps({"id": "ok", "question": "¿Qué es el colesterol?"}),
+        ]) + "\n",
+        encoding="utf-8",
+    )
+    output = tmp_path / "consultas.jsonl"
+    extractor = BatchExtractor(FakeChatModel(latency=0.01), SearchQuery, max_concurrency=2)
+
+    stats = asyncio.run(extractor.extract_file(str(source), str(output)))
+
+    records = {record["id"]: record for record in map(json.loads, output.read_text(encoding="utf-8").splitlines())}
+    assert stats.processed == 4 and stats.succeeded == 2 and stats.failed == 2
+    assert "output" in records[1] and "output" in records["ok"]
+    assert "JSON" in records[2]["error"]
+    assert "question" in records["sin-clave"]["error"]
+
+
+def test_failing_worker_stops_the_others_before_returning():
+    written = []
+
+    def write(record):
+        if record["id"] == 0:
+            raise OSError("disco lleno")
+        written.append(record["id"])
+
+    items = ({"id": i, "input": f"pregunta {i}"} for i in range(50))
+    extractor = BatchExtractor(FakeChatModel(latency=0.02), SearchQuery, max_concurrency=4)
+
+    async def scenario():
+        with pytest.raises(OSError):
+            await extractor.extract(items, write)
+        count = len(written)
+        await asyncio.sleep(0.2)
+        return count
+
+    count = asyncio.run(scenario())
+
+    # Ningún trabajador siguió escribiendo después de que extract terminó
+    assert len(written) == count < 49
@@ -0,0 +1,19 @@
+"""Pruebas del alojamiento de grafos de langgraph.json en la API."""
+
+import pytest
+
+from fastapi import HTTPException
+
+from app import main
+from app.graphs import GraphRegistry
+
+
+def test_agent_graph_is_not_served_by_the_generic_host(monkeypatch):
+    monkeypatch.setattr(main, "graphs", GraphRegistry({"router": "./workflows/router.py:build_router_graph"}, "."))
+
+    main._require_graph("router")
+    with pytest.raises(HTTPException) as error:
+        main._require_graph(main.AGENT_GRAPH)
+
+    assert error.value.status_code == 404
+    assert "/ws/chat/{thread_id}" in error.value.detail
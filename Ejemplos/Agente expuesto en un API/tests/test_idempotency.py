@@ -0,0 +1,134 @@
+"""Pruebas del almacén de claves de idempotencia."""
+
+import asyncio
+
+import pytest
+
+from app.idempotency import IdempotencyKeyReused, IdempotencyStore, IdempotencyStoreFull, fingerprint
+
+
+def counting(result, delay=0.0):
+    calls = []
+
+    async def execute():
+        calls.append(result)
+        await asyncio.sleep(delay)
+        return result
+    return execute, calls
+
+
+def test_retries_share_the_first_execution():
+    store = IdempotencyStore()
+    execute, calls = counting({"response": "ok"}, delay=0.05)
+    body = fingerprint({"message": "hola"})
+
+    async def scenario():
+        first = store.run("k", body, execute)
+        retry = store.run("k", body, execute)
+        results = await asyncio.gather(first, retry)
+        later = await store.run("k", body, execute)
+        return results, later
+
+    results, later = asyncio.run(scenario())
+
+    assert calls == [{"response": "ok"}]
+    assert results == [({"response": "ok"}, False), ({"response": "ok"}, True)]
+    assert later == ({"response": "ok"}, True)
+    assert store.stats()["replays"] == 2
+
+
+def test_key_reused_with_another_body():
+    store = IdempotencyStore()
+    execute, _ = counting("ok")
+
+    async def scenario():
+        await store.run("k", fingerprint({"message": "a"}), execute)
+        await store.run("k", fingerprint({"message": "b"}), execute)
+
+    with pytest.raises(IdempotencyKeyReused):
+        asyncio.run(scenario())
+
+
+def test_failed_execution_frees_the_key():
+    store = IdempotencyStore()
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("falla")
+        return "ok"
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.run("k", "f", flaky)
+        return await store.run("k", "f", flaky)
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    assert len(attempts) == 2
+
+
+def test_waiting_retry_runs_again_when_the_first_is_cancelled():
+    store = IdempotencyStore()
+    execute, calls = counting("ok", delay=0.1)
+
+    async def scenario():
+        first = asyncio.ensure_future(store.run("k", "f", execute))
+        await asyncio.sleep(0.01)
+        retry = asyncio.ensure_future(store.run("k", "f", execute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await retry
+
+    assert asyncio.run(scenario()) == ("ok", False)
+    assert len(calls) == 2
+    assert store.stats()["in_flight"] == 0
+
+
+def test_expired_and_excess_keys_are_purged():
+    store = IdempotencyStore(max_entries=2, ttl=0.05)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await store.run(key, "f", counting(key)[0])
+        assert len(store) == 2
+        await asyncio.sleep(0.06)
+        await store.run("d", "f", counting("d")[0])
+
+    asyncio.run(scenario())
+    assert len(store) == 1
+
+
+def test_in_flight_keys_are_never_evicted():
+    store = IdempotencyStore(max_entries=1)
+    execute, calls = counting("ok", delay=0.05)
+
+    async def scenario():
+        first = asyncio.ensure_future(store.run("a", "f", execute))
+        await asyncio.sleep(0.01)
+        with pytest.raises(IdempotencyStoreFull):
+            await store.run("b", "f", execute)
+        # El reintento de la clave en curso sigue compartiendo la ejecución
+        retry = await store.run("a", "f", execute)
+        return await first, retry
+
+    first, retry = asyncio.run(scenario())
+
+    assert first == ("ok", False) and retry == ("ok", True)
+    assert len(calls) == 1
+
+
+def test_full_store_evicts_the_response_that_expires_first():
+    store = IdempotencyStore(max_entries=2)
+
+    async def scenario():
+        for key in ("a", "b", "c"):
+            await store.run(key, "f", counting(key)[0])
+        # "a" se descartó: se vuelve a ejecutar; "c" se reproduce
+        return await store.run("a", "f", counting("a2")[0]), await store.run("c", "f", counting("c2")[0])
+
+    again, replayed = asyncio.run(scenario())
+
+    assert again == ("a2", False) and replayed == ("c", True)
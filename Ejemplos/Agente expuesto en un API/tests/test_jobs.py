@@ -0,0 +1,97 @@
+"""Pruebas de la cola de trabajos: orden por hilo, reinicio y reversión de turnos."""
+
+import asyncio
+import json
+import sqlite3
+
+from agente.memory_agent import MemoryAgent
+from app.jobs import COMPLETED, JobQueue
+from workflows.fake_llm import FakeChatModel
+
+
+def recording_turn(log):
+    """run_turn simulado que tarda request["delay"] segundos y registra inicio y fin."""
+    async def run_turn(request):
+        log.append(("start", request["message"]))
+        await asyncio.sleep(request.get("delay", 0))
+        log.append(("end", request["message"]))
+        yield {"type": "done", "response": request["message"], "turn_id": request["turn_id"]}
+    return run_turn
+
+
+async def wait_finished(queue, job_ids):
+    while True:
+        jobs = [await queue.get(job_id) for job_id in job_ids]
+        if all(job["status"] == COMPLETED for job in jobs):
+            return jobs
+        await asyncio.sleep(0.01)
+
+
+def test_busy_thread_does_not_hold_a_worker(tmp_path):
+    log = []
+
+    async def scenario():
+        queue = JobQueue(str(tmp_path / "jobs.sqlite3"), recording_turn(log), max_concurrency=2)
+        await queue.start()
+        job_ids = [
+            await queue.submit({"message": "a1", "thread_id": "a", "delay": 0.3}),
+            await queue.submit({"message": "a2", "thread_id": "a"}),
+            await queue.submit({"message": "b1", "thread_id": "b", "delay": 0.05}),
+        ]
+        await wait_finished(queue, job_ids)
+        pending_threads = dict(queue._thread_jobs)
+        await queue.stop()
+        return pending_threads
+
+    pending_threads = asyncio.run(scenario())
+
+    ends = [message for event, message in log if event == "end"]
+    # b1 no espera a que termine a1 aunque a2 esté esperando su turno en el hilo "a"
+    assert ends == ["b1", "a1", "a2"]
+    assert log.index(("start", "a2")) > log.index(("end", "a1"))
+    # No quedan estructuras por hilo cuando no hay trabajos
+    assert pending_threads == {}
+
+
+def test_interrupted_job_is_discarded_before_running_again(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    request = {"message": "hola", "thread_id": "a"}
+    JobQueue(path, recording_turn([]))._db.close()
+    # Un trabajo que estaba en ejecución cuando el proceso se detuvo
+    with sqlite3.connect(path) as db:
+        db.execute(
+            "INSERT INTO jobs (id, status, request, partial, created_at, updated_at) VALUES (?, ?, ?, ?, 0, 0)",
+            ("j1", "running", json.dumps(request), "Respuesta a me"),
+        )
+    db.close()
+    discarded = []
+
+    async def scenario():
+        queue = JobQueue(path, recording_turn([]), discard_turn=discarded.append)
+        resumed = await queue.start()
+        job, = await wait_finished(queue, ["j1"])
+        await queue.stop()
+        return resumed, job
+
+    resumed, job = asyncio.run(scenario())
+
+    assert resumed == 1
+    assert discarded == [{**request, "turn_id": "j1"}]
+    assert job["result"]["turn_id"] == "j1"
+
+
+def test_discard_turn_removes_only_that_turn():
+    agent = MemoryAgent(llm=FakeChatModel())
+    agent.chat("hola", "a")
+    before = agent.get_conversation_history("a")
+
+    async def run_job_turn():
+        async for event in agent.astream_chat("suma 2 y 3", "a", turn_id="j1"):
+            pass
+
+    asyncio.run(run_job_turn())
+    assert len(agent.get_conversation_history("a")) > len(before)
+
+    assert agent.discard_turn("a", "j1") > 0
+    assert agent.get_conversation_history("a") == before
+    assert agent.memory.thread_info("a")["message_count"] == len(before)
@@ -0,0 +1,96 @@
+"""Pruebas del orquestador: orden de entrega, pool acotado, caché de planes y streaming del grafo."""
+
+import asyncio
+
+from langchain_core.messages import AIMessage
+
+from workflows.orchestrator import Orchestrator, PlanCache, Section, Sections, build_orchestrator_graph
+
+
+class Planner:
+    """Planificador falso que cuenta sus llamadas."""
+
+    def __init__(self, sections):
+        self.sections = sections
+        self.calls = 0
+
+    async def ainvoke(self, messages):
+        self.calls += 1
+        return Sections(sections=self.sections)
+
+
+class SectionWriter:
+    """Modelo falso: cada sección tarda lo indicado y se registra la concurrencia máxima."""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.planner = Planner([Section(name=name, description=name) for name in delays])
+        self.running = 0
+        self.max_running = 0
+
+    def with_structured_output(self, schema):
+        return self.planner
+
+    async def ainvoke(self, messages):
+        name = next(name for name in self.delays if f"sección: {name} " in messages[-1].content)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(self.delays[name])
+        finally:
+            self.running -= 1
+        return AIMessage(content=f"contenido de {name}")
+
+
+async def collect(orchestrator, topic):
+    return [result async for result in orchestrator.stream(topic)]
+
+
+def test_sections_are_delivered_in_plan_order():
+    llm = SectionWriter({"lenta": 0.05, "media": 0.02, "rapida": 0.0})
+
+    results = asyncio.run(collect(Orchestrator(llm, max_workers=3), "gatos"))
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.content for r in results] == ["contenido de lenta", "contenido de media", "contenido de rapida"]
+
+
+def test_worker_pool_is_bounded():
+    llm = SectionWriter({f"s{i}": 0.01 for i in range(6)})
+
+    results = asyncio.run(collect(Orchestrator(llm, max_workers=2), "gatos"))
+
+    assert len(results) == 6 and llm.max_running == 2
+
+
+def test_plan_cache_reuses_plans_for_equivalent_topics():
+    llm = SectionWriter({"a": 0.0})
+    cache = PlanCache()
+    orchestrator = Orchestrator(llm, plan_cache=cache)
+
+    asyncio.run(collect(orchestrator, "Leyes de escalado"))
+    asyncio.run(collect(orchestrator, "  leyes DE   escalado "))
+
+    assert llm.planner.calls == 1
+    assert cache.hits == 1 and cache.misses == 1
+
+
+def test_graph_streams_sections_before_the_synthesizer():
+    llm = SectionWriter({"a": 0.02, "b": 0.0})
+    graph = build_orchestrator_graph(llm, max_workers=2)
+
+    async def scenario():
+        return [
+            item async for item in graph.astream({"topic": "gatos"}, stream_mode=["updates", "custom"])
+        ]
+
+    events = asyncio.run(scenario())
+
+    custom = [chunk for mode, chunk in events if mode == "custom"]
+    assert [c["name"] for c in custom] == ["a", "b"]
+    assert custom[0]["report"] == "contenido de a"
+    assert custom[-1]["report"].endswith("contenido de b")
+    # Las secciones llegan antes de que termine el nodo de trabajadores
+    first_update = next(i for i, (mode, chunk) in enumerate(events) if mode == "updates" and "workers" in chunk)
+    assert all(i < first_update for i, (mode, _) in enumerate(events) if mode == "custom")
+    assert events[-1][1]["synthesizer"]["final_report"] == custom[-1]["report"]
@@ -0,0 +1,75 @@
+"""Pruebas del fan-out asíncrono: resultados parciales y ejecución de todo o nada."""
+
+import asyncio
+
+from workflows.parallel import FanOut, FanOutError
+
+
+def branch(delay, fail=False):
+    async def run(inputs):
+        await asyncio.sleep(delay)
+        if fail:
+            raise RuntimeError("rama fallida")
+        return f"{inputs['topic']} {delay}"
+    return run
+
+
+async def consume(fan_out):
+    received = []
+    try:
+        async for result in fan_out.stream({"topic": "gatos"}):
+            received.append(result.name)
+    except FanOutError as e:
+        return received, e
+    return received, None
+
+
+def test_partial_results_are_streamed_as_they_finish():
+    fan_out = FanOut({"rapida": branch(0.01), "fallida": branch(0.02, fail=True), "lenta": branch(0.05)})
+
+    received, error = asyncio.run(consume(fan_out))
+
+    assert received == ["rapida", "fallida", "lenta"] and error is None
+
+
+def test_all_or_nothing_run_yields_nothing_when_a_branch_fails():
+    fan_out = FanOut(
+        {"rapida": branch(0.01), "fallida": branch(0.02, fail=True), "lenta": branch(0.05)},
+        allow_partial=False,
+    )
+
+    received, error = asyncio.run(consume(fan_out))
+
+    assert received == []
+    assert error.results["fallida"].status == "error" and error.results["rapida"].status == "ok"
+
+
+def test_all_or_nothing_run_yields_every_result_in_completion_order():
+    fan_out = FanOut({"lenta": branch(0.05), "rapida": branch(0.01)}, allow_partial=False)
+
+    received, error = asyncio.run(consume(fan_out))
+
+    assert received == ["rapida", "lenta"] and error is None
+
+
+def test_closing_the_stream_cancels_pending_branches():
+    cancelled = []
+
+    async def slow(inputs):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    fan_out = FanOut({"rapida": branch(0.01), "lenta": slow})
+
+    async def first_only():
+        stream = fan_out.stream({"topic": "gatos"})
+        first = await stream.__anext__()
+        await stream.aclose()
+        await asyncio.sleep(0.05)
+        return first.name
+
+    assert asyncio.run(first_only()) == "rapida"
+    assert cancelled == [True]
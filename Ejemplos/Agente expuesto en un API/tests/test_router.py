@@ -0,0 +1,73 @@
+"""Pruebas del enrutador especulativo: presupuesto por solicitud y decisiones inválidas."""
+
+import asyncio
+
+from workflows.fake_llm import FakeChatModel
+from workflows.router import Route, SpeculativeRouter, build_router_graph
+
+
+class FixedRouter:
+    """Enrutador simulado que tarda delay segundos y devuelve siempre la misma decisión."""
+
+    def __init__(self, decision, delay=0.05):
+        self.decision = decision
+        self.delay = delay
+
+    async def ainvoke(self, messages):
+        await asyncio.sleep(self.delay)
+        return None if self.decision is None else Route(step=self.decision)
+
+
+def branches(delay):
+    async def branch(text):
+        await asyncio.sleep(delay)
+        return text.upper()
+    return {"story": branch, "joke": branch, "poem": branch}
+
+
+def test_wasted_call_budget_applies_to_each_request():
+    # "story" es la rama más probable a priori, pero el enrutador elige "joke"
+    router = SpeculativeRouter(
+        FixedRouter("joke"), branches(1.0), speculate=2, max_wasted_calls=1,
+        priors={"story": 10.0, "joke": 0.0, "poem": 0.0},
+    )
+
+    async def requests():
+        return [await router.ainvoke("gatos") for _ in range(3)]
+
+    results = asyncio.run(requests())
+
+    assert all(result.decision == "joke" and result.output == "GATOS" for result in results)
+    # Cada solicitud sigue especulando una rama aunque las anteriores la desperdiciaran
+    assert router.stats.speculated["story"] == 3
+    assert router.stats.wasted_calls == 3
+
+
+def test_finished_losing_branch_is_not_a_wasted_call():
+    router = SpeculativeRouter(
+        FixedRouter("joke", delay=0.2), branches(0.0), speculate=1, priors={"story": 10.0},
+    )
+
+    asyncio.run(router.ainvoke("gatos"))
+
+    summary = router.stats.summary()
+    assert summary["wasted_calls"] == 0
+    assert summary["discarded_outputs"] == 1
+
+
+def test_missing_decision_falls_back_to_the_most_likely_branch():
+    router = SpeculativeRouter(FixedRouter(None), branches(0.0), speculate=1, priors={"poem": 10.0})
+
+    result = asyncio.run(router.ainvoke("gatos"))
+
+    assert result.decision == "poem" and result.speculative_hit
+    assert router.stats.invalid_decisions == 1
+
+
+def test_served_router_graph_speculates_by_default():
+    graph = build_router_graph(FakeChatModel())
+
+    output = asyncio.run(graph.ainvoke({"input": "Cuéntame un chiste"}))
+
+    assert output["output"]
+    assert sum(graph.router_stats.speculated.values()) == 1
@@ -0,0 +1,65 @@
+"""Pruebas del presupuesto de tokens por llamada al modelo (max_prompt_tokens)."""
+
+import asyncio
+
+import pytest
+from langchain_core.messages import HumanMessage
+
+from agente.memory_agent import MemoryAgent
+from agente.tokens import TokenBudgetExceeded, count_message_tokens, fit_to_budget
+from workflows.fake_llm import FakeChatModel
+
+
+def history_types(agent, thread_id):
+    return [message["type"] for message in agent.get_conversation_history(thread_id)]
+
+
+def budget_for_first_call(agent, thread_id, text):
+    """Presupuesto en el que cabe la primera llamada del turno pero no la siguiente."""
+    prompt = [agent.system_message, HumanMessage(content=text)]
+    if agent.budget_policy == "reject":
+        # Sin recorte el prompt incluye todo el historial
+        history = agent.graph.get_state({"configurable": {"thread_id": thread_id}}).values.get("messages", [])
+        prompt[1:1] = history
+    return count_message_tokens(prompt) + 2
+
+
+@pytest.mark.parametrize("policy", ["reject", "trim"])
+def test_budget_exceeded_inside_the_loop_rolls_back_the_turn(policy):
+    agent = MemoryAgent(llm=FakeChatModel(), budget_policy=policy)
+    agent.chat("hola", "t")
+    before = history_types(agent, "t")
+
+    text = "suma 2 y 3"
+    with pytest.raises(TokenBudgetExceeded):
+        # La primera llamada pide la herramienta; la segunda ya no cabe
+        agent.chat(text, "t", max_prompt_tokens=budget_for_first_call(agent, "t", text))
+
+    assert history_types(agent, "t") == before
+    assert agent.memory.thread_info("t")["message_count"] == len(before)
+    # El hilo sigue siendo utilizable: no quedaron llamadas a herramientas sin respuesta
+    assert agent.chat(text, "t")["response"]
+
+
+def test_budget_exceeded_in_first_turn_removes_the_thread():
+    agent = MemoryAgent(llm=FakeChatModel(), budget_policy="reject")
+    text = "suma 2 y 3"
+
+    async def turn():
+        await agent.achat(text, "nuevo", max_prompt_tokens=budget_for_first_call(agent, "nuevo", text))
+
+    with pytest.raises(TokenBudgetExceeded):
+        asyncio.run(turn())
+    assert agent.memory.thread_info("nuevo") is None
+    assert history_types(agent, "nuevo") == []
+
+
+def test_fit_to_budget_trims_oldest_turns():
+    system = MemoryAgent(llm=FakeChatModel()).system_message
+    messages = [system, HumanMessage(content="x" * 400), HumanMessage(content="último")]
+    budget = count_message_tokens([system, messages[-1]]) + 5
+
+    prompt = fit_to_budget(messages, budget, "trim")
+    assert [m.content for m in prompt[1:]] == ["último"]
+    with pytest.raises(TokenBudgetExceeded):
+        fit_to_budget(messages, budget, "reject")
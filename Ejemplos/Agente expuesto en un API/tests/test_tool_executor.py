@@ -0,0 +1,92 @@
+"""Pruebas del pool de procesos de ToolExecutor: plazos, reinicios y reintentos."""
+
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from langchain_core.tools import ToolException
+
+from tool.executor import ToolExecutor, ToolLimitExceeded, ToolLimits
+
+
+# Las funciones se ejecutan en procesos hijos (spawn): deben poder importarse desde este módulo
+def wait_and_return(seconds: float, value: int) -> int:
+    time.sleep(seconds)
+    return value
+
+
+def crash(value: int) -> int:
+    """
+    Termina el proceso que la ejecuta.
+
+    Args:
+        value: Valor ignorado.
+    """
+    os._exit(1)
+
+
+@pytest.fixture
+def executor():
+    # inline_max_digits=0: toda llamada a una herramienta aislada va al pool
+    executor = ToolExecutor(
+        limits=ToolLimits(timeout=5.0, inline_max_digits=0),
+        isolated={"wait_and_return", "crash"},
+    )
+    yield executor
+    executor.shutdown()
+
+
+def test_call_survives_a_restart_caused_by_another_request(executor):
+    async def scenario():
+        call = asyncio.ensure_future(executor.arun("wait_and_return", wait_and_return, {"seconds": 0.5, "value": 7}))
+        await asyncio.sleep(0.2)
+        # Lo que hace el plazo o la cancelación de otra petición
+        executor._restart_pool(executor._pool)
+        return await call
+
+    result, artifact = asyncio.run(scenario())
+
+    assert result == 7 and artifact["mode"] == "process"
+    assert executor.stats["pool_restarts"] == 1
+    assert executor.stats["retries"] == 1
+
+
+def test_sync_call_survives_a_restart_caused_by_another_request(executor):
+    results = []
+    call = threading.Thread(
+        target=lambda: results.append(executor.run("wait_and_return", wait_and_return, {"seconds": 0.5, "value": 3}))
+    )
+    call.start()
+    time.sleep(0.2)
+    executor._restart_pool(executor._pool)
+    call.join()
+
+    assert results[0][0] == 3
+    assert executor.stats["retries"] == 1
+
+
+def test_timeout_restarts_the_pool_and_fails_only_that_call():
+    executor = ToolExecutor(limits=ToolLimits(timeout=0.3, inline_max_digits=0), isolated={"wait_and_return"})
+    try:
+        with pytest.raises(ToolLimitExceeded):
+            executor.run("wait_and_return", wait_and_return, {"seconds": 5, "value": 1})
+        assert executor.stats["timeouts"] == 1 and executor.stats["pool_restarts"] == 1
+        # El pool nuevo atiende las llamadas siguientes
+        assert executor.run("wait_and_return", wait_and_return, {"seconds": 0, "value": 2})[0] == 2
+    finally:
+        executor.shutdown()
+
+
+def test_crashing_tool_becomes_a_tool_error(executor):
+    tool = executor.wrap(crash)
+
+    with pytest.raises(ToolException):
+        executor.run("crash", crash, {"value": 1})
+    assert executor.stats["retries"] == executor.pool_attempts - 1
+
+    # handle_tool_error convierte el fallo en el contenido del ToolMessage
+    message = tool.invoke({"type": "tool_call", "name": "crash", "args": {"value": 1}, "id": "1"})
+    assert "no pudo completarse" in message.content
@@ -0,0 +1,104 @@
+"""Pruebas de los presupuestos del ciclo ReAct: rondas, llamadas a herramientas y tiempo."""
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agente.memory_agent import MemoryAgent
+from agente.turn_budget import DEFAULT_RECURSION_LIMIT, TurnBudget
+from workflows.fake_llm import FakeChatModel
+
+
+class LoopingModel(FakeChatModel):
+    """Modelo confundido: mientras tenga herramientas pide calls_per_step llamadas a add."""
+
+    calls_per_step: int = 1
+
+    def _respond(self, messages, tools=None):
+        if not tools or self.calls_per_step == 0:
+            return super()._respond(messages, tools)
+        step = sum(1 for message in messages if message.type == "ai")
+        return AIMessage(content="", tool_calls=[
+            {"name": "add", "args": {"a": step, "b": i}, "id": f"call_{step}_{i}"}
+            for i in range(self.calls_per_step)
+        ])
+
+
+def turn_messages(agent, thread_id):
+    state = agent.graph.get_state({"configurable": {"thread_id": thread_id}})
+    return state.values["messages"]
+
+
+def is_skipped(message):
+    """Resultado de una herramienta que no se ejecutó por falta de presupuesto."""
+    return isinstance(message.artifact, dict) and message.artifact.get("mode") == "skipped"
+
+
+def assert_every_tool_call_answered(messages):
+    calls = {call["id"] for message in messages if message.type == "ai" for call in message.tool_calls}
+    answered = {message.tool_call_id for message in messages if message.type == "tool"}
+    assert calls == answered
+
+
+def test_step_budget_ends_the_turn_with_a_final_answer():
+    agent = MemoryAgent(llm=LoopingModel(), turn_budget=TurnBudget(max_steps=3))
+
+    response = agent.chat("suma 1 y 2", "t")
+
+    messages = turn_messages(agent, "t")
+    executed = [m for m in messages if m.type == "tool" and not is_skipped(m)]
+    skipped = [m for m in messages if m.type == "tool" and is_skipped(m)]
+    assert response["budget_exhausted"] == "steps"
+    assert len(executed) == 3 and len(skipped) == 1
+    assert messages[-1].type == "ai" and not messages[-1].tool_calls
+    assert_every_tool_call_answered(messages)
+
+
+def test_more_steps_than_the_default_recursion_limit():
+    max_steps = DEFAULT_RECURSION_LIMIT
+    agent = MemoryAgent(llm=LoopingModel(), turn_budget=TurnBudget(max_steps=max_steps))
+
+    response = agent.chat("suma 1 y 2", "t")
+
+    assert response["budget_exhausted"] == "steps"
+    assert sum(1 for m in turn_messages(agent, "t") if m.type == "tool") == max_steps + 1
+
+
+def test_tool_call_budget_never_runs_half_a_round():
+    agent = MemoryAgent(llm=LoopingModel(calls_per_step=3))
+
+    response = agent.chat("suma 1 y 2", "t", max_tool_calls=4)
+
+    messages = turn_messages(agent, "t")
+    executed = [m for m in messages if m.type == "tool" and not is_skipped(m)]
+    assert response["budget_exhausted"] == "tool_calls"
+    # La segunda ronda (6 llamadas en total) supera el presupuesto: no se ejecuta ninguna
+    assert len(executed) == 3
+    assert_every_tool_call_answered(messages)
+
+
+def test_time_budget_stops_starting_rounds():
+    agent = MemoryAgent(llm=LoopingModel(latency=0.1))
+
+    response = agent.chat("suma 1 y 2", "t", max_seconds=0.05)
+
+    assert response["budget_exhausted"] == "time"
+    assert not any(m.type == "tool" and not is_skipped(m) for m in turn_messages(agent, "t"))
+
+
+def test_turn_without_exhausted_budget_reports_none_and_thread_continues():
+    agent = MemoryAgent(llm=FakeChatModel(), turn_budget=TurnBudget(max_steps=3))
+
+    assert agent.chat("suma 1 y 2", "t")["budget_exhausted"] is None
+    assert agent.chat("hola", "t")["budget_exhausted"] is None
+    assert len(turn_messages(agent, "t")) == 8
+
+
+def test_request_limits_override_the_defaults():
+    defaults = TurnBudget(max_steps=5, max_seconds=20)
+
+    budget = defaults.start(max_tool_calls=3, max_steps=1)
+
+    assert budget.as_dict() == {"max_steps": 1, "max_tool_calls": 3, "max_seconds": 20, "max_tokens": None}
+    assert TurnBudget(max_steps=20).recursion_limit == 43
+    with pytest.raises(ValueError):
+        TurnBudget(max_seconds=0)
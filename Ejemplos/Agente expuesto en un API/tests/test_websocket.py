@@ -0,0 +1,21 @@
+"""Pruebas de la sesión WebSocket: tramas no textuales y keepalive."""
+
+from fastapi.testclient import TestClient
+
+from agente.memory_agent import MemoryAgent
+from app import main
+from workflows.fake_llm import FakeChatModel
+
+
+def test_binary_frames_get_an_error_and_keep_the_session(monkeypatch):
+    monkeypatch.setattr(main, "agent", MemoryAgent(llm=FakeChatModel()))
+    client = TestClient(main.app)
+
+    with client.websocket_connect("/ws/chat/t") as websocket:
+        websocket.send_bytes(b"\x00\x01")
+        error = websocket.receive_json()
+        websocket.send_json({"type": "ping"})
+        pong = websocket.receive_json()
+
+    assert error["type"] == "error" and error["status"] == 400
+    assert pong == {"type": "pong"}
@@ -0,0 +1,296 @@
+"""
+Ejecución aislada de herramientas en un pool de procesos.
+
+ToolNode ejecuta las herramientas dentro del proceso del servidor: un multiply con dos
+enteros enormes propuestos por el modelo ocupa la CPU y bloquea al trabajador. ToolExecutor:
+- Rechaza operandos con demasiados dígitos antes de ejecutar nada
+- Ejecuta en línea las llamadas triviales (herramientas ligeras u operandos pequeños)
+- Envía el resto a un pool de procesos precalentado, con tiempo límite por llamada
+- Limita el tamaño del resultado dentro del proceso hijo, antes de serializarlo
+- Al agotarse el tiempo o cancelarse la llamada, termina los procesos del pool y lo
+  recrea, de modo que el cálculo no sigue consumiendo CPU
+- Reintenta en el pool nuevo las llamadas de otras peticiones que se perdieron al
+  terminarse el pool (hasta pool_attempts veces)
+- Informa el modo de ejecución ("inline" o "process") como artefacto del ToolMessage
+"""
+
+import asyncio
+import concurrent.futures
+import multiprocessing
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from langchain_core.tools import StructuredTool, ToolException
+
+
+# log10(2): dígitos decimales por bit de un entero
+_DIGITS_PER_BIT = 0.30103
+
+
+@dataclass
+class ToolLimits:
+    """Límites de ejecución de las herramientas."""
+    timeout: float = 2.0
+    max_operand_digits: int = 1000
+    max_result_digits: int = 10000
+    inline_max_digits: int = 18
+
+
+class ToolLimitExceeded(ToolException):
+    """Se lanza cuando una llamada supera alguno de los límites configurados."""
+
+
+def _digits(value: Any) -> int:
+    """Número aproximado de dígitos decimales de un operando o resultado numérico."""
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, int):
+        return int(abs(value).bit_length() * _DIGITS_PER_BIT) + 1
+    if isinstance(value, str):
+        return len(value)
+    return 1
+
+
+def _call_limited(fn: Callable, kwargs: Dict[str, Any], max_result_digits: int) -> Any:
+    """Ejecuta la herramienta en el proceso hijo y valida el tamaño del resultado."""
+    result = fn(**kwargs)
+    if _digits(result) > max_result_digits:
+        raise ToolLimitExceeded(
+            f"El resultado tiene más de {max_result_digits} dígitos"
+        )
+    return result
+
+
+def _warm_up() -> bool:
+    return True
+
+
+class ToolExecutor:
+    """
+    Ejecutor de herramientas con límites y pool de procesos.
+
+    Ejemplo:
+        executor = ToolExecutor(isolated={"multiply"})
+        tools = executor.wrap_tools(AVAILABLE_TOOLS)
+        agent = MemoryAgent(tool_executor=executor)
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        limits: Optional[ToolLimits] = None,
+        isolated: Iterable[str] = ("multiply",),
+        pool_attempts: int = 3,
+    ):
+        """
+        Inicializa el ejecutor y precalienta el pool.
+
+        Args:
+            max_workers: Procesos del pool.
+            limits: Límites de ejecución. Por defecto ToolLimits().
+            isolated: Herramientas costosas o no confiables que se ejecutan en el pool
+                     cuando sus operandos no son triviales.
+            pool_attempts: Veces que se envía una llamada al pool cuando este se termina
+                          (por el plazo de otra llamada o porque un proceso murió)
+                          antes de que la llamada termine.
+        """
+        self.max_workers = max_workers
+        self.limits = limits or ToolLimits()
+        self.isolated = set(isolated)
+        self.pool_attempts = max(1, pool_attempts)
+        self.stats = {
+            "inline": 0, "process": 0, "timeouts": 0, "rejected": 0, "pool_restarts": 0, "retries": 0,
+        }
+        self._context = multiprocessing.get_context("spawn")
+        self._pool_lock = threading.Lock()
+        self._closed = False
+        self._pool, self._ready = self._new_pool()
+        concurrent.futures.wait(self._ready)
+
+    def _new_pool(self) -> Tuple[concurrent.futures.ProcessPoolExecutor, List[concurrent.futures.Future]]:
+        """
+        Crea un pool y pide el arranque de sus procesos sin esperarlo.
+
+        Returns:
+            Tupla (pool, futures del arranque). Las llamadas esperan esos futures antes de
+            enviarse, para que el arranque no consuma su tiempo límite.
+        """
+        pool = concurrent.futures.ProcessPoolExecutor(self.max_workers, mp_context=self._context)
+        return pool, [pool.submit(_warm_up) for _ in range(self.max_workers)]
+
+    def _restart_pool(self, broken: concurrent.futures.ProcessPoolExecutor) -> None:
+        """
+        Termina los procesos de un pool (el cálculo en curso no se puede interrumpir) y lo recrea.
+
+        Las llamadas de otras peticiones que estaban en ese pool fallan con
+        BrokenProcessPool o quedan canceladas; _call_in_pool las reenvía al pool nuevo.
+        El arranque de los procesos nuevos no se espera con el candado tomado.
+        """
+        with self._pool_lock:
+            if self._pool is not broken or self._closed:
+                return
+            for process in list((broken._processes or {}).values()):
+                process.terminate()
+            broken.shutdown(wait=False, cancel_futures=True)
+            self.stats["pool_restarts"] += 1
+            self._pool, self._ready = self._new_pool()
+
+    def shutdown(self) -> None:
+        """Detiene el pool de procesos."""
+        with self._pool_lock:
+            self._closed = True
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def mode_for(self, name: str, kwargs: Dict[str, Any]) -> str:
+        """
+        Decide dónde se ejecuta una llamada.
+
+        Returns:
+            "inline" para herramientas ligeras u operandos pequeños, "process" en otro caso.
+
+        Raises:
+            ToolLimitExceeded: Si algún operando supera max_operand_digits.
+        """
+        digits = max((_digits(value) for value in kwargs.values()), default=0)
+        if digits > self.limits.max_operand_digits:
+            self.stats["rejected"] += 1
+            raise ToolLimitExceeded(
+                f"Los operandos de {name} no pueden superar {self.limits.max_operand_digits} dígitos"
+            )
+        if name not in self.isolated or digits <= self.limits.inline_max_digits:
+            return "inline"
+        return "process"
+
+    def _current_pool(self) -> Tuple[concurrent.futures.ProcessPoolExecutor, List[concurrent.futures.Future]]:
+        with self._pool_lock:
+            return self._pool, self._ready
+
+    def _submit(
+        self, pool: concurrent.futures.ProcessPoolExecutor, fn: Callable, kwargs: Dict[str, Any]
+    ) -> concurrent.futures.Future:
+        try:
+            return pool.submit(_call_limited, fn, kwargs, self.limits.max_result_digits)
+        except RuntimeError:
+            # El pool se terminó o se rompió antes del envío: se trata como una llamada perdida
+            future = concurrent.futures.Future()
+            future.cancel()
+            return future
+
+    def _timeout_error(self, name: str) -> ToolLimitExceeded:
+        self.stats["timeouts"] += 1
+        return ToolLimitExceeded(f"{name} superó el tiempo límite de {self.limits.timeout:.1f}s")
+
+    @staticmethod
+    def _lost(future: concurrent.futures.Future) -> bool:
+        """La llamada no terminó porque su pool se terminó o se rompió."""
+        return future.cancelled() or isinstance(future.exception(), BrokenProcessPool)
+
+    def _retry_or_fail(self, name: str, pool: concurrent.futures.ProcessPoolExecutor, attempt: int) -> None:
+        """Recrea el pool perdido si sigue siendo el actual y decide si la llamada se reintenta."""
+        self._restart_pool(pool)
+        if attempt + 1 >= self.pool_attempts:
+            raise ToolException(
+                f"{name} no pudo completarse: el pool de procesos se reinició {self.pool_attempts} veces"
+            )
+        self.stats["retries"] += 1
+
+    def _call_in_pool(self, name: str, fn: Callable, kwargs: Dict[str, Any]) -> Any:
+        for attempt in range(self.pool_attempts):
+            pool, ready = self._current_pool()
+            concurrent.futures.wait(ready)
+            future = self._submit(pool, fn, kwargs)
+            concurrent.futures.wait([future], timeout=self.limits.timeout)
+            if not future.done():
+                self._restart_pool(pool)
+                raise self._timeout_error(name)
+            if not self._lost(future):
+                return future.result()
+            self._retry_or_fail(name, pool, attempt)
+
+    async def _acall_in_pool(self, name: str, fn: Callable, kwargs: Dict[str, Any]) -> Any:
+        for attempt in range(self.pool_attempts):
+            pool, ready = self._current_pool()
+            await asyncio.wait([asyncio.wrap_future(warm) for warm in ready])
+            future = self._submit(pool, fn, kwargs)
+            try:
+                # wait no propaga la cancelación de future (pool terminado por otra petición)
+                await asyncio.wait({asyncio.wrap_future(future)}, timeout=self.limits.timeout)
+            except asyncio.CancelledError:
+                if not future.cancel():
+                    await asyncio.shield(asyncio.to_thread(self._restart_pool, pool))
+                raise
+            if not future.done():
+                await asyncio.to_thread(self._restart_pool, pool)
+                raise self._timeout_error(name)
+            if not self._lost(future):
+                return future.result()
+            await asyncio.to_thread(self._retry_or_fail, name, pool, attempt)
+
+    def run(self, name: str, fn: Callable, kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Ejecuta una herramienta respetando los límites.
+
+        Args:
+            name: Nombre de la herramienta.
+            fn: Función de la herramienta (debe poder importarse desde el proceso hijo).
+            kwargs: Argumentos de la llamada.
+
+        Returns:
+            Tupla (resultado, artefacto con el modo de ejecución y la duración).
+
+        Raises:
+            ToolLimitExceeded: Si se supera algún límite.
+            ToolException: Si el pool se terminó pool_attempts veces durante la llamada.
+        """
+        start = time.perf_counter()
+        mode = self.mode_for(name, kwargs)
+        self.stats[mode] += 1
+        if mode == "inline":
+            result = _call_limited(fn, kwargs, self.limits.max_result_digits)
+        else:
+            result = self._call_in_pool(name, fn, kwargs)
+        return result, {"mode": mode, "seconds": round(time.perf_counter() - start, 6)}
+
+    async def arun(self, name: str, fn: Callable, kwargs: Dict[str, Any]) -> Tuple[Any, Dict[str, Any]]:
+        """Versión asíncrona de run; si la tarea se cancela también se detiene el cálculo."""
+        start = time.perf_counter()
+        mode = self.mode_for(name, kwargs)
+        self.stats[mode] += 1
+        if mode == "inline":
+            result = _call_limited(fn, kwargs, self.limits.max_result_digits)
+        else:
+            result = await self._acall_in_pool(name, fn, kwargs)
+        return result, {"mode": mode, "seconds": round(time.perf_counter() - start, 6)}
+
+    def wrap(self, fn: Callable) -> StructuredTool:
+        """
+        Convierte una función en una herramienta que se ejecuta con este ejecutor.
+
+        La herramienta conserva el nombre, la descripción y el esquema de argumentos de la
+        función, y devuelve el modo de ejecución como artefacto del ToolMessage.
+        """
+        base = StructuredTool.from_function(fn, parse_docstring=True)
+        name = base.name
+
+        def run(**kwargs):
+            return self.run(name, fn, kwargs)
+
+        async def arun(**kwargs):
+            return await self.arun(name, fn, kwargs)
+
+        return StructuredTool(
+            name=name,
+            description=base.description,
+            args_schema=base.args_schema,
+            func=run,
+            coroutine=arun,
+            response_format="content_and_artifact",
+            handle_tool_error=True,
+        )
+
+    def wrap_tools(self, tools: Iterable[Callable]) -> List[StructuredTool]:
+        """Convierte una lista de funciones con wrap."""
+        return [self.wrap(fn) for fn in tools]
@@ -0,0 +1,222 @@
+"""
+Encadenamiento de prompts con checkpoints y memorización (flujo "2 Encadenamiento de Prompts").
+
+En el flujo original el grafo se compila sin checkpointer: si polish_joke falla, al
+reintentar se vuelve a ejecutar todo desde generate_joke.
+
+- El grafo se compila con un checkpointer y cada ejecución usa su propio hilo, por lo
+  que tras un fallo ChainRunner retoma desde el último nodo completado
+- StepCache memoriza los pasos puros por el hash de las claves del estado que leen, de
+  modo que las ejecuciones repetidas solo pagan por los pasos cuya entrada cambió
+"""
+
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Iterable
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph, START, END
+from agente.checkpointer import CompactMemorySaver
+
+
+class StepCache:
+    """
+    Caché LRU de resultados de pasos del grafo.
+
+    La clave es el nombre del paso más el hash de las claves del estado que el paso lee.
+    """
+
+    def __init__(self, max_entries: int = 1024):
+        """
+        Inicializa la caché.
+
+        Args:
+            max_entries: Número máximo de resultados almacenados.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._results: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(step: str, inputs: Dict[str, Any]) -> str:
+        payload = json.dumps([step, inputs], sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def memoize(self, step: str, fn: Callable, reads: Iterable[str]) -> Callable:
+        """
+        Envuelve un nodo para reutilizar su resultado cuando su entrada no cambia.
+
+        Args:
+            step: Nombre del paso.
+            fn: Nodo a envolver (recibe el estado y devuelve la actualización).
+            reads: Claves del estado de las que depende el resultado del nodo.
+
+        Returns:
+            Nodo memorizado.
+        """
+        reads = tuple(reads)
+
+        @functools.wraps(fn)
+        def wrapper(state):
+            key = self.key(step, {name: state.get(name) for name in reads})
+            with self._lock:
+                if key in self._results:
+                    self.hits += 1
+                    self._results.move_to_end(key)
+                    return dict(self._results[key])
+                self.misses += 1
+
+            result = fn(state)
+
+            with self._lock:
+                self._results[key] = dict(result)
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+            return result
+
+        return wrapper
+
+    def clear(self) -> None:
+        """Elimina todos los resultados memorizados."""
+        with self._lock:
+            self._results.clear()
+
+
+class ChainRunner:
+    """
+    Ejecuta un grafo compilado con checkpointer y retoma las ejecuciones fallidas.
+
+    Ejemplo:
+        runner = ChainRunner(build_chain_graph(llm))
+        try:
+            state = runner.run({"topic": "aviones"})
+        except Exception:
+            state = runner.run({"topic": "aviones"})  # retoma desde el último paso completado
+    """
+
+    def __init__(self, graph):
+        """
+        Inicializa el ejecutor.
+
+        Args:
+            graph: Grafo compilado con checkpointer.
+        """
+        if graph.checkpointer is None:
+            raise ValueError("El grafo debe compilarse con un checkpointer para poder reanudarse")
+        self.graph = graph
+
+    @staticmethod
+    def run_id_for(inputs: Dict[str, Any]) -> str:
+        """Identificador determinista de una ejecución a partir de sus entradas."""
+        payload = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return "chain_" + hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+    def status(self, run_id: str) -> Dict[str, Any]:
+        """
+        Consulta el estado de una ejecución.
+
+        Args:
+            run_id: Identificador de la ejecución.
+
+        Returns:
+            Si existe, si terminó, los pasos pendientes y los valores del estado.
+        """
+        snapshot = self.graph.get_state({"configurable": {"thread_id": run_id}})
+        exists = snapshot.created_at is not None
+        return {
+            "run_id": run_id,
+            "exists": exists,
+            "completed": exists and not snapshot.next,
+            "next": list(snapshot.next),
+            "values": snapshot.values,
+        }
+
+    def run(self, inputs: Dict[str, Any], run_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Ejecuta la cadena o retoma una ejecución incompleta.
+
+        - Si la ejecución ya terminó se devuelve su estado final sin llamar al LLM
+        - Si falló a mitad de camino se continúa desde el último nodo completado
+        - Si no existe se inicia con las entradas dadas
+
+        Args:
+            inputs: Entradas de la cadena.
+            run_id: Identificador de la ejecución. Por defecto se deriva de las entradas,
+                   así repetir la misma llamada retoma o reutiliza la ejecución previa.
+
+        Returns:
+            Estado final de la cadena.
+        """
+        run_id = run_id or self.run_id_for(inputs)
+        config = {"configurable": {"thread_id": run_id}}
+        current = self.status(run_id)
+
+        if current["completed"]:
+            return current["values"]
+        if current["exists"]:
+            return self.graph.invoke(None, config)
+        return self.graph.invoke(inputs, config)
+
+
+class State(TypedDict):
+    """Estado del grafo de encadenamiento."""
+    topic: str
+    joke: str
+    improved_joke: str
+    final_joke: str
+
+
+def build_chain_graph(llm, checkpointer=None, cache: Optional[StepCache] = None):
+    """
+    Construye la cadena generate_joke → check_punchline → improve_joke → polish_joke.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+        checkpointer: Checkpointer donde se guarda cada paso. Por defecto CompactMemorySaver.
+        cache: Caché de pasos, compartible entre grafos. Por defecto se crea una propia.
+
+    Returns:
+        Grafo compilado con checkpointer (usar con ChainRunner).
+    """
+    cache = cache if cache is not None else StepCache()
+
+    def generate_joke(state: State):
+        """Primera llamada al LLM para generar un chiste inicial."""
+        msg = llm.invoke(f"Escribe un chiste corto sobre {state['topic']}")
+        return {"joke": msg.content}
+
+    def check_punchline(state: State):
+        """Compuerta: el chiste pasa si tiene un remate (signo de exclamación)."""
+        if "!" in state["joke"]:
+            return "Pass"
+        return "Fail"
+
+    def improve_joke(state: State):
+        """Segunda llamada al LLM para mejorar el chiste."""
+        msg = llm.invoke(f"Haz este chiste más divertido agregando juegos de palabras: {state['joke']}")
+        return {"improved_joke": msg.content}
+
+    def polish_joke(state: State):
+        """Tercera llamada al LLM para el pulido final."""
+        msg = llm.invoke(f"Agrega un giro sorprendente a este chiste: {state['improved_joke']}")
+        return {"final_joke": msg.content}
+
+    workflow = StateGraph(State)
+    workflow.add_node("generate_joke", cache.memoize("generate_joke", generate_joke, ["topic"]))
+    workflow.add_node("improve_joke", cache.memoize("improve_joke", improve_joke, ["joke"]))
+    workflow.add_node("polish_joke", cache.memoize("polish_joke", polish_joke, ["improved_joke"]))
+
+    workflow.add_edge(START, "generate_joke")
+    workflow.add_conditional_edges(
+        "generate_joke", check_punchline, {"Fail": "improve_joke", "Pass": END}
+    )
+    workflow.add_edge("improve_joke", "polish_joke")
+    workflow.add_edge("polish_joke", END)
+
+    graph = workflow.compile(checkpointer=checkpointer or CompactMemorySaver())
+    graph.step_cache = cache
+    return graph
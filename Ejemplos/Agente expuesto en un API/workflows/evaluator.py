@@ -0,0 +1,263 @@
+"""
+Evaluador-optimizador con generación best-of-N (flujo "6 evaluador-optimizador").
+
+En el flujo original cada vuelta genera un solo chiste y lo evalúa con otra llamada,
+sin límite de vueltas: un evaluador exigente puede mantener el ciclo indefinidamente.
+
+EvaluatorOptimizer:
+- Genera N candidatos en paralelo por ronda
+- Los califica con una sola llamada al evaluador por ronda
+- Se detiene en el primer candidato aceptado
+- Impone un máximo de rondas y un presupuesto de tiempo
+- Memoriza las calificaciones de candidatos repetidos
+"""
+
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Dict, Optional
+from pydantic import BaseModel, Field
+from typing_extensions import Literal, TypedDict
+from langgraph.graph import StateGraph, START, END
+
+
+class Feedback(BaseModel):
+    grade: Literal["funny", "not funny"] = Field(
+        description="Decide si el chiste es gracioso o no.",
+    )
+    feedback: str = Field(
+        description="Si el chiste no es gracioso, proporciona retroalimentación sobre cómo mejorarlo.",
+    )
+
+
+class CandidateFeedback(Feedback):
+    index: int = Field(description="Número del chiste calificado.")
+
+
+class BatchFeedback(BaseModel):
+    grades: List[CandidateFeedback] = Field(
+        description="Una calificación por cada chiste, en el mismo orden.",
+    )
+
+
+@dataclass
+class OptimizationResult:
+    """Resultado del ciclo evaluador-optimizador."""
+    joke: str
+    accepted: bool
+    feedback: str
+    rounds: int
+    seconds: float
+    candidates: int
+    evaluator_calls: int
+    cached_grades: int
+    history: List[Dict[str, str]] = field(default_factory=list)
+
+
+class GradeCache:
+    """Caché LRU de calificaciones indexada por el hash del texto del candidato."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._grades: "OrderedDict[str, Feedback]" = OrderedDict()
+
+    @staticmethod
+    def key(text: str) -> str:
+        normalized = " ".join(text.split()).lower()
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[Feedback]:
+        key = self.key(text)
+        grade = self._grades.get(key)
+        if grade is not None:
+            self._grades.move_to_end(key)
+        return grade
+
+    def put(self, text: str, grade: Feedback) -> None:
+        key = self.key(text)
+        self._grades[key] = grade
+        self._grades.move_to_end(key)
+        while len(self._grades) > self.max_entries:
+            self._grades.popitem(last=False)
+
+
+class EvaluatorOptimizer:
+    """
+    Genera candidatos en paralelo y los mejora con la retroalimentación del evaluador.
+
+    Ejemplo:
+        optimizer = EvaluatorOptimizer(llm, n_candidates=3, max_rounds=3, time_budget=60)
+        result = await optimizer.run("gatos")
+        print(result.joke, result.accepted)
+    """
+
+    def __init__(
+        self,
+        llm,
+        n_candidates: int = 3,
+        max_rounds: int = 3,
+        time_budget: Optional[float] = None,
+        grade_cache: Optional[GradeCache] = None,
+    ):
+        """
+        Inicializa el evaluador-optimizador.
+
+        Args:
+            llm: Modelo de chat (se usa también con salida estructurada para evaluar).
+            n_candidates: Candidatos generados en paralelo por ronda.
+            max_rounds: Número máximo de rondas generación + evaluación.
+            time_budget: Segundos máximos para todo el ciclo. None no impone límite.
+            grade_cache: Caché de calificaciones compartida. Por defecto se crea una propia.
+        """
+        if n_candidates < 1 or max_rounds < 1:
+            raise ValueError("n_candidates y max_rounds deben ser al menos 1")
+        self.llm = llm
+        self.evaluator = llm.with_structured_output(BatchFeedback)
+        self.n_candidates = n_candidates
+        self.max_rounds = max_rounds
+        self.time_budget = time_budget
+        self.grade_cache = grade_cache if grade_cache is not None else GradeCache()
+
+    async def generate(self, topic: str, feedback: Optional[str] = None) -> List[str]:
+        """Genera los candidatos de una ronda en paralelo."""
+        if feedback:
+            prompt = f"Escribe un chiste sobre {topic} pero toma en cuenta la retroalimentación: {feedback}"
+        else:
+            prompt = f"Escribe un chiste sobre {topic}"
+        messages = await asyncio.gather(*(self.llm.ainvoke(prompt) for _ in range(self.n_candidates)))
+        return [msg.content for msg in messages]
+
+    async def grade(self, candidates: List[str], counters: Optional[Dict[str, int]] = None) -> Dict[str, Feedback]:
+        """
+        Califica los candidatos que no están en caché con una sola llamada al evaluador.
+
+        Args:
+            candidates: Textos a calificar (sin duplicados).
+            counters: Contadores de la ejecución ("evaluator_calls", "cached_grades") a actualizar.
+
+        Returns:
+            Calificación de cada candidato. Los que el evaluador omita se consideran
+            no aceptados y no se guardan en caché.
+        """
+        counters = counters if counters is not None else {}
+        grades = {text: self.grade_cache.get(text) for text in candidates}
+        pending = [text for text, grade in grades.items() if grade is None]
+        if pending:
+            listing = "\n\n".join(f"{i}. {text}" for i, text in enumerate(pending, 1))
+            batch = await self.evaluator.ainvoke(
+                f"Califica cada uno de los siguientes chistes por separado, indicando su número:\n\n{listing}"
+            )
+            counters["evaluator_calls"] = counters.get("evaluator_calls", 0) + 1
+            by_index = {item.index: item for item in batch.grades}
+            for i, text in enumerate(pending, 1):
+                item = by_index.get(i)
+                if item is None:
+                    grades[text] = Feedback(grade="not funny", feedback="")
+                    continue
+                grades[text] = Feedback(grade=item.grade, feedback=item.feedback)
+                self.grade_cache.put(text, grades[text])
+        counters["cached_grades"] = counters.get("cached_grades", 0) + len(candidates) - len(pending)
+        return grades
+
+    async def run(self, topic: str) -> OptimizationResult:
+        """
+        Ejecuta rondas de generación y evaluación hasta aceptar un candidato o agotar el presupuesto.
+
+        Args:
+            topic: Tema del chiste.
+
+        Returns:
+            El primer candidato aceptado o, si no hubo ninguno, el último candidato evaluado.
+        """
+        start = time.perf_counter()
+        counters = {"evaluator_calls": 0, "cached_grades": 0}
+        history: List[Dict[str, str]] = []
+        feedback = None
+        last = None
+        total_candidates = 0
+        rounds = 0
+
+        async def one_round():
+            candidates = list(dict.fromkeys(await self.generate(topic, feedback)))
+            return candidates, await self.grade(candidates, counters)
+
+        while rounds < self.max_rounds:
+            remaining = None
+            if self.time_budget is not None:
+                remaining = self.time_budget - (time.perf_counter() - start)
+                if remaining <= 0:
+                    break
+            try:
+                candidates, grades = await asyncio.wait_for(one_round(), remaining)
+            except asyncio.TimeoutError:
+                break
+            rounds += 1
+            total_candidates += len(candidates)
+
+            for text in candidates:
+                grade = grades[text]
+                history.append({"round": rounds, "joke": text, "grade": grade.grade})
+                if grade.grade == "funny":
+                    return self._result(text, True, grade.feedback, rounds, start, total_candidates, counters, history)
+
+            # La retroalimentación de la ronda guía la siguiente generación
+            feedback = " ".join(grades[text].feedback for text in candidates if grades[text].feedback)
+            last = (candidates[0], grades[candidates[0]].feedback)
+
+        joke, last_feedback = last if last is not None else ("", "")
+        return self._result(joke, False, last_feedback, rounds, start, total_candidates, counters, history)
+
+    @staticmethod
+    def _result(joke, accepted, feedback, rounds, start, candidates, counters, history) -> OptimizationResult:
+        return OptimizationResult(
+            joke=joke,
+            accepted=accepted,
+            feedback=feedback,
+            rounds=rounds,
+            seconds=time.perf_counter() - start,
+            candidates=candidates,
+            evaluator_calls=counters["evaluator_calls"],
+            cached_grades=counters["cached_grades"],
+            history=history,
+        )
+
+
+class State(TypedDict):
+    """Estado del grafo del evaluador-optimizador."""
+    joke: str
+    topic: str
+    feedback: str
+    funny_or_not: str
+
+
+def build_evaluator_graph(llm, n_candidates: int = 3, max_rounds: int = 3, time_budget: Optional[float] = None):
+    """
+    Construye el grafo del evaluador-optimizador con generación best-of-N.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+        n_candidates, max_rounds, time_budget: Ver EvaluatorOptimizer.
+
+    Returns:
+        Grafo compilado con entrada {"topic": ...} (usar ainvoke/astream).
+    """
+    optimizer = EvaluatorOptimizer(
+        llm, n_candidates=n_candidates, max_rounds=max_rounds, time_budget=time_budget
+    )
+
+    async def optimize(state: State):
+        """Genera y evalúa candidatos hasta aceptar uno o agotar el presupuesto."""
+        result = await optimizer.run(state["topic"])
+        return {
+            "joke": result.joke,
+            "feedback": result.feedback,
+            "funny_or_not": "funny" if result.accepted else "not funny",
+        }
+
+    builder = StateGraph(State)
+    builder.add_node("optimize", optimize)
+    builder.add_edge(START, "optimize")
+    builder.add_edge("optimize", END)
+    return builder.compile()
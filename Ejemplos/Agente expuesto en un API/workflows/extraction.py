@@ -0,0 +1,308 @@
+"""
+Extracción estructurada por lotes (patrón de "1 LLM estructurado").
+
+El notebook llama a llm.with_structured_output(SearchQuery).invoke para una pregunta a
+la vez. BatchExtractor procesa archivos JSONL de cualquier tamaño:
+- Concurrencia asíncrona acotada: solo hay max_concurrency elementos en memoria
+- Lectura y escritura en streaming (una línea por elemento)
+- El runnable estructurado y el validador de pydantic se construyen una sola vez
+- Solo se reintentan los elementos cuya salida no pasa la validación
+- Las líneas mal formadas se registran como elementos fallidos sin detener el lote
+- Reporte periódico de progreso y throughput
+
+Uso desde la línea de comandos:
+    python -m workflows.extraction preguntas.jsonl consultas.jsonl --concurrencia 16
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, Any, Optional, Callable, Iterator, Type
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError
+from typing_extensions import TypedDict
+from langgraph.graph import StateGraph, START, END
+from tool.math_tools import multiply
+
+
+class SearchQuery(BaseModel):
+    search_query: str = Field(None, description="Consulta optimizada para búsqueda web.")
+    justification: str = Field(
+        None, description="Por qué esta consulta es relevante para la petición del usuario."
+    )
+
+
+@dataclass
+class ExtractionStats:
+    """Progreso de una extracción por lotes."""
+    processed: int = 0
+    succeeded: int = 0
+    failed: int = 0
+    retries: int = 0
+    elapsed_seconds: float = 0.0
+
+    @property
+    def items_per_second(self) -> float:
+        return self.processed / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {**asdict(self), "items_per_second": self.items_per_second}
+
+
+def read_jsonl(path: str, input_key: str = "question") -> Iterator[Dict[str, Any]]:
+    """
+    Lee un archivo JSONL línea por línea.
+
+    Cada línea puede ser un texto JSON o un objeto con la clave input_key y,
+    opcionalmente, "id". Si no hay id se usa el número de línea.
+
+    Yields:
+        Elementos {"id": ..., "input": ...}. Una línea que no es JSON válido o un objeto
+        sin input_key produce {"id": ..., "input": None, "error": ...}.
+    """
+    with open(path, encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+            except json.JSONDecodeError as e:
+                yield {"id": line_number, "input": None, "error": f"Línea {line_number} no es JSON válido: {e}"}
+                continue
+            if isinstance(item, str):
+                yield {"id": line_number, "input": item}
+            elif isinstance(item, dict) and input_key in item:
+                yield {"id": item.get("id", line_number), "input": item[input_key]}
+            else:
+                item_id = item.get("id", line_number) if isinstance(item, dict) else line_number
+                yield {"id": item_id, "input": None, "error": f"Línea {line_number} no tiene la clave {input_key!r}"}
+
+
+class BatchExtractor:
+    """
+    Extrae salidas estructuradas de muchos textos con concurrencia acotada.
+
+    Ejemplo:
+        extractor = BatchExtractor(llm, SearchQuery, max_concurrency=16)
+        stats = await extractor.extract_file("preguntas.jsonl", "consultas.jsonl")
+    """
+
+    def __init__(
+        self,
+        llm,
+        schema: Type[BaseModel] = SearchQuery,
+        max_concurrency: int = 8,
+        max_retries: int = 2,
+        progress_every: int = 100,
+        on_progress: Optional[Callable[[ExtractionStats], None]] = None,
+    ):
+        """
+        Inicializa el extractor.
+
+        Args:
+            llm: Modelo de chat con soporte de salida estructurada.
+            schema: Modelo de pydantic de la salida.
+            max_concurrency: Máximo de llamadas al LLM en curso.
+            max_retries: Reintentos por elemento cuando la salida no es válida.
+            progress_every: Cada cuántos elementos se reporta el progreso.
+            on_progress: Función que recibe ExtractionStats al reportar progreso.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser al menos 1")
+        self.schema = schema
+        # include_raw=True devuelve los errores de parseo como valor en lugar de excepción
+        self.structured_llm = llm.with_structured_output(schema, include_raw=True)
+        self.validator = TypeAdapter(schema)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.progress_every = progress_every
+        self.on_progress = on_progress
+
+    def _validate(self, parsed) -> BaseModel:
+        """Valida la salida con el validador compilado del esquema."""
+        if isinstance(parsed, self.schema):
+            return parsed
+        return self.validator.validate_python(parsed)
+
+    async def extract_one(self, text: str, stats: Optional[ExtractionStats] = None) -> BaseModel:
+        """
+        Extrae la salida estructurada de un texto, reintentando si no es válida.
+
+        Args:
+            text: Texto de entrada.
+            stats: Estadísticas donde contar los reintentos.
+
+        Returns:
+            Instancia validada del esquema.
+
+        Raises:
+            ValueError: Si la salida sigue siendo inválida tras agotar los reintentos.
+        """
+        error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt and stats is not None:
+                stats.retries += 1
+            result = await self.structured_llm.ainvoke(text)
+            if result.get("parsing_error") is not None:
+                error = result["parsing_error"]
+                continue
+            try:
+                return self._validate(result["parsed"])
+            except ValidationError as e:
+                error = e
+        raise ValueError(f"Salida inválida tras {self.max_retries + 1} intentos: {error}")
+
+    async def extract(self, items, write: Callable[[Dict[str, Any]], None]) -> ExtractionStats:
+        """
+        Procesa un flujo de elementos y escribe cada resultado en cuanto está listo.
+
+        Args:
+            items: Iterable de {"id": ..., "input": ...}; se consume de forma perezosa.
+                  Los elementos con "error" (ver read_jsonl) se registran como fallidos.
+            write: Función que recibe cada registro de salida.
+
+        Returns:
+            Estadísticas finales.
+
+        Raises:
+            Exception: El primer error de lectura, escritura o progreso; los demás
+                      trabajadores se cancelan antes de propagarlo.
+        """
+        stats = ExtractionStats()
+        start = time.perf_counter()
+        iterator = iter(items)
+
+        async def worker():
+            for item in iterator:
+                record = {"id": item["id"], "input": item["input"]}
+                if "error" in item:
+                    record["error"] = item["error"]
+                    stats.failed += 1
+                else:
+                    try:
+                        output = await self.extract_one(item["input"], stats)
+                        record["output"] = output.model_dump()
+                        stats.succeeded += 1
+                    except Exception as e:
+                        record["error"] = str(e)
+                        stats.failed += 1
+                write(record)
+                stats.processed += 1
+                if self.on_progress and stats.processed % self.progress_every == 0:
+                    stats.elapsed_seconds = time.perf_counter() - start
+                    self.on_progress(stats)
+
+        # Cada trabajador toma el siguiente elemento del iterador compartido
+        workers = [asyncio.ensure_future(worker()) for _ in range(self.max_concurrency)]
+        try:
+            done, _ = await asyncio.wait(workers, return_when=asyncio.FIRST_EXCEPTION)
+        finally:
+            # Si un trabajador falló (o se canceló la extracción) ninguno sigue escribiendo
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        for task in done:
+            task.result()
+        stats.elapsed_seconds = time.perf_counter() - start
+        return stats
+
+    async def extract_file(self, input_path: str, output_path: str, input_key: str = "question") -> ExtractionStats:
+        """
+        Procesa un archivo JSONL y escribe los resultados en otro.
+
+        Cada línea de salida es {"id", "input", "output"} o {"id", "input", "error"},
+        en orden de finalización.
+
+        Args:
+            input_path: Archivo JSONL de entrada.
+            output_path: Archivo JSONL de salida.
+            input_key: Clave del texto en los objetos de entrada.
+
+        Returns:
+            Estadísticas finales.
+        """
+        with open(output_path, "w", encoding="utf-8") as out:
+            def write(record):
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            return await self.extract(read_jsonl(input_path, input_key), write)
+
+
+class State(TypedDict):
+    """Estado del grafo de salida estructurada y llamada a herramientas."""
+    question: str
+    search_query: str
+    justification: str
+    tool_result: float
+
+
+def build_structured_graph(llm):
+    """
+    Construye el grafo del notebook "1 LLM estructurado": una consulta de búsqueda con
+    salida estructurada seguida de una llamada a la herramienta multiply.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+
+    Returns:
+        Grafo compilado con entrada {"question": ...}.
+    """
+    structured_llm = llm.with_structured_output(SearchQuery)
+    llm_with_tools = llm.bind_tools([multiply])
+
+    def extract_query(state: State):
+        """Convierte la pregunta en una consulta de búsqueda estructurada."""
+        output = structured_llm.invoke(state["question"])
+        return {"search_query": output.search_query, "justification": output.justification}
+
+    def call_tool(state: State):
+        """Pide al modelo los argumentos de multiply y ejecuta la herramienta."""
+        msg = llm_with_tools.invoke("Cúanto es la multiplicación de 5.0 por 3.0?")
+        result = None
+        for tool_call in msg.tool_calls:
+            if tool_call["name"] == "multiply":
+                result = multiply(tool_call["args"]["a"], tool_call["args"]["b"])
+        return {"tool_result": result}
+
+    builder = StateGraph(State)
+    builder.add_node("extract_query", extract_query)
+    builder.add_node("call_tool", call_tool)
+    builder.add_edge(START, "extract_query")
+    builder.add_edge("extract_query", "call_tool")
+    builder.add_edge("call_tool", END)
+    return builder.compile()
+
+
+def main():
+    """Extrae consultas de búsqueda de un archivo JSONL con Gemini."""
+    parser = argparse.ArgumentParser(description="Extracción estructurada por lotes (SearchQuery)")
+    parser.add_argument("entrada", help="Archivo JSONL con las preguntas")
+    parser.add_argument("salida", help="Archivo JSONL de resultados")
+    parser.add_argument("--clave", default="question", help="Clave del texto en cada objeto")
+    parser.add_argument("--concurrencia", type=int, default=8, help="Llamadas simultáneas al LLM")
+    parser.add_argument("--reintentos", type=int, default=2, help="Reintentos por salida inválida")
+    parser.add_argument("--progreso", type=int, default=100, help="Elementos entre reportes")
+    args = parser.parse_args()
+
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    llm = ChatGoogleGenerativeAI(model="gemini-1.5-pro")
+
+    def report(stats: ExtractionStats):
+        print(f"📊 {stats.processed} procesados ({stats.failed} fallidos, {stats.retries} reintentos) "
+              f"- {stats.items_per_second:.1f} elementos/s")
+
+    extractor = BatchExtractor(
+        llm,
+        SearchQuery,
+        max_concurrency=args.concurrencia,
+        max_retries=args.reintentos,
+        progress_every=args.progreso,
+        on_progress=report,
+    )
+    stats = asyncio.run(extractor.extract_file(args.entrada, args.salida, args.clave))
+    print(f"✅ {stats.succeeded} extraídos, {stats.failed} fallidos en {stats.elapsed_seconds:.1f}s "
+          f"({stats.items_per_second:.1f} elementos/s)")
+
+
+if __name__ == "__main__":
+    main()
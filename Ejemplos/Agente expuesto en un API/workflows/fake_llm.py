@@ -0,0 +1,180 @@
+"""
+Modelo de chat simulado con latencia configurable.
+
+Permite ejecutar los flujos de trabajo y el agente sin conexión ni API key para
+medir el costo propio de LangGraph o detectar regresiones:
+- invoke/ainvoke devuelven texto determinista tras esperar 'latency' segundos
+- bind_tools produce llamadas a herramientas cuando el último mensaje es del usuario
+- with_structured_output construye instancias válidas de cualquier esquema pydantic
+- Se cuentan las llamadas y el tiempo total simulado de LLM
+"""
+
+import asyncio
+import re
+import threading
+import time
+import typing
+import zlib
+from typing import Any, Dict, List, Optional, Type
+from pydantic import BaseModel, PrivateAttr
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import RunnableLambda
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+
+# Elementos numerados de un prompt ("1. texto"), usados para dimensionar listas
+_NUMBERED = re.compile(r"^\s*\d+\.\s", re.MULTILINE)
+_NUMBERS = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def _text(value) -> str:
+    """Texto del último mensaje de una entrada (cadena, mensaje o lista de mensajes)."""
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list) and value:
+        value = value[-1]
+    return getattr(value, "content", str(value))
+
+
+def _choose(options, seed: str):
+    """Elige una opción de forma determinista a partir del texto."""
+    return options[zlib.crc32(seed.encode("utf-8")) % len(options)]
+
+
+def fake_instance(schema: Type[BaseModel], text: str, list_items: int = 5, position: int = 1) -> BaseModel:
+    """
+    Construye una instancia válida de un esquema pydantic.
+
+    - Los campos Literal toman una de sus opciones según el texto de entrada
+    - Las listas tienen tantos elementos como líneas numeradas tenga el prompt
+      (o list_items si no hay ninguna); los campos int de cada elemento son su posición
+    """
+    values = {}
+    for name, field in schema.model_fields.items():
+        values[name] = _fake_value(field.annotation, name, text, list_items, position)
+    return schema(**values)
+
+
+def _fake_value(annotation, name: str, text: str, list_items: int, position: int):
+    origin = typing.get_origin(annotation)
+    args = typing.get_args(annotation)
+    if origin is typing.Union:
+        return _fake_value(next(a for a in args if a is not type(None)), name, text, list_items, position)
+    if origin is typing.Literal:
+        return _choose(args, text)
+    if origin in (list, List):
+        count = len(_NUMBERED.findall(text)) or list_items
+        return [_fake_value(args[0], name, text, list_items, i) for i in range(1, count + 1)]
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return fake_instance(annotation, f"{text}#{position}", list_items, position)
+    if annotation is int:
+        return position
+    if annotation is float:
+        return float(position)
+    if annotation is bool:
+        return True
+    return f"{name} simulado {position}"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modelo de chat simulado.
+
+    Ejemplo:
+        llm = FakeChatModel(latency=0.05)
+        graph = build_parallel_graph(llm)
+        await graph.ainvoke({"topic": "gatos"})
+        print(llm.calls, llm.llm_seconds)
+    """
+
+    latency: float = 0.0
+    list_items: int = 5
+
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    _llm_seconds: float = PrivateAttr(default=0.0)
+    _sequence: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-latency"
+
+    @property
+    def calls(self) -> int:
+        """Número de llamadas realizadas."""
+        return self._calls
+
+    @property
+    def llm_seconds(self) -> float:
+        """Tiempo total simulado de LLM (suma de las latencias de todas las llamadas)."""
+        return self._llm_seconds
+
+    def reset(self) -> None:
+        """Reinicia los contadores."""
+        with self._lock:
+            self._calls = 0
+            self._llm_seconds = 0.0
+
+    def _record(self) -> None:
+        with self._lock:
+            self._calls += 1
+            self._llm_seconds += self.latency
+
+    def _respond(self, messages: List[BaseMessage], tools: Optional[List[Dict[str, Any]]] = None) -> AIMessage:
+        """Respuesta determinista; pide una herramienta si hay herramientas y habla el usuario."""
+        last = messages[-1]
+        # Numeración que no se reinicia: cada respuesta es distinta para no activar cachés
+        with self._lock:
+            self._sequence += 1
+            number = self._sequence
+        if tools and last.type == "human":
+            tool = next(
+                (t["function"] for t in tools if t["function"]["name"] in last.content.lower()),
+                tools[0]["function"],
+            )
+            params = list(tool.get("parameters", {}).get("properties", {}))
+            numbers = [float(n) for n in _NUMBERS.findall(last.content)] or [1.0]
+            args = {param: numbers[i % len(numbers)] for i, param in enumerate(params)}
+            return AIMessage(content="", tool_calls=[{"name": tool["name"], "args": args, "id": f"call_{number}"}])
+        return AIMessage(content=f"Respuesta simulada {number}: {_text(last)[:80]}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            time.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        self._record()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        message = self._respond(messages, kwargs.get("tools"))
+        self._record()
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self, tools, **kwargs):
+        """Asocia herramientas en el formato de OpenAI, como los modelos reales."""
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def with_structured_output(self, schema: Type[BaseModel], include_raw: bool = False, **kwargs):
+        """Devuelve un runnable que produce instancias simuladas del esquema."""
+        def build(value):
+            parsed = fake_instance(schema, _text(value), self.list_items)
+            self._record()
+            if include_raw:
+                return {"raw": AIMessage(content=""), "parsed": parsed, "parsing_error": None}
+            return parsed
+
+        def invoke(value):
+            if self.latency:
+                time.sleep(self.latency)
+            return build(value)
+
+        async def ainvoke(value):
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            return build(value)
+
+        return RunnableLambda(invoke, afunc=ainvoke)
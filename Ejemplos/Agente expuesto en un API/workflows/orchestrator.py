@@ -0,0 +1,290 @@
+"""
+Orquestador-trabajadores con pool acotado (flujo "5 Orquestador").
+
+En el flujo original assign_workers emite un Send por sección sin límite (un plan de
+30 secciones lanza 30 llamadas simultáneas), las secciones llegan en orden de
+finalización y el sintetizador espera a que todas terminen.
+
+Orchestrator:
+- Ejecuta las secciones con un número fijo de trabajadores
+- Entrega las secciones en el orden del plan a medida que están disponibles, de modo
+  que el informe se puede ir construyendo (síntesis incremental)
+- Guarda los planes por tema para que las repeticiones no llamen al planificador
+- En el grafo, cada sección y el informe parcial se emiten como eventos "custom" en
+  cuanto están listos (stream_mode="custom")
+"""
+
+import asyncio
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Dict, Optional, AsyncIterator
+from pydantic import BaseModel, Field
+from typing_extensions import TypedDict
+from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import StreamWriter
+
+
+PLANNER_PROMPT = "Genera un plan para el informe."
+WORKER_PROMPT = (
+    "Escribe una sección del informe siguiendo el nombre y la descripción proporcionados. "
+    "No incluyas ningún preámbulo para cada sección. Utiliza formato markdown."
+)
+SECTION_SEPARATOR = "\n\n---\n\n"
+
+
+class Section(BaseModel):
+    name: str = Field(
+        description="Nombre para esta sección del informe.",
+    )
+    description: str = Field(
+        description="Breve descripción de los temas y conceptos principales que se cubrirán en esta sección.",
+    )
+
+
+class Sections(BaseModel):
+    sections: List[Section] = Field(
+        description="Secciones del informe.",
+    )
+
+
+@dataclass
+class SectionResult:
+    """Sección terminada, con su posición en el plan."""
+    index: int
+    section: Section
+    content: str
+
+
+class PlanCache:
+    """
+    Caché LRU de planes por tema.
+
+    El tema se normaliza (espacios y mayúsculas) para que variaciones triviales
+    reutilicen el mismo plan.
+    """
+
+    def __init__(self, max_entries: int = 128):
+        """
+        Inicializa la caché.
+
+        Args:
+            max_entries: Número máximo de planes almacenados.
+        """
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._plans: "OrderedDict[str, List[Section]]" = OrderedDict()
+
+    @staticmethod
+    def _key(topic: str) -> str:
+        return " ".join(topic.lower().split())
+
+    def get(self, topic: str) -> Optional[List[Section]]:
+        """Devuelve el plan guardado para el tema, si existe."""
+        key = self._key(topic)
+        if key not in self._plans:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._plans.move_to_end(key)
+        return self._plans[key]
+
+    def put(self, topic: str, sections: List[Section]) -> None:
+        """Guarda el plan de un tema, descartando el más antiguo si se excede el tamaño."""
+        key = self._key(topic)
+        self._plans[key] = sections
+        self._plans.move_to_end(key)
+        while len(self._plans) > self.max_entries:
+            self._plans.popitem(last=False)
+
+    def clear(self) -> None:
+        """Elimina todos los planes guardados."""
+        self._plans.clear()
+
+
+class Orchestrator:
+    """
+    Planifica un informe y escribe sus secciones con un pool acotado de trabajadores.
+
+    Ejemplo:
+        orchestrator = Orchestrator(llm, max_workers=4)
+        async for item in orchestrator.stream("Leyes de escalado de los LLM"):
+            print(item.section.name)
+    """
+
+    def __init__(self, llm, max_workers: int = 4, plan_cache: Optional[PlanCache] = None):
+        """
+        Inicializa el orquestador.
+
+        Args:
+            llm: Modelo de chat (se usa también con salida estructurada para el plan).
+            max_workers: Número máximo de secciones escribiéndose a la vez.
+            plan_cache: Caché de planes. Por defecto se crea una propia.
+        """
+        if max_workers < 1:
+            raise ValueError("max_workers debe ser al menos 1")
+        self.llm = llm
+        self.planner = llm.with_structured_output(Sections)
+        self.max_workers = max_workers
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
+
+    async def plan(self, topic: str) -> List[Section]:
+        """
+        Obtiene el plan del informe, reutilizando el de la caché si existe.
+
+        Args:
+            topic: Tema del informe.
+
+        Returns:
+            Secciones del plan.
+        """
+        sections = self.plan_cache.get(topic)
+        if sections is None:
+            report_sections = await self.planner.ainvoke([
+                SystemMessage(content=PLANNER_PROMPT),
+                HumanMessage(content=f"Aquí está el tema del informe: {topic}"),
+            ])
+            sections = report_sections.sections
+            self.plan_cache.put(topic, sections)
+        return sections
+
+    async def write_section(self, section: Section) -> str:
+        """Escribe una sección del informe."""
+        result = await self.llm.ainvoke([
+            SystemMessage(content=WORKER_PROMPT),
+            HumanMessage(
+                content=f"Aquí está el nombre de la sección: {section.name} y la descripción: {section.description}"
+            ),
+        ])
+        return result.content
+
+    async def stream_sections(self, sections: List[Section]) -> AsyncIterator[SectionResult]:
+        """
+        Escribe las secciones y las entrega en el orden del plan.
+
+        Cada sección se emite en cuanto ella y todas las anteriores están terminadas.
+
+        Args:
+            sections: Secciones del plan.
+
+        Yields:
+            SectionResult en orden de plan.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        for item in enumerate(sections):
+            queue.put_nowait(item)
+        finished: asyncio.Queue = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    index, section = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    content = await self.write_section(section)
+                except Exception as e:
+                    await finished.put(e)
+                    return
+                await finished.put(SectionResult(index, section, content))
+
+        workers = [asyncio.create_task(worker()) for _ in range(min(self.max_workers, len(sections)))]
+        ready: Dict[int, SectionResult] = {}
+        next_index = 0
+        try:
+            while next_index < len(sections):
+                result = await finished.get()
+                if isinstance(result, Exception):
+                    raise result
+                ready[result.index] = result
+                while next_index in ready:
+                    yield ready.pop(next_index)
+                    next_index += 1
+        finally:
+            for task in workers:
+                task.cancel()
+
+    async def stream(self, topic: str) -> AsyncIterator[SectionResult]:
+        """
+        Planifica el informe y entrega sus secciones en orden a medida que terminan.
+
+        Args:
+            topic: Tema del informe.
+
+        Yields:
+            SectionResult en orden de plan.
+        """
+        sections = await self.plan(topic)
+        async for result in self.stream_sections(sections):
+            yield result
+
+    async def run(self, topic: str) -> str:
+        """
+        Genera el informe completo.
+
+        Args:
+            topic: Tema del informe.
+
+        Returns:
+            Informe final con las secciones separadas por delimitadores.
+        """
+        parts = [result.content async for result in self.stream(topic)]
+        return SECTION_SEPARATOR.join(parts)
+
+
+class State(TypedDict):
+    """Estado del grafo del orquestador."""
+    topic: str
+    sections: list[Section]
+    completed_sections: list
+    final_report: str
+
+
+def build_orchestrator_graph(llm, max_workers: int = 4, plan_cache: Optional[PlanCache] = None):
+    """
+    Construye el grafo orquestador → trabajadores → sintetizador con pool acotado.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+        max_workers: Número máximo de secciones escribiéndose a la vez.
+        plan_cache: Caché de planes compartida entre ejecuciones.
+
+    Returns:
+        Grafo compilado con entrada {"topic": ...} (usar ainvoke/astream). Con
+        stream_mode="custom", el nodo de trabajadores emite por cada sección terminada
+        {"index", "name", "content", "report"}, donde "report" es el informe hasta esa
+        sección, sin esperar a que termine el plan completo.
+    """
+    orchestrator = Orchestrator(llm, max_workers=max_workers, plan_cache=plan_cache)
+
+    async def plan_node(state: State):
+        """Orquestador que genera (o reutiliza) el plan del informe."""
+        return {"sections": await orchestrator.plan(state["topic"])}
+
+    async def workers_node(state: State, writer: StreamWriter):
+        """Escribe las secciones con el pool acotado y emite el informe parcial tras cada una."""
+        results = []
+        async for result in orchestrator.stream_sections(state["sections"]):
+            results.append(result.content)
+            writer({
+                "index": result.index,
+                "name": result.section.name,
+                "content": result.content,
+                "report": SECTION_SEPARATOR.join(results),
+            })
+        return {"completed_sections": results}
+
+    def synthesizer(state: State):
+        """Sintetiza el informe completo a partir de las secciones."""
+        return {"final_report": SECTION_SEPARATOR.join(state["completed_sections"])}
+
+    builder = StateGraph(State)
+    builder.add_node("orchestrator", plan_node)
+    builder.add_node("workers", workers_node)
+    builder.add_node("synthesizer", synthesizer)
+    builder.add_edge(START, "orchestrator")
+    builder.add_edge("orchestrator", "workers")
+    builder.add_edge("workers", "synthesizer")
+    builder.add_edge("synthesizer", END)
+    return builder.compile()
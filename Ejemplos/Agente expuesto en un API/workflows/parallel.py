@@ -0,0 +1,265 @@
+"""
+Fan-out/fan-in asíncrono (flujo "3 Paralelizado").
+
+En el flujo original cada rama usa llm.invoke (bloqueante) y el agregador solo se
+ejecuta cuando todas las ramas terminan, por lo que una rama lenta retiene el resultado.
+
+FanOut ejecuta las ramas de forma asíncrona:
+- Límite de concurrencia configurable (semáforo)
+- Timeout por rama y fecha límite global
+- Política de resultados parciales: al vencer la fecha límite se agrega lo que terminó
+- Cada resultado se emite en cuanto su rama termina (FanOut.stream); sin resultados
+  parciales se emiten solo cuando todas las ramas terminaron bien
+"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, AsyncIterator, Callable
+from typing_extensions import Literal, TypedDict
+from langgraph.graph import StateGraph, START, END
+
+
+# Ramas del notebook: clave del estado -> plantilla del prompt
+DEFAULT_BRANCHES = {
+    "joke": "Escribe un chiste sobre {topic}",
+    "story": "Escribe una historia sobre {topic}",
+    "poem": "Escribe un poema sobre {topic}",
+}
+
+
+class FanOutError(Exception):
+    """Se lanza cuando faltan ramas y no se permiten resultados parciales."""
+
+    def __init__(self, results: Dict[str, "BranchResult"]):
+        self.results = results
+        missing = [name for name, result in results.items() if result.status != "ok"]
+        super().__init__(f"Ramas sin resultado: {', '.join(missing)}")
+
+
+@dataclass
+class BranchResult:
+    """Resultado de una rama."""
+    name: str
+    status: Literal["ok", "timeout", "error"]
+    output: Optional[str] = None
+    error: Optional[str] = None
+    seconds: float = 0.0
+
+
+def llm_branch(llm, template: str) -> Callable:
+    """
+    Crea una rama que llama al LLM de forma asíncrona con un prompt.
+
+    Args:
+        llm: Modelo de chat.
+        template: Plantilla del prompt con campos de las entradas (p. ej. "{topic}").
+
+    Returns:
+        Función asíncrona que recibe las entradas y devuelve el texto generado.
+    """
+    async def branch(inputs: Dict[str, Any]) -> str:
+        msg = await llm.ainvoke(template.format(**inputs))
+        return msg.content
+    return branch
+
+
+class FanOut:
+    """
+    Ejecuta varias ramas en paralelo y entrega sus resultados a medida que terminan.
+
+    Ejemplo:
+        fan_out = FanOut(
+            {name: llm_branch(llm, template) for name, template in DEFAULT_BRANCHES.items()},
+            max_concurrency=2, timeout=20, deadline=30,
+        )
+        async for result in fan_out.stream({"topic": "gatos"}):
+            print(result.name, result.output)
+    """
+
+    def __init__(
+        self,
+        branches: Dict[str, Callable],
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        deadline: Optional[float] = None,
+        allow_partial: bool = True,
+    ):
+        """
+        Inicializa el fan-out.
+
+        Args:
+            branches: Ramas a ejecutar (nombre -> función que recibe las entradas).
+                     Las funciones pueden ser síncronas o asíncronas.
+            max_concurrency: Máximo de ramas ejecutándose a la vez. None no impone límite.
+            timeout: Segundos máximos de ejecución de cada rama.
+            deadline: Segundos máximos para todo el fan-out; las ramas pendientes se cancelan.
+            allow_partial: Si es True se agregan las ramas que terminaron; si es False
+                          cualquier rama fallida o vencida lanza FanOutError.
+        """
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser al menos 1")
+        self.branches = branches
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.deadline = deadline
+        self.allow_partial = allow_partial
+
+    async def _run_branch(self, name: str, inputs: Dict[str, Any], semaphore) -> BranchResult:
+        """Ejecuta una rama respetando el límite de concurrencia y su timeout."""
+        branch = self.branches[name]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(branch):
+                    call = branch(inputs)
+                else:
+                    call = asyncio.to_thread(branch, inputs)
+                output = await asyncio.wait_for(call, self.timeout)
+                return BranchResult(name, "ok", output=output, seconds=time.perf_counter() - start)
+            except asyncio.TimeoutError:
+                return BranchResult(name, "timeout", error="Tiempo de la rama agotado",
+                                    seconds=time.perf_counter() - start)
+            except Exception as e:
+                return BranchResult(name, "error", error=str(e), seconds=time.perf_counter() - start)
+
+    async def stream(self, inputs: Dict[str, Any]) -> AsyncIterator[BranchResult]:
+        """
+        Ejecuta las ramas y emite cada resultado en cuanto está disponible.
+
+        Con allow_partial=False la ejecución es de todo o nada: los resultados se retienen
+        hasta que terminan todas las ramas y solo se emiten si todas terminaron bien, de
+        modo que el consumidor nunca recibe parte de una ejecución fallida.
+
+        Args:
+            inputs: Entradas compartidas por todas las ramas.
+
+        Yields:
+            BranchResult en orden de finalización. Al vencer la fecha límite se emite un
+            resultado "timeout" por cada rama pendiente.
+
+        Raises:
+            FanOutError: Si falta alguna rama y allow_partial es False (antes de emitir
+                        ningún resultado).
+        """
+        results = self._stream(inputs)
+        try:
+            if self.allow_partial:
+                async for result in results:
+                    yield result
+                return
+            buffered = {result.name: result async for result in results}
+        finally:
+            await results.aclose()
+        if any(result.status != "ok" for result in buffered.values()):
+            raise FanOutError(buffered)
+        for result in buffered.values():
+            yield result
+
+    async def _stream(self, inputs: Dict[str, Any]) -> AsyncIterator[BranchResult]:
+        """Emite los resultados de las ramas en orden de finalización, sin aplicar allow_partial."""
+        semaphore = asyncio.Semaphore(self.max_concurrency or len(self.branches) or 1)
+        tasks = {
+            asyncio.create_task(self._run_branch(name, inputs, semaphore)): name
+            for name in self.branches
+        }
+        loop = asyncio.get_running_loop()
+        expires = loop.time() + self.deadline if self.deadline is not None else None
+        results: Dict[str, BranchResult] = {}
+        pending = set(tasks)
+
+        try:
+            while pending:
+                remaining = None if expires is None else max(0.0, expires - loop.time())
+                done, pending = await asyncio.wait(
+                    pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    # Fecha límite vencida: se cancelan las ramas rezagadas
+                    for task in pending:
+                        task.cancel()
+                        name = tasks[task]
+                        results[name] = BranchResult(name, "timeout", error="Fecha límite del fan-out vencida")
+                        yield results[name]
+                    pending = set()
+                    break
+                for task in done:
+                    result = task.result()
+                    results[result.name] = result
+                    yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def run(self, inputs: Dict[str, Any]) -> Dict[str, BranchResult]:
+        """
+        Ejecuta las ramas y espera a que terminen (o a que venza la fecha límite).
+
+        Args:
+            inputs: Entradas compartidas por todas las ramas.
+
+        Returns:
+            Resultados indexados por nombre de rama.
+        """
+        return {result.name: result async for result in self.stream(inputs)}
+
+
+class State(TypedDict):
+    """Estado del grafo de paralelización."""
+    topic: str
+    joke: str
+    story: str
+    poem: str
+    combined_output: str
+
+
+def aggregate(topic: str, outputs: Dict[str, Optional[str]]) -> str:
+    """
+    Combina el chiste, la historia y el poema en una sola salida.
+
+    Las ramas que no terminaron a tiempo se indican como no disponibles.
+    """
+    missing = "(no disponible)"
+    combinado = f"¡Aquí tienes una historia, un chiste y un poema sobre {topic}!\n\n"
+    combinado += f"HISTORIA:\n{outputs.get('story') or missing}\n\n"
+    combinado += f"CHISTE:\n{outputs.get('joke') or missing}\n\n"
+    combinado += f"POEMA:\n{outputs.get('poem') or missing}"
+    return combinado
+
+
+def build_parallel_graph(
+    llm,
+    max_concurrency: Optional[int] = None,
+    timeout: Optional[float] = None,
+    deadline: Optional[float] = None,
+    allow_partial: bool = True,
+):
+    """
+    Construye el grafo de paralelización con un único nodo de fan-out asíncrono.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+        max_concurrency, timeout, deadline, allow_partial: Ver FanOut.
+
+    Returns:
+        Grafo compilado con entrada {"topic": ...} (usar ainvoke/astream).
+    """
+    fan_out = FanOut(
+        {name: llm_branch(llm, template) for name, template in DEFAULT_BRANCHES.items()},
+        max_concurrency=max_concurrency,
+        timeout=timeout,
+        deadline=deadline,
+        allow_partial=allow_partial,
+    )
+
+    async def fan_out_node(state: State):
+        """Genera el chiste, la historia y el poema en paralelo."""
+        results = await fan_out.run({"topic": state["topic"]})
+        outputs = {name: result.output for name, result in results.items() if result.status == "ok"}
+        return {**outputs, "combined_output": aggregate(state["topic"], outputs)}
+
+    builder = StateGraph(State)
+    builder.add_node("fan_out", fan_out_node)
+    builder.add_edge(START, "fan_out")
+    builder.add_edge("fan_out", END)
+    return builder.compile()
@@ -0,0 +1,314 @@
+"""
+Enrutador con ejecución especulativa (flujo "4 Enrutador").
+
+En el flujo original el enrutador hace una llamada con salida estructurada y solo
+después se ejecuta la rama elegida, por lo que la latencia es enrutador + generación.
+
+SpeculativeRouter lanza las ramas más probables mientras el enrutador decide:
+- Si la rama elegida ya estaba en ejecución se conserva su resultado
+- Las ramas especuladas que no fueron elegidas se cancelan
+- Un presupuesto por solicitud de llamadas desperdiciadas limita el costo de la especulación
+- Si el enrutador no devuelve una rama válida se usa la más probable
+- Se reportan la precisión del enrutamiento y la tasa de acierto por rama
+"""
+
+import asyncio
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, Any, Optional, List
+from typing_extensions import Literal, TypedDict
+from pydantic import BaseModel, Field
+from langchain_core.messages import HumanMessage, SystemMessage
+from langgraph.graph import StateGraph, START, END
+
+
+ROUTER_PROMPT = "Enruta la entrada a historia, chiste o poema según la solicitud del usuario."
+
+# Ramas del grafo del enrutador
+BRANCHES = ("story", "joke", "poem")
+
+
+class Route(BaseModel):
+    """Esquema de salida estructurada usado como lógica de enrutamiento."""
+    step: Literal["poem", "story", "joke"] = Field(
+        description="El siguiente paso en el proceso de enrutamiento"
+    )
+
+
+class State(TypedDict):
+    """Estado del grafo del enrutador."""
+    input: str
+    decision: str
+    output: str
+
+
+@dataclass
+class RouteResult:
+    """Resultado de una ejecución del enrutador."""
+    decision: str
+    output: str
+    speculative_hit: bool
+    router_seconds: float
+    total_seconds: float
+
+
+async def _call(runnable, text: str) -> str:
+    """Ejecuta una rama (runnable de LangChain o función) y devuelve su texto."""
+    if hasattr(runnable, "ainvoke"):
+        result = await runnable.ainvoke(text)
+    elif asyncio.iscoroutinefunction(runnable):
+        result = await runnable(text)
+    else:
+        result = await asyncio.to_thread(runnable, text)
+    return getattr(result, "content", result)
+
+
+class RoutingStats:
+    """Estadísticas acumuladas del enrutador especulativo."""
+
+    def __init__(self):
+        self.requests = 0
+        self.decisions: Counter = Counter()
+        self.speculated: Counter = Counter()
+        self.hits: Counter = Counter()
+        self.wasted_calls = 0
+        self.discarded_outputs = 0
+        self.invalid_decisions = 0
+        self.labeled = 0
+        self.correct = 0
+        self.router_seconds = 0.0
+        self.total_seconds = 0.0
+
+    def hit_rate(self, branch: str) -> float:
+        """Fracción de especulaciones de una rama que resultaron elegidas."""
+        return self.hits[branch] / self.speculated[branch] if self.speculated[branch] else 0.0
+
+    def summary(self) -> Dict[str, Any]:
+        """Resumen de precisión, aciertos por rama y latencias medias."""
+        requests = self.requests or 1
+        return {
+            "requests": self.requests,
+            "routing_accuracy": self.correct / self.labeled if self.labeled else None,
+            "speculative_hit_rate": sum(self.hits.values()) / requests,
+            "wasted_calls": self.wasted_calls,
+            "discarded_outputs": self.discarded_outputs,
+            "invalid_decisions": self.invalid_decisions,
+            "branches": {
+                branch: {
+                    "decisions": self.decisions[branch],
+                    "speculated": self.speculated[branch],
+                    "hits": self.hits[branch],
+                    "hit_rate": self.hit_rate(branch),
+                }
+                for branch in sorted(set(self.decisions) | set(self.speculated))
+            },
+            "avg_router_seconds": self.router_seconds / requests,
+            "avg_total_seconds": self.total_seconds / requests,
+        }
+
+
+class SpeculativeRouter:
+    """
+    Enrutador que ejecuta especulativamente las ramas más probables.
+
+    Ejemplo:
+        router = SpeculativeRouter(
+            llm.with_structured_output(Route),
+            {"story": llm, "joke": llm, "poem": llm},
+            speculate=1,
+        )
+        result = await router.ainvoke("Escribe una historia sobre gatos")
+    """
+
+    def __init__(
+        self,
+        router,
+        branches: Dict[str, Any],
+        speculate: int = 1,
+        max_wasted_calls: Optional[int] = None,
+        priors: Optional[Dict[str, float]] = None,
+        system_prompt: str = ROUTER_PROMPT,
+    ):
+        """
+        Inicializa el enrutador.
+
+        Args:
+            router: Runnable con salida estructurada cuyo resultado tiene el atributo 'step'.
+            branches: Ramas disponibles (nombre -> runnable o función que recibe el texto).
+            speculate: Número máximo de ramas a lanzar antes de conocer la decisión (0 desactiva).
+            max_wasted_calls: Llamadas especuladas que una solicitud puede cancelar; limita
+                             cuántas ramas se lanzan antes de conocer la decisión.
+                             None no impone límite.
+            priors: Probabilidad inicial de cada rama antes de tener historial.
+            system_prompt: Instrucción del sistema para el enrutador.
+        """
+        if speculate < 0:
+            raise ValueError("speculate no puede ser negativo")
+        self.router = router
+        self.branches = branches
+        self.speculate = min(speculate, len(branches))
+        self.max_wasted_calls = max_wasted_calls
+        self.priors = priors or {name: 1.0 for name in branches}
+        self.system_prompt = system_prompt
+        self.stats = RoutingStats()
+
+    def likely_branches(self) -> List[str]:
+        """
+        Ordena las ramas por probabilidad estimada a partir de las decisiones previas.
+
+        Returns:
+            Nombres de rama de la más a la menos probable.
+        """
+        return sorted(
+            self.branches,
+            key=lambda name: self.stats.decisions[name] + self.priors.get(name, 1.0),
+            reverse=True,
+        )
+
+    def _speculation_budget(self) -> int:
+        """Número de ramas que se pueden especular en cada solicitud."""
+        if self.max_wasted_calls is None:
+            return self.speculate
+        # En el peor caso se cancelan todas las ramas especuladas
+        return max(0, min(self.speculate, self.max_wasted_calls))
+
+    async def _route(self, text: str) -> Optional[str]:
+        """Ejecuta el enrutador con salida estructurada; None si no eligió ninguna rama."""
+        decision = await self.router.ainvoke(
+            [SystemMessage(content=self.system_prompt), HumanMessage(content=text)]
+        )
+        # with_structured_output devuelve None si el modelo no produjo la salida
+        return getattr(decision, "step", None)
+
+    async def ainvoke(self, text: str, expected: Optional[str] = None) -> RouteResult:
+        """
+        Enruta una entrada y genera la respuesta de la rama elegida.
+
+        Args:
+            text: Petición del usuario.
+            expected: Rama correcta, si se conoce, para medir la precisión del enrutador.
+
+        Returns:
+            Decisión, salida de la rama y métricas de la ejecución.
+        """
+        start = time.perf_counter()
+        likely = self.likely_branches()
+        speculative = {
+            name: asyncio.create_task(_call(self.branches[name], text))
+            for name in likely[:self._speculation_budget()]
+        }
+
+        try:
+            decision = await self._route(text)
+            router_seconds = time.perf_counter() - start
+            if decision not in self.branches:
+                self.stats.invalid_decisions += 1
+                decision = likely[0]
+
+            # Cancelar las ramas perdedoras y conservar la ganadora si ya estaba en curso
+            for name, task in speculative.items():
+                self.stats.speculated[name] += 1
+                if name == decision:
+                    continue
+                if task.done():
+                    # La llamada ya terminó: se descarta su salida, no se interrumpe nada
+                    self.stats.discarded_outputs += 1
+                    if not task.cancelled():
+                        task.exception()
+                else:
+                    task.cancel()
+                    self.stats.wasted_calls += 1
+
+            hit = decision in speculative
+            if hit:
+                self.stats.hits[decision] += 1
+                output = await speculative[decision]
+            else:
+                output = await _call(self.branches[decision], text)
+        finally:
+            for task in speculative.values():
+                if not task.done():
+                    task.cancel()
+
+        total_seconds = time.perf_counter() - start
+        self.stats.requests += 1
+        self.stats.decisions[decision] += 1
+        self.stats.router_seconds += router_seconds
+        self.stats.total_seconds += total_seconds
+        if expected is not None:
+            self.stats.labeled += 1
+            self.stats.correct += int(decision == expected)
+
+        return RouteResult(decision, output, hit, router_seconds, total_seconds)
+
+    def invoke(self, text: str, expected: Optional[str] = None) -> RouteResult:
+        """Versión síncrona de ainvoke."""
+        return asyncio.run(self.ainvoke(text, expected))
+
+
+def build_router_graph(llm, speculate: int = 1, max_wasted_calls: Optional[int] = 1):
+    """
+    Construye el grafo del enrutador.
+
+    Args:
+        llm: Modelo de chat a utilizar.
+        speculate: Ramas a ejecutar especulativamente (por defecto 1, como el grafo que
+                  se sirve desde langgraph.json). Con 0 se construye el grafo original
+                  (enrutador -> rama); con un valor mayor el enrutamiento y la
+                  generación ocurren en un único nodo especulativo.
+        max_wasted_calls: Llamadas especuladas que cada solicitud puede cancelar.
+
+    Returns:
+        Grafo compilado con entrada {"input": ...} y salida {"decision", "output"}.
+    """
+    router = llm.with_structured_output(Route)
+    builder = StateGraph(State)
+
+    if speculate > 0:
+        speculative_router = SpeculativeRouter(
+            router,
+            {name: llm for name in BRANCHES},
+            speculate=speculate,
+            max_wasted_calls=max_wasted_calls,
+        )
+
+        async def route_and_generate(state: State):
+            """Enruta y genera la respuesta en un solo paso especulativo."""
+            result = await speculative_router.ainvoke(state["input"])
+            return {"decision": result.decision, "output": result.output}
+
+        builder.add_node("route_and_generate", route_and_generate)
+        builder.add_edge(START, "route_and_generate")
+        builder.add_edge("route_and_generate", END)
+        graph = builder.compile()
+        graph.router_stats = speculative_router.stats
+        return graph
+
+    def llm_call_router(state: State):
+        """Decide a qué rama (historia, chiste o poema) se envía la entrada."""
+        decision = router.invoke(
+            [SystemMessage(content=ROUTER_PROMPT), HumanMessage(content=state["input"])]
+        )
+        step = getattr(decision, "step", None)
+        return {"decision": step if step in BRANCHES else BRANCHES[0]}
+
+    def make_branch(name: str):
+        def branch(state: State):
+            result = llm.invoke(state["input"])
+            return {"output": result.content}
+        branch.__name__ = f"llm_call_{name}"
+        return branch
+
+    builder.add_node("llm_call_router", llm_call_router)
+    for name in BRANCHES:
+        builder.add_node(f"llm_call_{name}", make_branch(name))
+        builder.add_edge(f"llm_call_{name}", END)
+
+    builder.add_edge(START, "llm_call_router")
+    builder.add_conditional_edges(
+        "llm_call_router",
+        lambda state: f"llm_call_{state['decision']}",
+        [f"llm_call_{name}" for name in BRANCHES],
+    )
+    return builder.compile()
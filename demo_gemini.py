@@ -1,17 +1,133 @@
 #!/usr/bin/env python3
 """
 Demo script que muestra cómo usar Gemini Flash
+
+Chat interactivo con respuestas en streaming y memoria de los últimos turnos.
+Después de cada respuesta se muestran el tiempo al primer token (TTFT), la
+latencia total y los tokens por segundo.
+
+Uso:
+    python demo_gemini.py                         # chat interactivo
+    python demo_gemini.py --historial 5           # recordar solo los últimos 5 turnos
+    python demo_gemini.py --bench prompts.txt     # benchmark de latencia (un prompt por línea)
 """
 
 import os
 import getpass
+import argparse
+import math
+import time
+from collections import deque
 
 def _set_env(var: str):
     """Función para configurar variables de entorno de forma segura"""
     if not os.environ.get(var):
         os.environ[var] = getpass.getpass(f"{var}: ")
 
+def stream_response(llm, messages, echo=True):
+    """
+    Envía los mensajes al modelo e imprime los tokens a medida que llegan.
+    
+    Args:
+        llm: Modelo de chat
+        messages: Mensajes del prompt
+        echo: Si es True se imprime cada fragmento recibido
+    
+    Returns:
+        Tupla (mensaje completo, métricas del turno)
+    """
+    start = time.perf_counter()
+    first_token = None
+    full = None
+    chunks = 0
+    
+    for chunk in llm.stream(messages):
+        if first_token is None and chunk.content:
+            first_token = time.perf_counter()
+        if echo:
+            print(chunk.content, end="", flush=True)
+        full = chunk if full is None else full + chunk
+        chunks += 1
+    
+    end = time.perf_counter()
+    if echo:
+        print()
+    
+    # Tokens de salida reportados por Gemini o, si no están, estimados (~4 caracteres por token)
+    usage = getattr(full, "usage_metadata", None) or {}
+    content = full.content if full is not None else ""
+    output_tokens = usage.get("output_tokens") or max(1, math.ceil(len(content) / 4))
+    
+    first_token = first_token or end
+    # Velocidad de generación desde el primer token (o total si llegó todo en un fragmento)
+    generation = end - first_token if chunks > 1 else end - start
+    metrics = {
+        "ttft": first_token - start,
+        "total": end - start,
+        "output_tokens": output_tokens,
+        "tokens_per_second": output_tokens / generation if generation > 0 else float("inf"),
+    }
+    return full, metrics
+
+def print_metrics(metrics):
+    """Muestra las métricas de un turno"""
+    print(f"   ⏱️  TTFT: {metrics['ttft'] * 1000:.0f} ms | "
+          f"Total: {metrics['total'] * 1000:.0f} ms | "
+          f"{metrics['output_tokens']} tokens @ {metrics['tokens_per_second']:.1f} tokens/s")
+
+def percentile(values, p):
+    """Percentil p (0-100) por el método del rango más cercano"""
+    ordered = sorted(values)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def run_bench(llm, path):
+    """Ejecuta los prompts de un archivo sin interacción y muestra percentiles de latencia"""
+    with open(path, encoding="utf-8") as f:
+        prompts = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    
+    if not prompts:
+        print(f"❌ El archivo {path} no contiene prompts")
+        return
+    
+    print(f"\n📏 Benchmark de latencia: {len(prompts)} prompts")
+    print("-" * 50)
+    
+    results = []
+    for i, prompt in enumerate(prompts, 1):
+        try:
+            _, metrics = stream_response(llm, [("human", prompt)], echo=False)
+        except Exception as e:
+            print(f"   {i:>3}. ❌ Error: {e}")
+            continue
+        results.append(metrics)
+        print(f"   {i:>3}. TTFT {metrics['ttft'] * 1000:>6.0f} ms | "
+              f"Total {metrics['total'] * 1000:>6.0f} ms | "
+              f"{metrics['tokens_per_second']:>6.1f} tokens/s")
+    
+    if not results:
+        print("❌ Ningún prompt se completó")
+        return
+    
+    print("\n📊 Resumen")
+    print("-" * 50)
+    print(f"{'':<12}{'p50':>10}{'p90':>10}{'p99':>10}")
+    for name, key in (("TTFT ms", "ttft"), ("Total ms", "total")):
+        values = [r[key] * 1000 for r in results]
+        print(f"{name:<12}" + "".join(f"{percentile(values, p):>10.0f}" for p in (50, 90, 99)))
+    rates = [r["tokens_per_second"] for r in results if math.isfinite(r["tokens_per_second"])]
+    if rates:
+        print(f"{'Tokens/s':<12}" + "".join(f"{percentile(rates, p):>10.1f}" for p in (50, 90, 99)))
+    print(f"\n✅ {len(results)}/{len(prompts)} prompts completados")
+
 def main():
+    parser = argparse.ArgumentParser(description="Demo de Gemini Flash con streaming")
+    parser.add_argument("--modelo", default="gemini-1.5-flash", help="Modelo de Gemini")
+    parser.add_argument("--temperatura", type=float, default=0.7, help="Temperatura del modelo")
+    parser.add_argument("--historial", type=int, default=10, help="Turnos recordados en el chat")
+    parser.add_argument("--bench", metavar="ARCHIVO", help="Ejecutar los prompts del archivo y mostrar percentiles")
+    args = parser.parse_args()
+    
     print("🤖 Demo de Gemini Flash")
     print("=" * 30)
     
@@ -26,8 +142,8 @@ def main():
         from langchain_google_genai import ChatGoogleGenerativeAI
         
         llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
-            temperature=0.7
+            model=args.modelo,
+            temperature=args.temperatura
         )
         print("✅ Gemini Flash configurado")
         
@@ -39,10 +155,17 @@ def main():
         print(f"❌ Error al configurar Gemini: {e}")
         return
     
+    if args.bench:
+        run_bench(llm, args.bench)
+        return
+    
     # 3. Demo interactivo
-    print("\n💬 Demo Interactivo - Escribe 'salir' para terminar")
+    print("\n💬 Demo Interactivo - Escribe 'salir' para terminar, 'olvidar' para borrar el historial")
     print("-" * 50)
     
+    # Historial acotado: cada turno ocupa dos mensajes (usuario y modelo)
+    history = deque(maxlen=2 * args.historial)
+    
     while True:
         try:
             # Obtener input del usuario
@@ -52,6 +175,11 @@ def main():
                 print("👋 ¡Hasta luego!")
                 break
             
+            if user_input.lower() == 'olvidar':
+                history.clear()
+                print("🧹 Historial borrado")
+                continue
+            
             if not user_input:
                 continue
             
@@ -59,8 +187,11 @@ def main():
             print("🤖 Gemini: ", end="", flush=True)
             
             try:
-                response = llm.invoke(user_input)
-                print(response.content)
+                messages = list(history) + [("human", user_input)]
+                response, metrics = stream_response(llm, messages)
+                history.append(("human", user_input))
+                history.append(("ai", response.content))
+                print_metrics(metrics)
                 
             except Exception as e:
                 print(f"❌ Error al consultar Gemini: {e}")